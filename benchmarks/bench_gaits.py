@@ -0,0 +1,72 @@
+import time
+
+from common import MODELS, metric, new_hexapod
+from gait_compiler import VirtualClock
+
+# (method, keyword arguments) run on every model that has the method
+GAITS = [
+    ('right_left_right_step', {}),
+    ('left_right_left_step', {}),
+    ('right_left_right_step_back', {}),
+    ('left_right_left_step_back', {}),
+    ('turn_left', {}),
+    ('turn_right', {}),
+    ('rotate', {}),
+    ('row', {}),
+    ('front_leg_dancing', {}),
+    ('back_leg_dancing', {}),
+    ('walk_gait', {'pattern': 'tripod'}),
+    ('walk_gait', {'pattern': 'ripple'}),
+    ('walk_gait', {'pattern': 'wave'}),
+    ('command_walk', {'iteration': 4}),
+]
+
+
+def gait_name(method_name, kwargs):
+    return '_'.join([method_name] + [str(value) for key, value in sorted(kwargs.items())])
+
+
+def run_gait(my_hexapod, clock, method_name, kwargs):
+    # Run a movement from the centered pose. Returns the wall time, the I2C
+    # transactions and bus time of the simulated boards and the movement's
+    # duration on the virtual clock.
+    my_hexapod.center_all_legs()
+    for board in my_hexapod.board_list:
+        board.device.clear()
+
+    begin = clock.now
+    start = time.perf_counter()
+    getattr(my_hexapod, method_name)(**kwargs)
+    wall = time.perf_counter() - start
+
+    transactions = sum(board.device.transactions for board in my_hexapod.board_list)
+    bus_time = sum(board.device.bus_time for board in my_hexapod.board_list)
+
+    return wall, transactions, bus_time, clock.now - begin
+
+
+def run(repeat=20):
+    results = {}
+    for model in MODELS:
+        clock = VirtualClock()
+        my_hexapod = new_hexapod(model, clock)
+
+        for method_name, kwargs in GAITS:
+            if not hasattr(my_hexapod, method_name):
+                continue
+
+            # the first run starts from whatever the previous movement left
+            # that center_all_legs() does not move: counts come from the last
+            runs = [run_gait(my_hexapod, clock, method_name, kwargs) for i in range(repeat)]
+            wall = min(run[0] for run in runs)
+            transactions, bus_time, duration = runs[-1][1:]
+
+            name = 'gaits.{}.{}'.format(model, gait_name(method_name, kwargs))
+            results[name + '.wall_ms'] = metric(1000 * wall, 'ms')
+            results[name + '.i2c_transactions'] = metric(transactions, 'transactions', exact=True)
+            results[name + '.bus_ms'] = metric(round(1000 * bus_time, 3), 'ms', exact=True)
+            results[name + '.duration_s'] = metric(round(duration, 3), 's', exact=True)
+
+        my_hexapod.close()
+
+    return results
@@ -0,0 +1,83 @@
+import asyncio
+import socket
+import threading
+import time
+
+from common import metric, new_hexapod
+from protocol import DONE, REPLY, Client
+import server_if
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(my_hexapod):
+    # HexapodServer on a localhost port from a daemon thread, returns the port
+    port = free_port()
+    server = server_if.HexapodServer(my_hexapod)
+    threading.Thread(target=asyncio.run, args=(server.serve('127.0.0.1', port),), daemon=True).start()
+
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return port
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+
+            time.sleep(0.01)
+
+
+def pipelined(client, commands, kind):
+    # Send every command at once and wait for as many frames of a kind,
+    # commands per second
+    start = time.perf_counter()
+    for command in commands:
+        client.send(command)
+
+    received = 0
+    while received < len(commands):
+        if client.receive()[1] == kind:
+            received += 1
+
+    return len(commands) / (time.perf_counter() - start)
+
+
+def round_trips(port, commands):
+    # Text protocol, one command at a time, commands per second
+    with socket.create_connection(('127.0.0.1', port)) as s:
+        reader = s.makefile('r')
+        start = time.perf_counter()
+        for command in commands:
+            s.sendall((command + '\n').encode())
+            reader.readline()
+
+        return len(commands) / (time.perf_counter() - start)
+
+
+def run(count=2000, motions=200):
+    # Motion commands run on the hexapod's virtual clock, so the rates are the
+    # server's own overhead and not the length of the movements
+    my_hexapod = new_hexapod('12DOF')
+    port = start_server(my_hexapod)
+
+    results = {}
+    client = Client('127.0.0.1', port)
+    try:
+        results['server.text_round_trips_per_s'] = metric(
+                round_trips(port, ['timing'] * count), 'commands/s', 'higher')
+        results['server.framed_pipelined_per_s'] = metric(
+                pipelined(client, ['timing'] * count, REPLY), 'commands/s', 'higher')
+
+        # sit and stand are never merged, every one of them is run
+        results['server.motion_commands_per_s'] = metric(
+                pipelined(client, ['sit', 'stand'] * (motions // 2), DONE), 'commands/s', 'higher')
+    finally:
+        client.close()
+        my_hexapod.close()
+
+    return results
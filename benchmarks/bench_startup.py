@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import time
+
+from common import HEXAPOD_DIR, MODELS, best_time, metric
+from config_compiler import compile_config, load_config
+
+# Python snippets timed from process start to exit, run from the hexapod
+# directory like the entry points themselves
+ENTRY_POINTS = {
+    'python': 'pass',
+    'client_if': 'import client_if',
+    'server_if': 'import server_if',
+}
+for model, config_file in MODELS.items():
+    ENTRY_POINTS['server_ready_' + model] = (
+            "import server_if; server_if.initialize_hexapod('{}', 'simulated', fast_start=True)".format(config_file))
+
+
+def process_time(code):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=HEXAPOD_DIR, check=True)
+    return time.perf_counter() - start
+
+
+def run(repeat=5):
+    # Start up time of the entry points in fresh interpreters ('python' is the
+    # interpreter alone), and of loading a config file with and without its
+    # compiled form
+    results = {}
+    for name, code in ENTRY_POINTS.items():
+        seconds = min(process_time(code) for i in range(repeat))
+        results['startup.{}_ms'.format(name)] = metric(1000 * seconds, 'ms')
+
+    for model, config_file in MODELS.items():
+        path = os.path.join(HEXAPOD_DIR, config_file)
+        with open(path, 'rb') as f:
+            text = f.read()
+
+        load_config(path)
+        results['startup.config_{}_compile_ms'.format(model)] = metric(
+                1000 * best_time(lambda: compile_config(text), repeat, 10), 'ms')
+        results['startup.config_{}_cached_ms'.format(model)] = metric(
+                1000 * best_time(lambda: load_config(path), repeat, 10), 'ms')
+
+    return results
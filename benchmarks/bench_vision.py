@@ -0,0 +1,40 @@
+import os
+
+import cv2
+
+from common import SAMPLE_IMAGES, best_time, metric
+import object_detection as od
+
+IMAGES = ['2017-12-05-171951.jpg', '2017-12-05-172011.jpg']
+
+
+def run(repeat=5, number=10):
+    # Frames per second of the thresholding and centroid pipeline on the
+    # sample camera images, and the centroids it finds there: a faster pipeline
+    # has to find the same ones
+    results = {}
+    for image in IMAGES:
+        frame = cv2.imread(os.path.join(SAMPLE_IMAGES, image))
+        seconds = best_time(lambda: od.process_frame(frame), repeat, number)
+
+        name = 'vision.{}'.format(os.path.splitext(image)[0])
+        results[name + '.fps'] = metric(1 / seconds, 'frames/s', 'higher')
+
+        robot, spotlight, distance = od.process_frame(frame)
+        for label, value in zip(('robot_x', 'robot_y', 'spotlight_x', 'spotlight_y'), robot + spotlight):
+            results['{}.{}'.format(name, label)] = metric(value, 'px', exact=True)
+
+        # tracking a still image: every frame after the first is searched in
+        # windows only
+        tracker = od.RoiTracker()
+        tracker.track(frame)
+        seconds = best_time(lambda: tracker.track(frame), repeat, number)
+
+        name = 'vision.roi.{}'.format(os.path.splitext(image)[0])
+        results[name + '.fps'] = metric(1 / seconds, 'frames/s', 'higher')
+
+        robot, spotlight, distance = tracker.track(frame)
+        for label, value in zip(('robot_x', 'robot_y', 'spotlight_x', 'spotlight_y'), robot + spotlight):
+            results['{}.{}'.format(name, label)] = metric(value, 'px', exact=True)
+
+    return results
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEXAPOD_DIR = os.path.join(ROOT, 'hexapod')
+SAMPLE_IMAGES = os.path.join(ROOT, 'sample_images')
+
+# the hexapod modules import each other as top level modules
+if HEXAPOD_DIR not in sys.path:
+    sys.path.insert(0, HEXAPOD_DIR)
+
+from config_compiler import load_config
+from gait_compiler import VirtualClock
+from hexapod import create_hexapod
+from scheduler import MotionScheduler
+
+# config file of each model
+MODELS = {
+    '12DOF': 'config_12DOF.yaml',
+    '18DOF': 'config_18DOF.yaml',
+}
+
+# servo boards without a bus: register writes are counted, never waited for
+SIMULATED = {'type': 'simulated'}
+
+# leg geometry the 18DOF gaits are solved with: config_18DOF.yaml ships none
+# until it is measured on the robot
+GEOMETRY = {
+    'coxa_length': 30,
+    'femur_length': 80,
+    'tibia_length': 120,
+    'stance_reach': 120,
+    'stance_height': 90,
+    'joints': {'rotate': [45, -45], 'upper': [-45, 90], 'lower': [-150, -30]},
+    'legs': {
+        'left_front': [80, 50, 45],
+        'left_center': [0, 70, 90],
+        'left_back': [-80, 50, 135],
+        'right_front': [80, -50, -45],
+        'right_center': [0, -70, -90],
+        'right_back': [-80, -50, -135],
+    },
+}
+
+
+def metric(value, unit, better='lower', exact=False):
+    # One benchmark result. better: 'lower' or 'higher'. exact: deterministic
+    # counts that must match the baseline, anything else is compared with a
+    # tolerance.
+    return {'value': value, 'unit': unit, 'better': better, 'exact': exact}
+
+
+def new_hexapod(model, clock=None):
+    # Hexapod of a model on simulated boards. clock: a VirtualClock its movements
+    # run on instead of sleeping, a new one if not given.
+    config = load_config(os.path.join(HEXAPOD_DIR, MODELS[model]))
+    if model == '18DOF':
+        config = dict(config, geometry=GEOMETRY)
+
+    my_hexapod = create_hexapod(config, SIMULATED)
+
+    clock = clock or VirtualClock()
+    my_hexapod.scheduler = MotionScheduler(clock=clock.clock, sleep=clock.sleep)
+
+    return my_hexapod
+
+
+def best_time(function, repeat=5, number=1):
+    # Fastest of repeat runs of number calls, seconds per call
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            function()
+
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
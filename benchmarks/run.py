@@ -0,0 +1,193 @@
+# Hexapod benchmarks on simulated servo boards.
+#
+#   python benchmarks/run.py                      run everything, compare with baseline.json
+#   python benchmarks/run.py -o results.json      also write the results out
+#   python benchmarks/run.py --only gaits vision  run some of the suites (gaits, server,
+#                                                 startup, vision)
+#   python benchmarks/run.py --save               make the results the new baseline
+#
+# Exits with status 1 when a result is worse than the baseline: exact results
+# (I2C transactions, movement durations, vision centroids) must match it,
+# timings and rates may be off by --tolerance. Every suite runs --runs times,
+# in rounds over all the suites, and keeps its best timings and rates: a run
+# caught by a slow spell of the machine does not count.
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+import bench_gaits
+import bench_server
+import bench_startup
+import bench_vision
+
+SUITES = {
+    'gaits': bench_gaits,
+    'server': bench_server,
+    'startup': bench_startup,
+    'vision': bench_vision,
+}
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='hexapod benchmarks.')
+
+    parser.add_argument(
+            '--only',
+            nargs='+',
+            default=sorted(SUITES),
+            choices=sorted(SUITES),
+            help='suites to run')
+
+    parser.add_argument(
+            '-o',
+            '--output',
+            default=None,
+            help='write the results to this JSON file')
+
+    parser.add_argument(
+            '-b',
+            '--baseline',
+            default=BASELINE,
+            help='JSON results to compare with')
+
+    parser.add_argument(
+            '-t',
+            '--tolerance',
+            default=0.25,
+            type=float,
+            help='relative slowdown of timings and rates reported as a regression')
+
+    parser.add_argument(
+            '-r',
+            '--runs',
+            default=5,
+            type=int,
+            help='runs of every suite, the best timings of them count')
+
+    parser.add_argument(
+            '--save',
+            action="store_true",
+            help='store the results as the baseline')
+
+    return parser.parse_args()
+
+
+def same(a, b):
+    return a == b or (isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b))
+
+
+def best_of(runs):
+    # Results of several runs of a suite, each timing and rate the best of them
+    results = dict(runs[0])
+    for run in runs[1:]:
+        for name, result in run.items():
+            if result['exact']:
+                continue
+
+            pick = min if result['better'] == 'lower' else max
+            results[name] = dict(result, value=pick(result['value'], results[name]['value']))
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # [(name, baseline value, value, change)] of the results worse than the
+    # baseline. change: relative, positive when worse.
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+
+        old, new = baseline[name]['value'], result['value']
+        if result['exact']:
+            if not same(old, new):
+                regressions.append((name, old, new, None))
+            continue
+
+        if not old:
+            continue
+
+        change = (new - old) / old
+        if result['better'] == 'higher':
+            change = -change
+
+        if change > tolerance:
+            regressions.append((name, old, new, change))
+
+    return regressions
+
+
+def main():
+    args = get_args()
+
+    # the runs of a suite are spread over the whole benchmark, one round of
+    # every suite at a time, so a slow spell of the machine hits few of them
+    runs = {name: [] for name in args.only}
+    seconds = dict.fromkeys(args.only, 0.0)
+    for i in range(max(1, args.runs)):
+        for name in args.only:
+            start = time.perf_counter()
+            runs[name].append(SUITES[name].run())
+            seconds[name] += time.perf_counter() - start
+
+    results = {}
+    for name in args.only:
+        results.update(best_of(runs[name]))
+        print('{}: {:.1f}s'.format(name, seconds[name]), file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.save:
+        # keep the results of the suites that were not run
+        saved = {'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f)
+
+        saved['results'].update(results)
+        saved.update({key: value for key, value in report.items() if key != 'results'})
+        with open(args.baseline, 'w') as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('no baseline at {}'.format(args.baseline), file=sys.stderr)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name, old, new, change in regressions:
+        if change is None:
+            print('REGRESSION {}: {} -> {} (must match)'.format(name, old, new), file=sys.stderr)
+        else:
+            print('REGRESSION {}: {:.4g} -> {:.4g} ({:+.0%})'.format(name, old, new, change), file=sys.stderr)
+
+    print('{} results, {} regressions'.format(len(results), len(regressions)), file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
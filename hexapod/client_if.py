@@ -1,8 +1,8 @@
 import argparse
 import socket
 
-# import object detection code
-import object_detection as od
+import protocol
+from metrics import serve_metrics
 
 def get_args():
     parser = argparse.ArgumentParser(description='hexapod client.')
@@ -24,36 +24,101 @@ def get_args():
             default=None,
             help='script file to run robot')
 
+    parser.add_argument(
+            '-w',
+            '--window',
+            default=8,
+            type=int,
+            help='script commands sent ahead of the robot')
+
+    parser.add_argument(
+            '-u',
+            '--upload',
+            action="store_true",
+            help='run the script on the server as one job')
+
+    parser.add_argument(
+            '--metrics_port',
+            default=0,
+            type=int,
+            help='serve vision metrics for Prometheus on this localhost port')
+
     parser.add_argument(
             '-v',
             '--vision',
             action="store_true",
             help='use OpenCV vision to move the robot')
 
+    parser.add_argument(
+            '--full_frame',
+            action="store_true",
+            help='search every camera frame whole instead of around the last positions')
+
     return parser.parse_args()
 
-def Main(host, port, script, vision):
+def run_script(host, port, script, window=8, upload=False):
+    # Stream the script over the framed protocol with at most window commands
+    # not yet done, printing replies as they arrive, so the server always has
+    # the next moves queued. upload: send the whole script as one job instead.
+    client = protocol.Client(host, port)
+
+    with open(script) as f:
+        lines = [line.strip() for line in f if line.strip()]
+
+    if upload:
+        lines = ['\n'.join(['script'] + lines)]
+
+    in_flight = set()
+    for line in lines:
+        while len(in_flight) >= window:
+            receive_reply(client, in_flight)
+
+        in_flight.add(client.send(line))
+
+    while in_flight:
+        receive_reply(client, in_flight)
+
+    client.close()
+
+def receive_reply(client, in_flight):
+    # A request is in flight until its REPLY, or its DONE frame once queued
+    request_id, kind, body = client.receive()
+
+    if kind == protocol.REPLY:
+        print('Recieved from server: ' + body)
+        if not body.startswith('Queued'):
+            in_flight.discard(request_id)
+
+    elif kind == protocol.DONE:
+        print('Done: ' + body)
+        in_flight.discard(request_id)
+
+def Main(host, port, script, vision, window=8, upload=False, full_frame=False):
+        # each mode opens the one connection it talks over
+        if script and not vision:
+            run_script(host, port, script, window, upload)
+            return
+
         mySocket = socket.socket()
         mySocket.connect((host,port))
 
         if vision:
-            od.Main(mySocket=mySocket)
+            # OpenCV and numpy are only loaded for vision mode
+            import object_detection as od
 
-        elif script:
-            with open(script) as f:
-                for line in f:
-                    mySocket.send(line.strip().encode())
-                    data = mySocket.recv(1024).decode()
-
-                    print('Recieved from server: ' + data)
+            od.Main(mySocket=mySocket, roi=not full_frame)
 
         else:
             message = input(" -> ")
 
             while message != 'q':
+                # the server lists its commands with their arguments
+                if message == 'help':
+                    message = 'commands'
+
                 if message:
-                    mySocket.send(message.encode())
-                    data = mySocket.recv(1024).decode()
+                    mySocket.send((message + '\n').encode())
+                    data = mySocket.recv(4096).decode()
 
                     print ('Received from server: ' + data)
 
@@ -68,5 +133,10 @@ if __name__ == '__main__':
     print('Port: {}'.format(args.port))
     print('Script: {}'.format(args.script))
     print('Vision: {}'.format(args.vision))
+    print('Full Frame: {}'.format(args.full_frame))
+    print('Window: {}'.format(args.window))
+
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
 
-    Main(args.host, args.port, args.script, args.vision)
+    Main(args.host, args.port, args.script, args.vision, args.window, args.upload, args.full_frame)
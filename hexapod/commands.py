@@ -0,0 +1,82 @@
+def choice(*options):
+    # Argument type accepting one of a few words
+    def parse(token):
+        if token not in options:
+            raise ValueError('expected one of {}'.format(', '.join(options)))
+
+        return token
+
+    parse.__name__ = '|'.join(options)
+    return parse
+
+
+def count(token):
+    # Argument type for how many times to do something, at least once
+    value = int(token)
+    if value < 1:
+        raise ValueError('expected a count of 1 or more, got {}'.format(value))
+
+    return value
+
+
+class Command:
+    # A server command: the hexapod method that runs it, its positional
+    # arguments [(name, type, default), ...] and fixed keyword arguments
+    def __init__(self, name, args, fixed, aliases, help, motion):
+        self.name = name
+        self.args = tuple(args)
+        self.fixed = fixed
+        self.aliases = tuple(aliases)
+        self.help = help
+        self.motion = motion
+        self.method_name = None
+
+    def parse(self, tokens):
+        # Keyword arguments for the method from the tokens after the command name
+        if len(tokens) > len(self.args):
+            raise ValueError('{} takes at most {} arguments'.format(self.name, len(self.args)))
+
+        kwargs = dict(self.fixed)
+        for index, (name, kind, default) in enumerate(self.args):
+            kwargs[name] = kind(tokens[index]) if index < len(tokens) else default
+
+        return kwargs
+
+    def repeatable(self):
+        # Two queued runs can be merged into one by adding their iterations
+        return bool(self.args) and self.args[0][0] == 'iteration'
+
+    def usage(self):
+        names = '|'.join((self.name,) + self.aliases)
+        args = ['[{}:{}={}]'.format(name, kind.__name__, default) for name, kind, default in self.args]
+
+        return ' '.join([names] + args)
+
+
+def command(name, args=(), aliases=(), help='', motion=True, **fixed):
+    # Register a hexapod method as a server command. Stack several to expose one
+    # method under different names with different fixed arguments.
+    def decorator(method):
+        method.commands = getattr(method, 'commands', []) + [
+                Command(name, args, fixed, aliases, help, motion)]
+
+        return method
+
+    return decorator
+
+
+def command_table(cls):
+    # {name or alias: Command} of a hexapod class including the ones it inherits,
+    # built once per class. A subclass method registering a name replaces it.
+    if '_command_table' not in cls.__dict__:
+        table = {}
+        for klass in reversed(cls.__mro__):
+            for attribute, value in klass.__dict__.items():
+                for registered in getattr(value, 'commands', ()):
+                    registered.method_name = attribute
+                    for name in (registered.name,) + registered.aliases:
+                        table[name] = registered
+
+        cls._command_table = table
+
+    return cls._command_table
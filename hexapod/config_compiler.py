@@ -0,0 +1,161 @@
+import glob
+import hashlib
+import os
+import pickle
+
+# Hexapod models a config file can ask for with its 'model' field
+MODELS = ('12DOF', '18DOF')
+
+SERVO_FIELDS = ('name', 'channel', 'servo_min', 'servo_max', 'invert')
+POSITION_FIELDS = ('forward', 'back', 'up', 'down', 'center')
+
+# Compiled config file: MAGIC, SHA-256 of the YAML text, pickled config. Bump
+# the magic whenever compile_config() changes what it produces or accepts.
+MAGIC = b'HXC2'
+CACHE_DIR = '__pycache__'
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def check(condition, message, *args):
+    if not condition:
+        raise ConfigError(message.format(*args))
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def compile_config(text):
+    # Parse and validate the YAML text of a config file. Position fields set to
+    # the string 'None' (config_18DOF.yaml) become None.
+    import yaml
+
+    config = yaml.safe_load(text)
+    check(isinstance(config, dict), 'config is not a mapping')
+    check(config.get('model') in MODELS, "model must be one of {}, got {!r}", ', '.join(MODELS), config.get('model'))
+
+    backend = config.get('backend') or {}
+    check(isinstance(backend, dict), 'backend is not a mapping')
+    check(isinstance(config.get('smooth', False), bool), 'smooth must be True or False')
+
+    boards = config.get('boards')
+    check(isinstance(boards, list) and boards, 'no boards found for the hexapod')
+
+    names = set()
+    addresses = set()
+    for board in boards:
+        address = board.get('board_address')
+        check(isinstance(address, int) and address not in addresses,
+              'board_address missing or used twice: {!r}', address)
+        addresses.add(address)
+
+        check(isinstance(board.get('pwm_freq'), (int, float)) and board['pwm_freq'] > 0,
+              'board {}: pwm_freq must be a positive number', hex(address))
+
+        servos = board.get('servos')
+        check(isinstance(servos, list) and servos, 'board {}: no servos found', hex(address))
+
+        channels = set()
+        for servo in servos:
+            missing = [field for field in SERVO_FIELDS if field not in servo]
+            check(not missing, 'board {}: servo {} has no {}', hex(address), servo.get('name'), ', '.join(missing))
+
+            name = servo['name']
+            check(name not in names, 'servo {} defined twice', name)
+            check(isinstance(servo['channel'], int) and 0 <= servo['channel'] < 16 and servo['channel'] not in channels,
+                  'servo {}: channel must be 0-15 and not used by another servo of its board', name)
+            check(isinstance(servo['servo_min'], int) and isinstance(servo['servo_max'], int)
+                  and 0 <= servo['servo_min'] < servo['servo_max'] < 4096,
+                  'servo {}: need 0 <= servo_min < servo_max < 4096', name)
+            names.add(name)
+            channels.add(servo['channel'])
+
+            for field in POSITION_FIELDS:
+                if servo.get(field) == 'None':
+                    servo[field] = None
+
+                value = servo.get(field)
+                check(value is None or (is_number(value) and 0 <= value <= 100),
+                      'servo {}: {} must be a percent or null', name, field)
+
+    if config.get('geometry') is not None:
+        check_geometry(config['geometry'], names)
+
+    return config
+
+
+def check_geometry(geometry, names):
+    # Leg geometry for the inverse kinematics of the 18DOF model, see ik.LegIK
+    from ik import JOINTS
+    from servo_bank import LEGS
+
+    check(isinstance(geometry, dict), 'geometry is not a mapping')
+
+    for field in ('coxa_length', 'femur_length', 'tibia_length', 'stance_reach', 'stance_height'):
+        value = geometry.get(field)
+        check((value is None and field.startswith('stance')) or (is_number(value) and value > 0),
+              'geometry: {} must be a positive number, got {!r}', field, value)
+
+    joints = geometry.get('joints')
+    check(isinstance(joints, dict), 'geometry: joints is not a mapping')
+    for joint in JOINTS:
+        angles = joints.get(joint)
+        check(isinstance(angles, list) and len(angles) == 2 and all(is_number(angle) for angle in angles)
+              and angles[0] != angles[1],
+              'geometry: joint {} needs [angle at 0%, angle at 100%], two different numbers', joint)
+
+    legs = geometry.get('legs')
+    check(isinstance(legs, dict), 'geometry: legs is not a mapping')
+    for leg in LEGS:
+        mount = legs.get(leg)
+        check(isinstance(mount, list) and len(mount) == 3 and all(is_number(value) for value in mount),
+              'geometry: leg {} needs its mount point [x, y, heading]', leg)
+
+        for joint in JOINTS:
+            name = '{}_{}'.format(leg, joint)
+            check(name in names, 'geometry: no servo {} for the leg {}', name, leg)
+
+
+def load_config(path, cache_dir=CACHE_DIR):
+    # Config file at path, compiled once per content. The compiled form is kept
+    # in cache_dir (relative to the config file) as <name>.<hash>.cfg and loads
+    # without parsing any YAML. A cache that cannot be written is skipped.
+    with open(path, 'rb') as f:
+        text = f.read()
+
+    digest = hashlib.sha256(text).digest()
+
+    directory = os.path.join(os.path.dirname(os.path.abspath(path)), cache_dir)
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_file = os.path.join(directory, '{}.{}.cfg'.format(name, digest.hex()[:16]))
+
+    try:
+        with open(cache_file, 'rb') as f:
+            data = f.read()
+
+        if data[:len(MAGIC)] == MAGIC and data[len(MAGIC):len(MAGIC) + len(digest)] == digest:
+            return pickle.loads(data[len(MAGIC) + len(digest):])
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+
+    config = compile_config(text)
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temp = '{}.{}'.format(cache_file, os.getpid())
+        with open(temp, 'wb') as f:
+            f.write(MAGIC + digest + pickle.dumps(config, pickle.HIGHEST_PROTOCOL))
+
+        os.replace(temp, cache_file)
+
+        # compiled forms of earlier versions of the file
+        for stale in glob.glob(os.path.join(directory, glob.escape(name) + '.*.cfg')):
+            if stale != cache_file:
+                os.remove(stale)
+    except OSError:
+        pass
+
+    return config
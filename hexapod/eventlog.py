@@ -0,0 +1,132 @@
+import struct
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+# Record: timestamp, event id, then the event's packed arguments
+HEADER = struct.Struct('<dH')
+RECORD_SIZE = 64
+
+
+class Event:
+    # A kind of log record. fmt: struct format of its arguments ('s' fields
+    # take str and are cut to size), message: str.format template for them.
+    def __init__(self, event_id, name, level, fmt, message):
+        self.id = event_id
+        self.name = name
+        self.level = level
+        self.struct = struct.Struct('<' + fmt)
+        self.message = message
+
+        if HEADER.size + self.struct.size > RECORD_SIZE:
+            raise ValueError('arguments of event {} do not fit a record'.format(name))
+
+    def format(self, payload):
+        args = [arg.rstrip(b'\0').decode(errors='replace') if isinstance(arg, bytes) else arg
+                for arg in self.struct.unpack(payload)]
+
+        return '{} {}'.format(LEVEL_NAMES.get(self.level, self.level), self.message.format(*args))
+
+
+class EventLog:
+    # In-memory ring buffer of fixed size binary records. log() only packs a
+    # record, a background thread formats and writes them out (see start()), so
+    # logging never waits on a terminal, a file or the network. When the writer
+    # falls a whole ring behind the oldest records are dropped and counted.
+    def __init__(self, capacity=4096, level=INFO, clock=time.time):
+        self.capacity = capacity
+        self.level = level
+        self.clock = clock
+
+        self.buffer = bytearray(capacity * RECORD_SIZE)
+        self.written = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+        self.events = []
+        self.flusher = None
+        self.stopping = threading.Event()
+
+    def event(self, name, level=INFO, fmt='', message=''):
+        event = Event(len(self.events), name, level, fmt, message or name)
+        self.events.append(event)
+
+        return event
+
+    def enabled(self, level):
+        # For call sites that would do work just to build the arguments
+        return level >= self.level
+
+    def log(self, event, *args):
+        if event.level < self.level:
+            return
+
+        args = [arg.encode() if isinstance(arg, str) else arg for arg in args]
+
+        with self.lock:
+            offset = (self.written % self.capacity) * RECORD_SIZE
+            HEADER.pack_into(self.buffer, offset, self.clock(), event.id)
+            event.struct.pack_into(self.buffer, offset + HEADER.size, *args)
+            self.written += 1
+
+    def records(self):
+        # Take the records not written out yet: [(timestamp, event, payload)]
+        with self.lock:
+            if self.written - self.flushed > self.capacity:
+                self.dropped += self.written - self.flushed - self.capacity
+                self.flushed = self.written - self.capacity
+
+            records = []
+            for sequence in range(self.flushed, self.written):
+                offset = (sequence % self.capacity) * RECORD_SIZE
+                timestamp, event_id = HEADER.unpack_from(self.buffer, offset)
+                event = self.events[event_id]
+                start = offset + HEADER.size
+                records.append((timestamp, event, bytes(self.buffer[start:start + event.struct.size])))
+
+            self.flushed = self.written
+
+        return records
+
+    def flush(self, sink):
+        # Format the pending records into sink (anything with write())
+        lines = []
+        for timestamp, event, payload in self.records():
+            lines.append('{:.6f} {}\n'.format(timestamp, event.format(payload)))
+
+        if lines:
+            sink.write(''.join(lines))
+            if hasattr(sink, 'flush'):
+                sink.flush()
+
+    def start(self, sink, interval=0.5):
+        # Write out the records every interval seconds from a daemon thread. For
+        # a socket pass socket.makefile('w').
+        self.stop()
+        self.stopping.clear()
+
+        def run():
+            while not self.stopping.wait(interval):
+                self.flush(sink)
+
+            self.flush(sink)
+
+        self.flusher = threading.Thread(target=run, daemon=True)
+        self.flusher.start()
+
+    def stop(self):
+        if self.flusher is not None:
+            self.stopping.set()
+            self.flusher.join()
+            self.flusher = None
+
+
+# The log shared by the hexapod modules
+LOG = EventLog()
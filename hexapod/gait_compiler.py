@@ -0,0 +1,158 @@
+from __future__ import division
+
+import copy
+
+from scheduler import MotionScheduler
+
+
+class VirtualClock:
+    # clock/sleep pair for the MotionScheduler where sleeping only moves time on
+    def __init__(self):
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RecordingBoard:
+    # Stand-in for a PCA9685Board that records committed pulses instead of
+    # writing them: (time offset, board index, channel, pulse)
+    def __init__(self, index, clock, records):
+        self.index = index
+        self.clock = clock
+        self.records = records
+        self.frame = None
+        self.shadow = {}
+
+    def set_pwm(self, channel, on, off):
+        if self.frame is not None:
+            self.frame[channel] = off
+        else:
+            self.write_frame({channel: off})
+
+    def begin_frame(self):
+        if self.frame is None:
+            self.frame = {}
+
+    def take_frame(self):
+        frame = self.frame
+        if frame:
+            self.frame = {}
+
+        return frame
+
+    def write_frame(self, frame):
+        if frame:
+            for channel in sorted(frame):
+                if self.shadow.get(channel) != frame[channel]:
+                    self.shadow[channel] = frame[channel]
+                    self.records.append((self.clock.now, self.index, channel, frame[channel]))
+
+    def commit_frame(self):
+        self.write_frame(self.take_frame())
+
+    def end_frame(self):
+        self.commit_frame()
+        self.frame = None
+
+
+class GaitTable:
+    # Precomputed keyframes of a movement
+    def __init__(self, frames, duration):
+        # frames: [(time offset, [(servo index, board index, channel, pulse), ...]), ...]
+        self.frames = frames
+        self.duration = duration
+
+    def __len__(self):
+        return len(self.frames)
+
+    def writes(self):
+        return sum(len(writes) for offset, writes in self.frames)
+
+
+def recording_hexapod(hexapod, clock, records):
+    # Copy of a hexapod that moves on RecordingBoards and the virtual clock, with
+    # its own servo bank starting from the hexapod's pose. Nothing a movement
+    # changes is shared with the hexapod, so it can keep moving meanwhile.
+    recorder = copy.copy(hexapod)
+    recorder.bank = hexapod.bank.copy()
+    recorder.boards = {}
+    recorder.board_list = [RecordingBoard(i, clock, records) for i in range(len(hexapod.board_list))]
+    recorder.servos = {name: type(servo)(recorder.bank, servo.index, recorder.board_list)
+                       for name, servo in hexapod.servos.items()}
+    recorder.scheduler = MotionScheduler(clock=clock.clock, sleep=clock.sleep)
+    recorder.writers = []
+    recorder.frame_depth = 0
+
+    return recorder
+
+
+def compile_gait(hexapod, method_name, *args, **kwargs):
+    # Run a movement once on a recording copy of the hexapod and return its
+    # GaitTable. The hexapod itself is neither written to nor changed.
+    clock = VirtualClock()
+    records = []
+
+    servo_index = {}
+    for index in range(len(hexapod.bank)):
+        servo_index[(int(hexapod.bank.board[index]), int(hexapod.bank.channel[index]))] = index
+
+    getattr(recording_hexapod(hexapod, clock, records), method_name)(*args, **kwargs)
+    duration = clock.now
+
+    frames = []
+    for offset, board, channel, pulse in records:
+        if not frames or frames[-1][0] != offset:
+            frames.append((offset, []))
+
+        frames[-1][1].append((servo_index[(board, channel)], board, channel, pulse))
+
+    return GaitTable(frames, duration)
+
+
+def blend_tables(tables, start, overlap=0.0):
+    # Chain GaitTables into one. Leading keyframes of a table that write nothing
+    # new (the re-centering a step starts with when the previous one just ended
+    # there) are dropped together with the wait after them, and every table after
+    # the first starts overlap seconds before the previous one ends, but never
+    # before its last keyframe. start: pulses before the first table, -1 where
+    # unknown.
+    pose = list(start)
+    merged = {}
+    end = 0.0
+    last = None
+
+    for table in tables:
+        frames = list(table.frames)
+        skipped = 0.0
+        while frames and all(pose[servo] == pulse for servo, board, channel, pulse in frames[0][1]):
+            frames.pop(0)
+            skipped = frames[0][0] if frames else table.duration
+
+        begin = end
+        if last is not None:
+            begin = max(end - overlap, last)
+
+        for offset, writes in frames:
+            time = round(begin + offset - skipped, 9)
+            merged.setdefault(time, []).extend(writes)
+            last = time
+
+            for servo, board, channel, pulse in writes:
+                pose[servo] = pulse
+
+        end = max(begin + table.duration - skipped, end)
+
+    # later writes to a servo within the same keyframe win
+    frames = []
+    for time in sorted(merged):
+        writes = {}
+        for write in merged[time]:
+            writes[write[0]] = write
+
+        frames.append((time, [writes[servo] for servo in sorted(writes)]))
+
+    return GaitTable(frames, end)
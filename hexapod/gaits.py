@@ -0,0 +1,42 @@
+from __future__ import division
+
+import numpy as np
+
+# Phase offset of each leg within the gait cycle, in servo_bank.LEGS order:
+# left_front, left_center, left_back, right_front, right_center, right_back
+PATTERNS = {
+    # left_right_left and right_left_right tripods alternate
+    'tripod': (0.0, 0.5, 0.0, 0.5, 0.0, 0.5),
+    # one leg per side at a time, back to front, sides half a cycle apart
+    'ripple': (2/3, 1/3, 0.0, 1/6, 5/6, 0.5),
+    # one leg at a time, back to front, left side first
+    'wave': (2/6, 1/6, 0.0, 5/6, 4/6, 3/6),
+}
+
+# Fraction of the cycle a leg spends on the ground
+DUTY_FACTORS = {
+    'tripod': 1/2,
+    'ripple': 2/3,
+    'wave': 5/6,
+}
+
+
+def gait_cycle(pattern='tripod', frames=50, duty_factor=None, phase=0.0):
+    # One gait cycle as leg states (frames, 6, 2): stride position u in [-1, 1]
+    # (1 = fully forward) and lift in [0, 1] for every leg. On the ground a leg
+    # moves back at constant speed, in the air it swings forward on a cosine
+    # while lifting on a half sine.
+    offsets = np.asarray(PATTERNS[pattern])
+    duty = DUTY_FACTORS[pattern] if duty_factor is None else duty_factor
+
+    p = (phase + np.arange(frames)[:, None] / frames + offsets) % 1.0
+
+    stance = p < duty
+    s_stance = p / duty
+    s_swing = (p - duty) / (1 - duty)
+
+    u = np.where(stance, 1 - 2*s_stance, -np.cos(np.pi * s_swing))
+    lift = np.where(stance, 0.0, np.sin(np.pi * s_swing))
+
+    return np.stack((u, lift), axis=-1)
+
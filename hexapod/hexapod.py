@@ -1,37 +1,143 @@
 from __future__ import division
+import abc
+import collections
+import contextlib
+import functools
+import itertools
+import threading
 import time
 
-# Import the PCA9685 module.
-import Adafruit_PCA9685
+import numpy as np
+
+from commands import choice, command, command_table, count
+from config_compiler import ConfigError
+from eventlog import LOG, WARNING
+from gait_compiler import blend_tables, compile_gait
+from gaits import PATTERNS, gait_cycle
+from ik import LegIK
+from metrics import METRICS
+from pca9685 import WRITER_TIMEOUT, BoardWriter, create_board
+from scheduler import MotionScheduler
+from servo_bank import LEGS, ServoBank
+from trajectory import DEFAULT_RATE, interpolate, keyframe_frames, table_keyframes
+
+POSITION_UNDEFINED = LOG.event('position_undefined', WARNING, '8s40s', '{} not defined for servo: {}')
+FEET_OUT_OF_REACH = LOG.event('feet_out_of_reach', WARNING, 'I', '{} foot targets out of reach, clipped')
+
+SERVO_SET_POSITION = METRICS.counter('servo_set_position_total', 'Servo.set_position() calls')
+SERVO_WRITES = METRICS.counter('servo_writes_total', 'servo pulses written by movements')
+FRAME_COMMIT_SECONDS = METRICS.histogram('frame_commit_seconds', 'time to send one pose frame to the boards')
+
+def motion(method):
+    # Servo writes made inside a movement are staged into pose frames. A frame is
+    # committed (one block write per board, see pca9685.frame_blocks) at every
+    # self.sleep() and when the outermost movement returns.
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.frame():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+# argument of repeatable commands, see commands.Command.repeatable()
+ITERATION = [('iteration', count, 1)]
+
+# Seconds the iterations of a repeated command overlap, cutting the wait after
+# the last keyframe of one (see gait_compiler.blend_tables()). With 'smooth'
+# set in the config file the iterations are played with play_smooth() so every
+# transition, the one into the next iteration included, is cross-faded instead
+# of stepped, at about ten times the block writes.
+BLEND_OVERLAP = 0.3
+
+# Entries kept by the caches of compiled movements and of solved foot targets
+GAIT_TABLE_CACHE = 128
+IK_CACHE = 32
+
+def absolute(method):
+    # Movement that only sets absolute positions, never reading the pose it
+    # starts from: its compiled table is the same from any pose
+    method.absolute = True
+    return method
+
+def cycle_frames(speed, rate):
+    # frames in one gait cycle
+    return max(2, int(round(rate / speed)))
+
+def bank_field(field):
+    # Servo attribute stored in the hexapod's ServoBank
+    def getter(self):
+        return self.bank.get(field, self.index)
+
+    def setter(self, value):
+        self.bank.set(field, self.index, value)
+
+    return property(getter, setter)
+
+class LRUCache:
+    # Bounded cache dropping the least recently used entry, safe to share
+    # between the motion thread and the server. Values are built outside the
+    # lock, a value built twice meanwhile keeps the first one.
+    def __init__(self, size):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, build):
+        # Value of key, build() on a miss
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+            self.misses += 1
+
+        value = build()
+
+        with self.lock:
+            value = self.entries.setdefault(key, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+        return value
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
 class Servo:
-    def __init__(
-        self,
-        name,
-        board,
-        channel,
-        servo_min,
-        servo_max,
-        forward=None,
-        back=None,
-        up=None,
-        down=None,
-        center=None,
-        invert=False
-    ):
-        self.name = name
-        self.board = board
-        self.channel = channel
-        self.servo_min = servo_min
-        self.servo_max = servo_max
-        self.forward = forward
-        self.back = back
-        self.up = up
-        self.down = down
-        self.center = center
-        self.invert = invert
-        
-        self.current_state = None
+    # View of one servo of a ServoBank, kept for per-servo tuning and gait code
+    servo_min = bank_field('servo_min')
+    servo_max = bank_field('servo_max')
+    invert = bank_field('invert')
+    forward = bank_field('forward')
+    back = bank_field('back')
+    up = bank_field('up')
+    down = bank_field('down')
+    center = bank_field('center')
+    current_state = bank_field('current')
+
+    def __init__(self, bank, index, boards):
+        # boards: Hexapod.board_list, looked up on use
+        self.bank = bank
+        self.index = index
+        self.boards = boards
+        self.name = bank.names[index]
+        self.channel = int(bank.channel[index])
+
+    @property
+    def board(self):
+        return self.boards[self.bank.board[self.index]]
     
     def set_max(self, max_value):
         self.servo_max = max_value
@@ -40,21 +146,10 @@ class Servo:
         self.servo_min = min_value
         
     def servo_percent_to_pulse(self, percent):
-        if 0 <= percent <= 100:
-            if self.invert:
-                percent = 100 - percent
-                
-            my_range = self.servo_max - self.servo_min
-            offset = self.servo_min
-            pulse = (percent * my_range)/100 + offset
-        else:
-            print('ERROR: percent must be between 0 and 100, got Percent = {}'.format(percent))
-            print('Setting Percent = 0')
-            pulse = 0
-            
-        return int(pulse)
+        return int(self.bank.percent_to_pulse(percent, self.index))
     
     def set_position(self, percent):
+        SERVO_SET_POSITION.inc()
         pulse = self.servo_percent_to_pulse(percent)
         self.board.set_pwm(self.channel, 0, pulse)
         self.current_state = pulse
@@ -83,37 +178,49 @@ class Servo:
         if self.forward is not None:
             self.set_position(self.forward)
         else:
-            print('WARNING: forward not defined for servo: {}'.format(self.name))
+            LOG.log(POSITION_UNDEFINED, 'forward', self.name)
         
     def move_back(self):
         if self.back is not None:
             self.set_position(self.back)  
         else:
-            print('WARNING: back not defined for servo: {}'.format(self.name))
+            LOG.log(POSITION_UNDEFINED, 'back', self.name)
 
     def move_up(self):
         if self.up is not None:
             self.set_position(self.up)
         else:
-            print('WARNING: up not defined for servo: {}'.format(self.name))
+            LOG.log(POSITION_UNDEFINED, 'up', self.name)
         
     def move_down(self):
         if self.down is not None:
             self.set_position(self.down)
         else:
-            print('WARNING: down not defined for servo: {}'.format(self.name))
+            LOG.log(POSITION_UNDEFINED, 'down', self.name)
 
     def move_center(self):
         if self.center is not None:
             self.set_position(self.center)
         else:
-            print('WARNING: center not defined for servo: {}'.format(self.name))
+            LOG.log(POSITION_UNDEFINED, 'center', self.name)
     
     
-class Hexapod:
-    def __init__(self, config):
+class Hexapod(metaclass=abc.ABCMeta):
+    def __init__(self, config, backend=None):
+        # backend: overrides the 'backend' section of the config file
+        if backend is None:
+            backend = config.get('backend')
+
         self.boards = {}
+        self.board_list = []
         self.servos = {}
+        self.frame_depth = 0
+        self.smooth = config.get('smooth', False)
+        self.scheduler = MotionScheduler()
+        self.scheduler.histogram = METRICS.histogram(
+                'keyframe_lateness_seconds', 'how late keyframes start after their deadline')
+
+        servo_rows = []
         if 'boards' in config:
             for board in config['boards']:
                 address = board['board_address']
@@ -123,133 +230,416 @@ class Hexapod:
                 # print()
                 
                 self.boards[address] = {}
-                self.boards[address]['object'] = Adafruit_PCA9685.PCA9685(address=address)
+                self.boards[address]['object'] = create_board(address, backend)
                 self.boards[address]['pwm_freq'] = pwm_freq
                 self.boards[address]['object'].set_pwm_freq(pwm_freq)
+                self.board_list.append(self.boards[address]['object'])
                 
                 if 'servos' in board:
                     for servo in board['servos']:
-                        name = servo['name']
-                        channel = servo['channel']
-                        servo_min = servo['servo_min']
-                        servo_max = servo['servo_max']
-                        forward = servo['forward']
-                        back = servo['back']
-                        up = servo['up']
-                        down = servo['down']
-                        center = servo['center']
-                        invert = servo['invert']
-
-                        # print('Servo Name: {}'.format(name))
-                        # print('Servo Channel: {}'.format(channel))
-                        # print('Servo Min: {}'.format(servo_min))
-                        # print('Servo Max: {}'.format(servo_max))
-                        # print('Forward: {}%'.format(forward))
-                        # print('Back: {}%'.format(back))
-                        # print('Up: {}%'.format(up))
-                        # print('Down: {}%'.format(down))
-                        # print('Center: {}%'.format(center))
-                        # print()
-
-                        self.servos[name] = Servo(
-                            name=name,
-                            board=self.boards[address]['object'],
-                            channel=channel,
-                            servo_min=servo_min,
-                            servo_max=servo_max,
-                            forward=forward,
-                            back=back,
-                            up=up,
-                            down=down,
-                            center=center,
-                            invert=invert
-                        )
+                        row = dict(servo)
+                        row['board'] = len(self.board_list) - 1
+                        servo_rows.append(row)
                 else:
                     print('ERROR: No Servos found for the hexapod for board {}'.format(address))
                     
         else:
             print('ERROR: No boards found for the hexapod.')
 
+        self.bank = ServoBank(servo_rows)
+        for index, name in enumerate(self.bank.names):
+            self.servos[name] = Servo(self.bank, index, self.board_list)
+
+        # compiled movements, see play_gait()
+        self.gait_tables = LRUCache(GAIT_TABLE_CACHE)
+
+        METRICS.collector(self.board_metrics)
+
+        # one writer thread per board so multi-board frames go out concurrently
+        self.writers = []
+        if backend and backend.get('parallel') and len(self.board_list) > 1:
+            self.barrier = threading.Barrier(len(self.board_list) + 1, timeout=WRITER_TIMEOUT)
+            for board in self.board_list:
+                self.writers.append(BoardWriter(board))
+
+            for writer in self.writers:
+                writer.start()
+
+    def close(self):
+        METRICS.remove_collector(self.board_metrics)
+
+        for writer in self.writers:
+            writer.stop()
+
+        self.writers = []
+
+    @contextlib.contextmanager
+    def frame(self):
+        # Stage servo writes on every board until the outermost frame closes
+        if self.frame_depth == 0:
+            for board in self.board_list:
+                board.begin_frame()
+
+            # keyframe deadlines of this movement count from now
+            self.scheduler.start()
+
+        self.frame_depth += 1
+        try:
+            yield
+        finally:
+            self.frame_depth -= 1
+            if self.frame_depth == 0:
+                self.commit_frame()
+                for board in self.board_list:
+                    board.end_frame()
+
+                self.scheduler.stop()
+
+    def commit_frame(self):
+        # Send the staged pose, one block write per board (pca9685.frame_blocks)
+        start = time.perf_counter()
+        self.send_frame()
+        FRAME_COMMIT_SECONDS.record(time.perf_counter() - start)
+
+    def send_frame(self):
+        if self.writers:
+            frames = [board.take_frame() for board in self.board_list]
+            if not any(frames):
+                return
+
+            barrier = self.barrier
+            for writer, frame in zip(self.writers, frames):
+                writer.frames.put((frame, barrier))
+
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                # a writer is stuck or gone: the next frames meet at a new
+                # barrier, a writer finishing this one late only finds it broken
+                self.barrier = threading.Barrier(barrier.parties, timeout=WRITER_TIMEOUT)
+                raise
+
+            for writer in self.writers:
+                if writer.error is not None:
+                    error, writer.error = writer.error, None
+                    raise error
+        else:
+            for board in self.board_list:
+                board.commit_frame()
+
+    def board_stats(self):
+        # Write-elision counters of every board: {address: {hits, misses, writes}}
+        return {hex(address): board['object'].stats() for address, board in self.boards.items()}
+
+    def caches(self):
+        # LRUCaches of the hexapod by name
+        return {'gait_tables': self.gait_tables}
+
+    def cache_stats(self):
+        # {'boards': board_stats(), cache name: {size, hits, misses, evictions}}
+        stats = {name: cache.stats() for name, cache in self.caches().items()}
+        stats['boards'] = self.board_stats()
+        return stats
+
+    def reset_cache_stats(self):
+        for board in self.boards.values():
+            board['object'].reset_stats()
+
+        for cache in self.caches().values():
+            cache.reset_stats()
+
+    def timing_report(self):
+        return self.scheduler.report()
+
+    def board_metrics(self):
+        # metrics.Registry collector for the write-elision counters of the boards
+        samples = []
+        for address, stats in self.board_stats().items():
+            board = {'board': address}
+            samples.append(('set_pwm_total', 'counter', board, stats['hits'] + stats['misses']))
+            samples.append(('set_pwm_elided_total', 'counter', board, stats['hits']))
+            samples.append(('i2c_writes_total', 'counter', board, stats['writes']))
+
+        for name, cache in self.caches().items():
+            stats = cache.stats()
+            labels = {'cache': name}
+            samples.append(('cache_entries', 'gauge', labels, stats['size']))
+            samples.append(('cache_hits_total', 'counter', labels, stats['hits']))
+            samples.append(('cache_misses_total', 'counter', labels, stats['misses']))
+            samples.append(('cache_evictions_total', 'counter', labels, stats['evictions']))
+
+        return samples
+
+    def sleep(self, seconds):
+        # Commit the current keyframe and wait for the deadline of the next one
+        self.commit_frame()
+        self.scheduler.wait(seconds)
+
+    def write_pulses(self, indices, pulses):
+        SERVO_WRITES.inc(len(pulses))
+        boards = self.bank.board[indices].tolist()
+        channels = self.bank.channel[indices].tolist()
+
+        for board, channel, pulse in zip(boards, channels, pulses.tolist()):
+            self.board_list[board].set_pwm(channel, 0, pulse)
+
+        self.bank.current[indices] = pulses
+
+    def compile_gait(self, method_name, *args, **kwargs):
+        # Keyframe table of a movement, compiled once per arguments, servo tuning
+        # and, unless the movement is absolute, starting pose
+        pose = None
+        if not getattr(getattr(self, method_name), 'absolute', False):
+            pose = self.bank.current.tobytes()
+
+        key = (method_name, args, tuple(sorted(kwargs.items())), pose, self.bank.version)
+        return self.gait_tables.get(key, lambda: compile_gait(self, method_name, *args, **kwargs))
+
+    @motion
+    def play(self, table):
+        # Replay a GaitTable at its keyframe times
+        elapsed = 0.0
+        for offset, writes in table.frames:
+            if offset > elapsed:
+                self.sleep(offset - elapsed)
+                elapsed = offset
+
+            for servo, board, channel, pulse in writes:
+                self.board_list[board].set_pwm(channel, 0, pulse)
+                self.bank.current[servo] = pulse
+
+        if table.duration > elapsed:
+            self.sleep(table.duration - elapsed)
+
+    def play_gait(self, method_name, *args, **kwargs):
+        self.play(self.compile_gait(method_name, *args, **kwargs))
+
+    @motion
+    def play_frames(self, frames, rate=DEFAULT_RATE):
+        # Stream pulse frames (T, servos), or any iterable of them, at rate Hz: one
+        # block write per frame and board with only the servos that change
+        indices = np.arange(len(self.bank))
+
+        for frame in frames:
+            frame = np.rint(frame).astype(np.int64)
+            changed = frame != self.bank.current
+            self.write_pulses(indices[changed], frame[changed])
+            self.sleep(1 / rate)
+
+    @motion
+    def move_smooth(self, percent, duration, rate=DEFAULT_RATE, profile='minimum_jerk'):
+        # Glide every servo from where it is to percent (one value per servo,
+        # NaN to hold) in duration seconds. Servos never set before jump there.
+        percent = np.asarray(percent, dtype=float)
+        defined = ~np.isnan(percent)
+
+        start = self.bank.current.astype(float)
+        end = start.copy()
+        end[defined] = self.bank.percent_to_pulse(percent[defined], np.flatnonzero(defined))
+
+        unknown = start < 0
+        start[unknown] = end[unknown]
+
+        self.play_frames(interpolate(start, end, duration, rate, profile), rate)
+
+    @motion
+    def play_smooth(self, table, rate=DEFAULT_RATE, profile='minimum_jerk'):
+        # Play a GaitTable with interpolated transitions between its keyframes
+        if not table.frames:
+            return
+
+        times, poses = table_keyframes(table, self.bank.current)
+        frame_times, frames = keyframe_frames(times, poses, rate, profile)
+        self.play_frames(frames, rate)
+
+    def play_gait_smooth(self, method_name, *args, **kwargs):
+        self.play_smooth(self.compile_gait(method_name, *args, **kwargs))
+
+    def blend_gaits(self, calls, overlap=0.0):
+        # One GaitTable for a sequence of movements [(method_name, kwargs), ...]
+        # starting from the current pose, see gait_compiler.blend_tables()
+        key = ('blend', tuple((name, tuple(sorted(kwargs.items()))) for name, kwargs in calls),
+               overlap, self.bank.current.tobytes(), self.bank.version)
+
+        def build():
+            tables = [self.compile_gait(name, **kwargs) for name, kwargs in calls]
+            return blend_tables(tables, self.bank.current.tolist(), overlap)
+
+        return self.gait_tables.get(key, build)
+
+    def play_blended(self, calls, overlap=0.0, smooth=False):
+        table = self.blend_gaits(calls, overlap)
+        if smooth:
+            self.play_smooth(table)
+        else:
+            self.play(table)
+
+    @abc.abstractmethod
+    def gait_pulses(self, states, **params):
+        # Pulse frames (..., servos) for gait leg states (..., 6, 2), see gaits.py.
+        # Every model of HEXAPOD_CLASSES maps the leg states onto its own joints.
+        pass
+
+    def gait_poses(self, pattern='tripod', speed=1.0, rate=DEFAULT_RATE, duty_factor=None, back=False, **params):
+        # Endless pulse frames of a parametric gait (speed in cycles per second).
+        # One cycle is computed up front and repeated, legs never re-center.
+        states = gait_cycle(pattern, cycle_frames(speed, rate), duty_factor)
+        if back:
+            states[..., 0] *= -1
+
+        cycle = self.gait_pulses(states, **params)
+
+        while True:
+            for frame in cycle:
+                yield frame
+
+    @motion
+    def walk_gait(self, cycles=1, pattern='tripod', speed=1.0, rate=DEFAULT_RATE, duty_factor=None, back=False, **params):
+        # Walk cycles gait cycles, gliding into the first pose of the gait first
+        poses = self.gait_poses(pattern, speed, rate, duty_factor, back, **params)
+        first = next(poses)
+
+        start = self.bank.current.astype(float)
+        start[start < 0] = first[start < 0]
+        self.play_frames(interpolate(start, first, 0.25 / speed, rate), rate)
+
+        self.play_frames(itertools.islice(poses, cycles * cycle_frames(speed, rate)), rate)
+
+    def leg_indices(self, joint):
+        # Bank index of a joint for every leg, in servo_bank.LEGS order
+        return np.array([self.bank.index['{}_{}'.format(leg, joint)] for leg in LEGS], dtype=np.intp)
+
+    @motion
+    def set_positions(self, indices, percent):
+        # Move the servos at the given bank indices to percent (scalar or one per servo)
+        self.write_pulses(indices, self.bank.percent_to_pulse(percent, indices))
+
+    @motion
+    def move_group(self, legs, joint, position):
+        # Move one joint of a set of legs to a percent or a named position
+        # ('forward', 'back', 'up', 'down', 'center')
+        indices = self.bank.select(legs, joint)
+
+        if isinstance(position, str):
+            percent = self.bank.positions[position][indices]
+            defined = ~np.isnan(percent)
+
+            for index in indices[~defined]:
+                LOG.log(POSITION_UNDEFINED, position, self.bank.names[index])
+
+            indices = indices[defined]
+            percent = percent[defined]
+        else:
+            percent = position
+
+        self.set_positions(indices, percent)
+
+    @motion
+    def move_legs(self, legs, joint_values):
+        # joint_values: {joint: percent or None}, e.g. {'rotate': 50, 'raise': None}
+        indices = []
+        percents = []
+        for joint, value in joint_values.items():
+            if value is not None:
+                selected = self.bank.select(legs, joint)
+                indices.append(selected)
+                percents.append(np.full(len(selected), value, dtype=float))
+
+        if indices:
+            self.set_positions(np.concatenate(indices), np.concatenate(percents))
+
+    @motion
     def resting_state(self):
         self.move_all_uppers(100)
-        time.sleep(0.02)
+        self.sleep(0.02)
         self.move_all_lowers(0)
         
+    @motion
     def short_from_square_state(self):
         self.move_all_uppers(75)
-        time.sleep(0.02)
+        self.sleep(0.02)
         self.move_all_lowers(25)
 
+    @motion
     def short_from_resting_state(self):
         self.move_all_lowers(25)
-        time.sleep(0.02)
+        self.sleep(0.02)
         self.move_all_uppers(75)
         
+    @motion
     def square_from_tall_state(self):
         self.move_all_uppers(50)
-        time.sleep(0.02)
+        self.sleep(0.02)
         self.move_all_lowers(50)
         
+    @motion
     def square_from_short_state(self):
         self.move_all_lowers(50)
-        time.sleep(0.02)
+        self.sleep(0.02)
         self.move_all_uppers(50)
         
+    @motion
     def tall_state(self):
         self.move_all_lowers(75)
-        time.sleep(0.02)
+        self.sleep(0.02)
         self.move_all_uppers(25)
         
+    @motion
     def stand(self):
         self.short_from_resting_state()
     
+    @motion
     def sit(self):
         self.resting_state()
 
+    @absolute
+    @motion
     def rotate(self, left=False, timestep=0.3, back=None):
         # Raise the center legs
         self.move_center_lowers(15)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # position center legs for rotation
         if not left:
-            self.servos['left_center_rotate'].move_forward()
-            self.servos['right_center_rotate'].move_back()
+            self.move_group('left_center', 'rotate', 'forward')
+            self.move_group('right_center', 'rotate', 'back')
         else:
-            self.servos['left_center_rotate'].move_back()
-            self.servos['right_center_rotate'].move_forward()
+            self.move_group('left_center', 'rotate', 'back')
+            self.move_group('right_center', 'rotate', 'forward')
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # Drop center legs to control rotation
         self.move_center_lowers(30)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # position center legs for rotation
         if not left:
-            self.servos['left_center_rotate'].move_back()
-            self.servos['right_center_rotate'].move_forward()
+            self.move_group('left_center', 'rotate', 'back')
+            self.move_group('right_center', 'rotate', 'forward')
         else:
-            self.servos['left_center_rotate'].move_forward()
-            self.servos['right_center_rotate'].move_back()
+            self.move_group('left_center', 'rotate', 'forward')
+            self.move_group('right_center', 'rotate', 'back')
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # raise the middle legs to re-center
         self.move_center_lowers(15)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # center the middle legs
         self.move_center_rotators(50)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # reset the center legs to prep for next movement
         self.move_center_lowers(25)        
         
+    @absolute
+    @motion
     def row(self, forward=True):
         # forward = True
         sleep_time = 0.5
@@ -257,7 +647,7 @@ class Hexapod:
         # Raise the center legs
         self.move_center_lowers(15)
 
-        time.sleep(sleep_time)
+        self.sleep(sleep_time)
 
         # center the middle legs
         if forward:
@@ -265,12 +655,12 @@ class Hexapod:
         else:
             self.move_center_rotators(100)
 
-        time.sleep(sleep_time)
+        self.sleep(sleep_time)
 
         # plant legs for movement movement
         self.move_center_lowers(30)
 
-        time.sleep(sleep_time)    
+        self.sleep(sleep_time)    
 
         # row the center legs
         if forward:
@@ -278,744 +668,715 @@ class Hexapod:
         else:
             self.move_center_rotators(0)
 
-        time.sleep(sleep_time)
+        self.sleep(sleep_time)
 
         # raise legs
         self.move_center_lowers(15)
-        time.sleep(sleep_time)
+        self.sleep(sleep_time)
 
         # center legs
         self.move_center_rotators(50)
-        time.sleep(sleep_time)
+        self.sleep(sleep_time)
 
         # reset legs
         self.move_center_lowers(25)
         
+    @motion
     def align_all_legs(self):
         # - Center all rotation
-        
-        self.servos['left_front_rotate'].move_center()
-        time.sleep(0.01)
-        self.servos['right_front_rotate'].move_center()
-        time.sleep(0.01)
-
-        self.servos['left_center_rotate'].move_center()
-        time.sleep(0.01)
-        self.servos['right_center_rotate'].move_center()
-        time.sleep(0.01)
-
-        self.servos['left_back_rotate'].move_center()
-        time.sleep(0.01)
-        self.servos['right_back_rotate'].move_center()
-        time.sleep(0.01)
+        self.move_group('all', 'rotate', 'center')
 
+    @motion
     def center_all_legs(self):
-        self.move_back_rotators(50)
-        self.move_center_rotators(50)
-        self.move_front_rotators(50)
+        self.move_group('all', 'rotate', 50)
         
+    @motion
     def spread_all_legs(self):
-        self.servos['left_front_rotate'].move_forward()
-        time.sleep(0.01)
-        self.servos['right_front_rotate'].move_forward()
-        time.sleep(0.01)
-
-        self.servos['left_center_rotate'].move_center()
-        time.sleep(0.01)
-        self.servos['right_center_rotate'].move_center()
-        time.sleep(0.01)
-
-        self.servos['left_back_rotate'].move_back()
-        time.sleep(0.01)
-        self.servos['right_back_rotate'].move_back()
-        time.sleep(0.01)
+        self.move_group('front', 'rotate', 'forward')
+        self.move_group('center', 'rotate', 'center')
+        self.move_group('back', 'rotate', 'back')
 
+    @motion
     def move_front_rotators(self, position):
-        self.servos['left_front_rotate'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_front_rotate'].set_position(position)
-        time.sleep(0.01)
+        self.move_group('front', 'rotate', position)
 
+    @motion
     def move_center_rotators(self, position):
-        self.servos['left_center_rotate'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_center_rotate'].set_position(position)
-        time.sleep(0.01)
+        self.move_group('center', 'rotate', position)
 
+    @motion
     def move_back_rotators(self, position):
-        self.servos['left_back_rotate'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_back_rotate'].set_position(position)
-        time.sleep(0.01)
-        
+        self.move_group('back', 'rotate', position)
+
+    @motion
     def move_all_lowers(self, position):
         # - Move all lowers
-        self.servos['left_front_lower'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_front_lower'].set_position(position)
-        time.sleep(0.01)
-
-        self.servos['left_center_lower'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_center_lower'].set_position(position)
-        time.sleep(0.01)
-
-        self.servos['left_back_lower'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_back_lower'].set_position(position)
-        time.sleep(0.01)
-        
+        self.move_group('all', 'lower', position)
+
+    @motion
     def raise_all_lowers(self):
         self.move_all_lowers(0)
         
+    @motion
     def center_all_lowers(self):
         self.move_all_lowers(50)
         
+    @motion
     def lower_all_lowers(self):
         self.move_all_lowers(100)
-       
+
+    @motion
     def move_front_lowers(self, position):
-        self.servos['left_front_lower'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_front_lower'].set_position(position)
-        time.sleep(0.01)
-        
+        self.move_group('front', 'lower', position)
+
+    @motion
     def move_center_lowers(self, position):
-        self.servos['left_center_lower'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_center_lower'].set_position(position)
-        time.sleep(0.01)
-        
+        self.move_group('center', 'lower', position)
+
+    @motion
     def move_back_lowers(self, position):
-        self.servos['left_back_lower'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_back_lower'].set_position(position)
-        time.sleep(0.01)
-        
-    def move_right_lowers(self, position):
-        self.servos['right_front_lower'].set_position(position)
-        time.sleep(0.01)
+        self.move_group('back', 'lower', position)
 
-        self.servos['right_center_lower'].set_position(position)
-        time.sleep(0.01)
+    @motion
+    def move_right_lowers(self, position):
+        self.move_group('right', 'lower', position)
 
-        self.servos['right_back_lower'].set_position(position)
-        time.sleep(0.01)
-        
+    @motion
     def move_left_lowers(self, position):
-        self.servos['left_front_lower'].set_position(position)
-        time.sleep(0.01)
+        self.move_group('left', 'lower', position)
 
-        self.servos['left_center_lower'].set_position(position)
-        time.sleep(0.01)
-
-        self.servos['left_back_lower'].set_position(position)
-        time.sleep(0.01)
-                
+    @motion
     def move_right_left_right_lowers(self, position):
-        # - Move all lowers
-        self.servos['right_front_lower'].set_position(position)
-        time.sleep(0.01)
-
-        self.servos['left_center_lower'].set_position(position)
-        time.sleep(0.01)
+        self.move_group('right_left_right', 'lower', position)
 
-        self.servos['right_back_lower'].set_position(position)
-        time.sleep(0.01)
-            
+    @motion
     def move_left_right_left_lowers(self, position):
-        # - Move all lowers
-        self.servos['left_front_lower'].set_position(position)
-        time.sleep(0.01)
+        self.move_group('left_right_left', 'lower', position)
 
-        self.servos['right_center_lower'].set_position(position)
-        time.sleep(0.01)
-
-        self.servos['left_back_lower'].set_position(position)
-        time.sleep(0.01)        
-        
+    @motion
     def raise_all_uppers(self):
         self.move_all_uppers(0)
     
+    @motion
     def center_all_uppers(self):
         self.move_all_uppers(50)
         
+    @motion
     def lower_all_uppers(self):
         self.move_all_uppers(100)
 
+    @motion
     def move_all_uppers(self, position):
         # - Move all uppers
-        self.servos['left_front_upper'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_front_upper'].set_position(position)
-        time.sleep(0.01)
-
-        self.servos['left_center_upper'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_center_upper'].set_position(position)
-        time.sleep(0.01)
-
-        self.servos['left_back_upper'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_back_upper'].set_position(position)
-        time.sleep(0.01)
-        
+        self.move_group('all', 'upper', position)
+
+    @motion
     def move_front_uppers(self, position):
-        # - Move all uppers
-        self.servos['left_front_upper'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_front_upper'].set_position(position)
-        time.sleep(0.01)
-        
+        self.move_group('front', 'upper', position)
+
+    @motion
     def move_center_uppers(self, position):
-        self.servos['left_center_upper'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_center_upper'].set_position(position)
-        time.sleep(0.01)
-        
+        self.move_group('center', 'upper', position)
+
+    @motion
     def move_back_uppers(self, position):
-        self.servos['left_back_upper'].set_position(position)
-        time.sleep(0.01)
-        self.servos['right_back_upper'].set_position(position)
-        time.sleep(0.01)    
-        
-    def move_right_uppers(self, position):
-        # - Move all lowers
-        self.servos['right_front_upper'].set_position(position)
-        time.sleep(0.01)
+        self.move_group('back', 'upper', position)
 
-        self.servos['right_center_upper'].set_position(position)
-        time.sleep(0.01)
+    @motion
+    def move_right_uppers(self, position):
+        self.move_group('right', 'upper', position)
 
-        self.servos['right_back_upper'].set_position(position)
-        time.sleep(0.01)
-        
+    @motion
     def move_left_uppers(self, position):
-        # - Move all lowers
-        self.servos['left_front_upper'].set_position(position)
-        time.sleep(0.01)
+        self.move_group('left', 'upper', position)
 
-        self.servos['left_center_upper'].set_position(position)
-        time.sleep(0.01)
-
-        self.servos['left_back_upper'].set_position(position)
-        time.sleep(0.01)
-        
+    @motion
     def move_left_right_left_uppers(self, position):
-        # - Move all lowers
-        self.servos['left_front_upper'].set_position(position)
-        time.sleep(0.01)
-
-        self.servos['right_center_upper'].set_position(position)
-        time.sleep(0.01)
+        self.move_group('left_right_left', 'upper', position)
 
-        self.servos['left_back_upper'].set_position(position)
-        time.sleep(0.01)
-        
+    @motion
     def move_right_left_right_uppers(self, position):
-        # - Move all lowers
-        self.servos['right_front_upper'].set_position(position)
-        time.sleep(0.01)
+        self.move_group('right_left_right', 'upper', position)
 
-        self.servos['left_center_upper'].set_position(position)
-        time.sleep(0.01)
-
-        self.servos['right_back_upper'].set_position(position)
-        time.sleep(0.01)
-        
+    @motion
     def raise_all_legs(self):
         self.raise_all_uppers()
         self.raise_all_lowers()
+
+    # Server commands, see commands.py. Each returns the response for the client.
+
+    @property
+    def commands(self):
+        return command_table(type(self))
+
+    def describe_command(self, name, tokens=()):
+        # Estimated duration of a motion command and the servos it moves from the
+        # current pose, taken from its compiled keyframe table
+        command = self.commands[name]
+        if not command.motion:
+            return {'duration': 0.0, 'servos': []}
+
+        pose = self.bank.current.tolist()
+        table = self.compile_gait(command.method_name, **command.parse(tokens))
+
+        servos = set()
+        for offset, writes in table.frames:
+            for servo, board, channel, pulse in writes:
+                if pulse != pose[servo]:
+                    servos.add(servo)
+                    pose[servo] = pulse
+
+        return {'duration': table.duration, 'servos': [self.bank.names[servo] for servo in sorted(servos)]}
+
+    @command('walk_forward', ITERATION, aliases=['walk'], help='tripod steps forward')
+    def command_walk(self, iteration=1):
+        self.play_blended([('left_right_left_step' if i%2 else 'right_left_right_step', {})
+                           for i in range(iteration)], overlap=BLEND_OVERLAP, smooth=self.smooth)
+        return 'Walking Forward {} times'.format(iteration)
+
+    @command('walk_backward', ITERATION, aliases=['walk_back'], help='tripod steps backward')
+    def command_walk_back(self, iteration=1):
+        self.play_blended([('left_right_left_step_back' if i%2 else 'right_left_right_step_back', {})
+                           for i in range(iteration)], overlap=BLEND_OVERLAP, smooth=self.smooth)
+        return 'Walking Backward {} times'.format(iteration)
+
+    @command('turn_left', ITERATION, help='turn left while stepping')
+    def command_turn_left(self, iteration=1):
+        self.play_blended([('turn_left', {})] * iteration, overlap=BLEND_OVERLAP, smooth=self.smooth)
+        return 'Turning Left {} times'.format(iteration)
+
+    @command('turn_right', ITERATION, help='turn right while stepping')
+    def command_turn_right(self, iteration=1):
+        self.play_blended([('turn_right', {})] * iteration, overlap=BLEND_OVERLAP, smooth=self.smooth)
+        return 'Turning Right {} times'.format(iteration)
+
+    @command('rotate_left', ITERATION, help='rotate left in place', left=True)
+    @command('rotate_right', ITERATION, help='rotate right in place', left=False)
+    def command_rotate(self, iteration=1, left=False):
+        self.play_blended([('rotate', {'left': left, 'back': not i%2}) for i in range(iteration)],
+                          overlap=BLEND_OVERLAP, smooth=self.smooth)
+        return 'Rotating {} {} times'.format('Left' if left else 'Right', iteration)
+
+    @command('row', ITERATION + [('direction', choice('forward', 'back'), 'forward')],
+             help='row with the center legs')
+    def command_row(self, iteration=1, direction='forward'):
+        self.play_blended([('row', {'forward': direction == 'forward'})] * iteration,
+                          overlap=BLEND_OVERLAP, smooth=self.smooth)
+        return 'Rowing {} {} times'.format(direction.capitalize(), iteration)
+
+    @command('front_dancing_1', ITERATION, help='dance with the front legs', front=True, step=1)
+    @command('front_dancing_2', ITERATION, help='dance with the front legs', front=True, step=2)
+    @command('back_dancing_1', ITERATION, help='dance with the back legs', front=False, step=1)
+    @command('back_dancing_2', ITERATION, help='dance with the back legs', front=False, step=2)
+    def command_dancing(self, iteration=1, front=True, step=1):
+        if front:
+            self.front_leg_dancing(step=step, iteration=iteration)
+        else:
+            self.back_leg_dancing(step=step, iteration=iteration)
+
+        return 'Dancing {} Legs {} times'.format('Front' if front else 'Back', iteration)
+
+    @command('tripod', ITERATION, help='continuous tripod gait', pattern='tripod')
+    @command('tripod_back', ITERATION, help='continuous tripod gait', pattern='tripod', direction='back')
+    @command('ripple', ITERATION, help='continuous ripple gait', pattern='ripple')
+    @command('ripple_back', ITERATION, help='continuous ripple gait', pattern='ripple', direction='back')
+    @command('wave', ITERATION, help='continuous wave gait', pattern='wave')
+    @command('wave_back', ITERATION, help='continuous wave gait', pattern='wave', direction='back')
+    @command('gait', [('pattern', choice(*sorted(PATTERNS)), 'tripod')] + ITERATION
+             + [('direction', choice('forward', 'back'), 'forward')],
+             help='continuous gait of any pattern in gaits.PATTERNS')
+    def command_gait(self, pattern='tripod', iteration=1, direction='forward'):
+        self.walk_gait(cycles=iteration, pattern=pattern, back=direction == 'back')
+        return 'Walking {} Gait {} {} cycles'.format(pattern.capitalize(), direction.capitalize(), iteration)
+
+    @command('sit', help='sit down')
+    def command_sit(self):
+        self.sit()
+        return 'Sitting'
+
+    @command('stand', help='stand up')
+    def command_stand(self):
+        self.stand()
+        return 'Standing'
+
+    @command('center', help='center all legs')
+    def command_center(self):
+        self.center_all_legs()
+        return 'Centering All Legs'
+
+    @command('align', help='align all legs')
+    def command_align(self):
+        self.align_all_legs()
+        return 'Aligning All Legs'
+
+    @command('spread', help='spread all legs')
+    def command_spread(self):
+        self.spread_all_legs()
+        return 'Spreading All Legs'
+
+    @command('cache_stats', help='servo write cache counters', motion=False)
+    def command_cache_stats(self):
+        stats = self.cache_stats()
+        temp = 'Servo Write Cache: '
+        for address, board in stats.pop('boards').items():
+            temp += '{} hits={} misses={} writes={}, '.format(
+                    address, board['hits'], board['misses'], board['writes'])
+
+        for name, cache in sorted(stats.items()):
+            temp += '{} size={} hits={} misses={} evictions={}, '.format(
+                    name, cache['size'], cache['hits'], cache['misses'], cache['evictions'])
+
+        return temp
+
+    @command('stats', help='counters, gauges and latency percentiles', motion=False)
+    def command_stats(self):
+        return 'Stats: ' + ', '.join(METRICS.report())
+
+    @command('timing', help='keyframe lateness', motion=False)
+    def command_timing(self):
+        temp = 'Keyframe Lateness: '
+        for key, value in sorted(self.timing_report().items()):
+            temp += '{}={:.3f}, '.format(key, value) if isinstance(value, float) else '{}={}, '.format(key, value)
+
+        return temp
         
 class Hexapod_12DOF(Hexapod):
-    def __init__(self, config):
-        super().__init__(config)
+    def __init__(self, config, backend=None):
+        super().__init__(config, backend)
+
+    def gait_pulses(self, states, stride=1.0, step_height=1.0):
+        # stride: fraction of the forward/back swing, negative walks backward
+        # step_height: fraction of the way from center to up while swinging
+        rotate = self.leg_indices('rotate')
+        lift = self.leg_indices('raise')
+
+        forward = self.bank.positions['forward'][rotate]
+        back = self.bank.positions['back'][rotate]
+        center = self.bank.positions['center'][lift]
+        up = self.bank.positions['up'][lift]
+
+        rotate_percent = (forward + back)/2 + states[..., 0] * stride * (forward - back)/2
+        raise_percent = center + states[..., 1] * step_height * (up - center)
+
+        frames = np.broadcast_to(self.bank.current, states.shape[:-2] + (len(self.bank),)).copy()
+        frames[..., rotate] = self.bank.percent_to_pulse(rotate_percent, rotate)
+        frames[..., lift] = self.bank.percent_to_pulse(raise_percent, lift)
+
+        return frames
         
+    @motion
     def initial_tests(self, timestep=1):
         self.move_all_legs(raise_value=0, rotate_value=100)
-        time.sleep(timestep)
+        self.sleep(timestep)
         self.move_all_legs(raise_value=100, rotate_value=100)
-        time.sleep(timestep)
+        self.sleep(timestep)
         self.move_all_legs(raise_value=0, rotate_value=100)
     
+    @motion
     def sit(self):
         self.lower_height()
 
+    @motion
     def stand(self):
         self.center_height()
 
+    @motion
     def center_all_legs(self):
         pass
 
+    @motion
     def align_all_legs(self):
         pass
 
+    @motion
     def spread_all_legs(self):
         pass
 
+    @motion
     def lower_height(self):
-        self.servos['right_front_raise'].set_position(0)
-        self.servos['right_center_raise'].set_position(0)
-        self.servos['right_back_raise'].set_position(0)
-        self.servos['left_front_raise'].set_position(0)
-        self.servos['left_center_raise'].set_position(0)
-        self.servos['left_back_raise'].set_position(0)
+        self.move_group('all', 'raise', 0)
         
+    @motion
     def center_height(self):
-        self.servos['right_front_raise'].set_position(50)
-        self.servos['right_center_raise'].set_position(50)
-        self.servos['right_back_raise'].set_position(50)
-        self.servos['left_front_raise'].set_position(50)
-        self.servos['left_center_raise'].set_position(50)
-        self.servos['left_back_raise'].set_position(50)
+        self.move_group('all', 'raise', 50)
         
+    @motion
     def raise_height(self):
-        self.servos['right_front_raise'].set_position(100)
-        self.servos['right_center_raise'].set_position(100)
-        self.servos['right_back_raise'].set_position(100)
-        self.servos['left_front_raise'].set_position(100)
-        self.servos['left_center_raise'].set_position(100)
-        self.servos['left_back_raise'].set_position(100)
+        self.move_group('all', 'raise', 100)
         
+    @absolute
+    @motion
     def right_left_right_step(self, time_step=0.2):
         # Prep for a step (right-left-right step)
-        self.servos['right_front_raise'].move_center()
-        self.servos['right_center_raise'].move_center()
-        self.servos['right_back_raise'].move_center()
-        self.servos['left_front_raise'].move_center()
-        self.servos['left_center_raise'].move_center()
-        self.servos['left_back_raise'].move_center()
+        self.move_group('all', 'raise', 'center')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Raise 3 legs
-        self.servos['right_front_raise'].move_up()
-        self.servos['left_center_raise'].move_up()
-        self.servos['right_back_raise'].move_up()
+        self.move_group('right_left_right', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate 3 legs forward
-        self.servos['right_front_rotate'].move_forward()
-        self.servos['left_center_rotate'].move_forward()
-        self.servos['right_back_rotate'].move_forward()
+        self.move_group('right_left_right', 'rotate', 'forward')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Lower 3 legs
-        self.servos['right_front_raise'].set_position(70)
-        self.servos['left_center_raise'].set_position(70)
-        self.servos['right_back_raise'].set_position(70)
+        self.move_group('right_left_right', 'raise', 70)
         
-        self.servos['left_front_raise'].move_up()
-        self.servos['right_center_raise'].move_up()
-        self.servos['left_back_raise'].move_up()
+        self.move_group('left_right_left', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate 3 legs back
-        self.servos['right_front_rotate'].move_back()
-        self.servos['left_center_rotate'].move_back()
-        self.servos['right_back_rotate'].move_back()
+        self.move_group('right_left_right', 'rotate', 'back')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Center 3 legs
-        self.servos['right_front_raise'].move_center()
-        self.servos['left_center_raise'].move_center()
-        self.servos['right_back_raise'].move_center()
-        self.servos['left_front_raise'].move_center()
-        self.servos['right_center_raise'].move_center()
-        self.servos['left_back_raise'].move_center()
+        self.move_group('all', 'raise', 'center')
     
+    @absolute
+    @motion
     def left_right_left_step(self, time_step=0.2):
         # Prep for a step (left-right-left step)
-        self.servos['right_front_raise'].move_center()
-        self.servos['right_center_raise'].move_center()
-        self.servos['right_back_raise'].move_center()
-        self.servos['left_front_raise'].move_center()
-        self.servos['left_center_raise'].move_center()
-        self.servos['left_back_raise'].move_center()
+        self.move_group('all', 'raise', 'center')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Raise 3 legs
-        self.servos['left_front_raise'].move_up()
-        self.servos['right_center_raise'].move_up()
-        self.servos['left_back_raise'].move_up()
+        self.move_group('left_right_left', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate 3 legs forward
-        self.servos['left_front_rotate'].move_forward()
-        self.servos['right_center_rotate'].move_forward()
-        self.servos['left_back_rotate'].move_forward()
+        self.move_group('left_right_left', 'rotate', 'forward')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Lower 3 legs
-        self.servos['left_front_raise'].set_position(70)
-        self.servos['right_center_raise'].set_position(70)
-        self.servos['left_back_raise'].set_position(70)
+        self.move_group('left_right_left', 'raise', 70)
         
-        self.servos['right_front_raise'].move_up()
-        self.servos['left_center_raise'].move_up()
-        self.servos['right_back_raise'].move_up()
+        self.move_group('right_left_right', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate 3 legs back
-        self.servos['left_front_rotate'].move_back()
-        self.servos['right_center_rotate'].move_back()
-        self.servos['left_back_rotate'].move_back()
+        self.move_group('left_right_left', 'rotate', 'back')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Center 3 legs
-        self.servos['left_front_raise'].move_center()
-        self.servos['right_center_raise'].move_center()
-        self.servos['left_back_raise'].move_center()
-        self.servos['right_front_raise'].move_center()
-        self.servos['left_center_raise'].move_center()
-        self.servos['right_back_raise'].move_center()
+        self.move_group('all', 'raise', 'center')
     
+    @absolute
+    @motion
     def left_right_left_step_back(self, time_step=0.2):
         # Prep for a step (left-right-left step)
-        self.servos['right_front_raise'].move_center()
-        self.servos['right_center_raise'].move_center()
-        self.servos['right_back_raise'].move_center()
-        self.servos['left_front_raise'].move_center()
-        self.servos['left_center_raise'].move_center()
-        self.servos['left_back_raise'].move_center()
+        self.move_group('all', 'raise', 'center')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Lower 3 legs
-        self.servos['left_front_raise'].set_position(70)
-        self.servos['right_center_raise'].set_position(70)
-        self.servos['left_back_raise'].set_position(70)
+        self.move_group('left_right_left', 'raise', 70)
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate 3 legs back
-        self.servos['left_front_rotate'].move_forward()
-        self.servos['right_center_rotate'].move_forward()
-        self.servos['left_back_rotate'].move_forward()
+        self.move_group('left_right_left', 'rotate', 'forward')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Raise 3 legs
-        self.servos['left_front_raise'].move_up()
-        self.servos['right_center_raise'].move_up()
-        self.servos['left_back_raise'].move_up()
+        self.move_group('left_right_left', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate 3 legs back
-        self.servos['left_front_rotate'].move_back()
-        self.servos['right_center_rotate'].move_back()
-        self.servos['left_back_rotate'].move_back()
+        self.move_group('left_right_left', 'rotate', 'back')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Center 3 legs
-        self.servos['left_front_raise'].move_center()
-        self.servos['right_center_raise'].move_center()
-        self.servos['left_back_raise'].move_center()
+        self.move_group('left_right_left', 'raise', 'center')
 
+    @absolute
+    @motion
     def right_left_right_step_back(self, time_step=0.2):
         # Prep for a step (left-right-left step)
-        self.servos['right_front_raise'].move_center()
-        self.servos['right_center_raise'].move_center()
-        self.servos['right_back_raise'].move_center()
-        self.servos['left_front_raise'].move_center()
-        self.servos['left_center_raise'].move_center()
-        self.servos['left_back_raise'].move_center()
+        self.move_group('all', 'raise', 'center')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Lower 3 legs
-        self.servos['right_front_raise'].set_position(70)
-        self.servos['left_center_raise'].set_position(70)
-        self.servos['right_back_raise'].set_position(70)
+        self.move_group('right_left_right', 'raise', 70)
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate 3 legs back
-        self.servos['right_front_rotate'].move_forward()
-        self.servos['left_center_rotate'].move_forward()
-        self.servos['right_back_rotate'].move_forward()
+        self.move_group('right_left_right', 'rotate', 'forward')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Raise 3 legs
-        self.servos['right_front_raise'].move_up()
-        self.servos['left_center_raise'].move_up()
-        self.servos['right_back_raise'].move_up()
+        self.move_group('right_left_right', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate 3 legs back
-        self.servos['right_front_rotate'].move_back()
-        self.servos['left_center_rotate'].move_back()
-        self.servos['right_back_rotate'].move_back()
+        self.move_group('right_left_right', 'rotate', 'back')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Center 3 legs
-        self.servos['right_front_raise'].move_center()
-        self.servos['left_center_raise'].move_center()
-        self.servos['right_back_raise'].move_center()
+        self.move_group('right_left_right', 'raise', 'center')
         
+    @absolute
+    @motion
     def turn_left(self, time_step=0.2):
         # Raise right front/back legs
-        self.servos['right_front_raise'].move_up()
-        self.servos['right_back_raise'].move_up()
+        self.move_group('right_front_back', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate forward
-        self.servos['right_front_rotate'].move_forward()
-        self.servos['right_back_rotate'].move_forward()
+        self.move_group('right_front_back', 'rotate', 'forward')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Raise right front/back legs
-        self.servos['right_front_raise'].set_position(90)
-        self.servos['right_center_raise'].move_up()
-        self.servos['right_back_raise'].set_position(90)
+        self.move_group('right_front_back', 'raise', 90)
+        self.move_group('right_center', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate Center
-        self.servos['right_front_rotate'].move_center()
-        self.servos['right_back_rotate'].move_center()
+        self.move_group('right_front_back', 'rotate', 'center')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Raise right front/back legs
-        self.servos['right_front_raise'].move_center()
-        self.servos['right_center_raise'].move_center()
-        self.servos['right_back_raise'].move_center()
+        self.move_group('right', 'raise', 'center')
         
+    @absolute
+    @motion
     def turn_right(self, time_step=0.2):
         # Raise left front/back legs
-        self.servos['left_front_raise'].move_up()
-        self.servos['left_back_raise'].move_up()
+        self.move_group('left_front_back', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate forward
-        self.servos['left_front_rotate'].move_forward()
-        self.servos['left_back_rotate'].move_forward()
+        self.move_group('left_front_back', 'rotate', 'forward')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Raise left front/back legs
-        self.servos['left_front_raise'].set_position(90)
-        self.servos['left_center_raise'].move_up()
-        self.servos['left_back_raise'].set_position(90)
+        self.move_group('left_front_back', 'raise', 90)
+        self.move_group('left_center', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Rotate Center
-        self.servos['left_front_rotate'].move_center()
-        self.servos['left_back_rotate'].move_center()
+        self.move_group('left_front_back', 'rotate', 'center')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         # Raise left front/back legs
-        self.servos['left_front_raise'].move_center()
-        self.servos['left_center_raise'].move_center()
-        self.servos['left_back_raise'].move_center()
+        self.move_group('left', 'raise', 'center')
 
+    @absolute
+    @motion
     def row(self, timestep=0.3, back=False):
         self.move_all_legs(rotate_value=100, raise_value=50)
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         if back:
             self.move_center_legs(raise_value=70)
-            time.sleep(timestep)
+            self.sleep(timestep)
 
             self.move_center_legs(rotate_value=0)
-            time.sleep(timestep)
+            self.sleep(timestep)
 
             self.move_center_legs(raise_value=0)
-            time.sleep(timestep)
+            self.sleep(timestep)
         else:
             self.move_center_legs(raise_value=0)
-            time.sleep(timestep)
+            self.sleep(timestep)
 
             self.move_center_legs(rotate_value=0)
-            time.sleep(timestep)
+            self.sleep(timestep)
 
             self.move_center_legs(raise_value=70)
-            time.sleep(timestep)
+            self.sleep(timestep)
 
         self.move_center_legs(rotate_value=100)
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         self.move_center_legs(raise_value=50)
-        time.sleep(timestep)        
+        self.sleep(timestep)        
         
+    @command('row', ITERATION + [('direction', choice('forward', 'back'), 'forward')],
+             help='row with the center legs')
+    def command_row(self, iteration=1, direction='forward'):
+        self.play_blended([('row', {'back': direction == 'back'})] * iteration,
+                          overlap=BLEND_OVERLAP, smooth=self.smooth)
+        return 'Rowing {} {} times'.format(direction.capitalize(), iteration)
+
+    @absolute
+    @motion
     def rotate(self, timestep=0.3, left=False, back=False):
         self.move_all_legs(rotate_value=100, raise_value=50)
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         if back:
             self.move_center_legs(raise_value=70)
-            time.sleep(timestep)
-            time.sleep(timestep)
+            self.sleep(timestep)
+            self.sleep(timestep)
 
             if left:
                 self.move_leg('left_center', rotate_value=0)
             else:
                 self.move_leg('right_center', rotate_value=0)
 
-            time.sleep(timestep)
+            self.sleep(timestep)
 
             self.move_center_legs(raise_value=0)
-            time.sleep(timestep)        
+            self.sleep(timestep)        
         else:
             self.move_center_legs(raise_value=0)
-            time.sleep(timestep)
+            self.sleep(timestep)
 
             if left:
                 self.move_leg('right_center', rotate_value=0)
             else:
                 self.move_leg('left_center', rotate_value=0)
 
-            time.sleep(timestep)
+            self.sleep(timestep)
 
             self.move_center_legs(raise_value=70)
-            time.sleep(timestep)
-            time.sleep(timestep)
+            self.sleep(timestep)
+            self.sleep(timestep)
 
 
         self.move_center_legs(rotate_value=100)
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         self.move_center_legs(raise_value=50)
-        time.sleep(timestep)
+        self.sleep(timestep)
         
+    @motion
     def move_leg(self, name, rotate_value=None, raise_value=None):
-        if rotate_value is not None:
-            self.servos[name + '_rotate'].set_position(rotate_value)
-
-        if raise_value is not None:
-            self.servos[name + '_raise'].set_position(raise_value)
+        self.move_legs(name, {'rotate': rotate_value, 'raise': raise_value})
             
+    @motion
     def move_all_legs(self, rotate_value=None, raise_value=None):
-        self.move_leg('right_front', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('right_center', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('right_back', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('left_front', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('left_center', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('left_back', rotate_value=rotate_value, raise_value=raise_value)
-            
+        self.move_legs('all', {'rotate': rotate_value, 'raise': raise_value})
+
+    @motion
     def move_right_legs(self, rotate_value=None, raise_value=None):
-        self.move_leg('right_front', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('right_center', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('right_back', rotate_value=rotate_value, raise_value=raise_value)
+        self.move_legs('right', {'rotate': rotate_value, 'raise': raise_value})
 
+    @motion
     def move_left_legs(self, rotate_value=None, raise_value=None):
-        self.move_leg('left_front', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('left_center', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('left_back', rotate_value=rotate_value, raise_value=raise_value)            
-            
+        self.move_legs('left', {'rotate': rotate_value, 'raise': raise_value})
+
+    @motion
     def move_front_legs(self, rotate_value=None, raise_value=None):
-        self.move_leg('right_front', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('left_front', rotate_value=rotate_value, raise_value=raise_value)
-                    
+        self.move_legs('front', {'rotate': rotate_value, 'raise': raise_value})
+
+    @motion
     def move_center_legs(self, rotate_value=None, raise_value=None):
-        self.move_leg('right_center', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('left_center', rotate_value=rotate_value, raise_value=raise_value)
-            
+        self.move_legs('center', {'rotate': rotate_value, 'raise': raise_value})
+
+    @motion
     def move_back_legs(self, rotate_value=None, raise_value=None):
-        self.move_leg('right_back', rotate_value=rotate_value, raise_value=raise_value)
-        self.move_leg('left_back', rotate_value=rotate_value, raise_value=raise_value) 
-            
+        self.move_legs('back', {'rotate': rotate_value, 'raise': raise_value})
+
+    @motion
     def reposition_front_legs(self, position, time_step=0.5):
         # Raise Legs and wiggle
         self.move_front_legs(raise_value=0)
-        time.sleep(time_step)
+        self.sleep(time_step)
         self.move_front_legs(rotate_value=position)
-        time.sleep(time_step)
+        self.sleep(time_step)
         self.move_front_legs(raise_value=50)
         
+    @motion
     def reposition_center_legs(self, position, time_step=0.5):
         # Raise Legs and wiggle
         self.move_center_legs(raise_value=0)
-        time.sleep(time_step)
+        self.sleep(time_step)
         self.move_center_legs(rotate_value=position)
-        time.sleep(time_step)
+        self.sleep(time_step)
         self.move_center_legs(raise_value=50)
         
+    @motion
     def reposition_back_legs(self, position, time_step=0.5):
         # Raise Legs and wiggle
         self.move_back_legs(raise_value=0)
-        time.sleep(time_step)
+        self.sleep(time_step)
         self.move_back_legs(rotate_value=position)
-        time.sleep(time_step)
+        self.sleep(time_step)
         self.move_back_legs(raise_value=50)
         
+    @motion
     def front_to_back_wave(self, time_step=0.2):
-        self.servos['left_front_rotate'].move_back()
-        self.servos['right_front_rotate'].move_back()
+        self.move_group('front', 'rotate', 'back')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
-        self.servos['left_front_rotate'].move_forward()
-        self.servos['right_front_rotate'].move_forward()
+        self.move_group('front', 'rotate', 'forward')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
         
+    @motion
     def side_to_side_wave(self, time_step=0.2):
-        self.servos['left_front_rotate'].move_forward()
-        self.servos['right_front_rotate'].move_back()
+        self.move_group('left_front', 'rotate', 'forward')
+        self.move_group('right_front', 'rotate', 'back')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
-        self.servos['left_front_rotate'].move_back()
-        self.servos['right_front_rotate'].move_forward()
+        self.move_group('left_front', 'rotate', 'back')
+        self.move_group('right_front', 'rotate', 'forward')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
         
+    @motion
     def front_to_back_wave_back(self, time_step=0.2):
-        self.servos['left_back_rotate'].move_back()
-        self.servos['right_back_rotate'].move_back()
+        self.move_group('back', 'rotate', 'back')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
-        self.servos['left_back_rotate'].move_forward()
-        self.servos['right_back_rotate'].move_forward()
+        self.move_group('back', 'rotate', 'forward')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
         
+    @motion
     def side_to_side_wave_back(self, time_step=0.2):
-        self.servos['left_back_rotate'].move_forward()
-        self.servos['right_back_rotate'].move_back()
+        self.move_group('left_back', 'rotate', 'forward')
+        self.move_group('right_back', 'rotate', 'back')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
-        self.servos['left_back_rotate'].move_back()
-        self.servos['right_back_rotate'].move_forward()
+        self.move_group('left_back', 'rotate', 'back')
+        self.move_group('right_back', 'rotate', 'forward')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
         
+    @motion
     def front_leg_dancing(self, step=1, time_step=0.5, iteration=4):
         self.reposition_center_legs(0)
         self.move_center_legs(raise_value=100)
         
-        self.servos['left_center_raise'].move_down()
-        self.servos['right_center_raise'].move_down()
+        self.move_group('center', 'raise', 'down')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
-        self.servos['left_front_raise'].move_up()
-        self.servos['right_front_raise'].move_up()
+        self.move_group('front', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
         for i in range(iteration):
             if step == 1:
@@ -1025,34 +1386,30 @@ class Hexapod_12DOF(Hexapod):
             else:
                 pass # not implemented yet!
 
-        self.servos['left_front_rotate'].move_center()
-        self.servos['right_front_rotate'].move_center()
+        self.move_group('front', 'rotate', 'center')
 
-        self.servos['left_center_raise'].move_center()
-        self.servos['right_center_raise'].move_center()
+        self.move_group('center', 'raise', 'center')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
-        self.servos['left_front_raise'].move_center()
-        self.servos['right_front_raise'].move_center()
+        self.move_group('front', 'raise', 'center')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
         
         self.reposition_center_legs(100)
         
+    @motion
     def back_leg_dancing(self, step=1, time_step=0.5, iteration=4):
         self.reposition_center_legs(100)
         self.move_center_legs(raise_value=100)
         
-        self.servos['left_center_raise'].move_down()
-        self.servos['right_center_raise'].move_down()
+        self.move_group('center', 'raise', 'down')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
-        self.servos['left_back_raise'].move_up()
-        self.servos['right_back_raise'].move_up()
+        self.move_group('back', 'raise', 'up')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
         for i in range(iteration):
             if step == 1:
                 self.side_to_side_wave_back(time_step)
@@ -1061,89 +1418,149 @@ class Hexapod_12DOF(Hexapod):
             else:
                 pass # not implemented yet!
 
-        self.servos['left_back_rotate'].move_center()
-        self.servos['right_back_rotate'].move_center()
+        self.move_group('back', 'rotate', 'center')
 
-        self.servos['left_center_raise'].move_center()
-        self.servos['right_center_raise'].move_center()
+        self.move_group('center', 'raise', 'center')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
 
-        self.servos['left_back_raise'].move_center()
-        self.servos['right_back_raise'].move_center()
+        self.move_group('back', 'raise', 'center')
 
-        time.sleep(time_step)
+        self.sleep(time_step)
         
         self.reposition_center_legs(100)
         
 class Hexapod_18DOF(Hexapod):
-    def __init__(self, config):
-        super().__init__(config)   
-        
+    def __init__(self, config, backend=None):
+        super().__init__(config, backend)   
+
+        self.ik = None
+        if 'geometry' in config:
+            self.ik = LegIK(config['geometry'], self.bank)
+
+        # solved foot target arrays, keyed by their bytes and shape
+        self.ik_cache = LRUCache(IK_CACHE)
+
+    def gait_pulses(self, states, stride=40.0, step_height=30.0):
+        # stride: foot travel along x in mm, negative walks backward
+        # step_height: foot lift in mm while swinging
+        offset = np.zeros(states.shape[:-1] + (3,))
+        offset[..., 0] = states[..., 0] * stride/2
+        offset[..., 2] = states[..., 1] * step_height
+
+        percent = self.solve_feet(self.leg_ik().stance_feet() + offset)
+        defined = ~np.isnan(percent)
+        indices = np.arange(len(self.bank))
+        pulses = self.bank.percent_to_pulse(np.where(defined, percent, 0), indices)
+
+        return np.where(defined, pulses, self.bank.current)
+
+    @property
+    def commands(self):
+        # the gaits solve foot targets: without the leg geometry they are not
+        # offered at all
+        commands = command_table(type(self))
+        if self.ik is None:
+            commands = {name: registered for name, registered in commands.items()
+                        if registered.method_name != 'command_gait'}
+
+        return commands
+
+    def caches(self):
+        return dict(super().caches(), ik_solutions=self.ik_cache)
+
+    def leg_ik(self):
+        if self.ik is None:
+            raise ConfigError('model 18DOF: foot targets and gaits need the geometry section of the config file')
+
+        return self.ik
+
+    def solve_feet(self, targets):
+        # Servo percents (..., 18) for foot targets (..., 6, 3) in body coordinates
+        targets = np.ascontiguousarray(targets, dtype=float)
+        def solve():
+            percent, reachable = self.leg_ik().solve(targets)
+            if not reachable.all():
+                LOG.log(FEET_OUT_OF_REACH, np.count_nonzero(~reachable))
+
+            return percent
+
+        return self.ik_cache.get((targets.shape, targets.tobytes()), solve)
+
+    @motion
+    def move_feet(self, targets):
+        # Put the six foot tips at targets (6, 3)
+        percent = self.solve_feet(targets)
+        defined = ~np.isnan(percent)
+        self.set_positions(np.flatnonzero(defined), percent[defined])
+
+    @motion
+    def play_feet(self, targets, rate=DEFAULT_RATE):
+        # Stream foot targets (T, 6, 3), one frame per 1/rate seconds
+        percent = self.solve_feet(targets)
+        indices = np.arange(len(self.bank))
+
+        defined = ~np.isnan(percent)
+        pulses = self.bank.percent_to_pulse(np.where(defined, percent, 0), indices)
+        frames = np.where(defined, pulses, self.bank.current)
+
+        self.play_frames(frames, rate)
+        
+    @motion
     def initial_tests(self, iteration=1, timestep=1):
         # Setup initial state
         self.align_all_legs()
         self.resting_state()
         self.center_all_legs()
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         for i in range(iteration):
             # Increase height
             self.short_from_resting_state()
-            time.sleep(timestep)
+            self.sleep(timestep)
             self.square_from_short_state()
-            time.sleep(timestep)
+            self.sleep(timestep)
             self.tall_state()
-            time.sleep(timestep)
+            self.sleep(timestep)
 
             # Decrease height
             self.square_from_tall_state()
-            time.sleep(timestep)
+            self.sleep(timestep)
             self.short_from_square_state()
-            time.sleep(timestep)
+            self.sleep(timestep)
             self.resting_state()
-            time.sleep(timestep)
+            self.sleep(timestep)
         
+    @motion
     def move_leg(self, name, rotate_value=None, lower_value=None, upper_value=None):
-        if rotate_value is not None:
-            self.servos[name + '_rotate'].set_position(rotate_value)
-
-        if lower_value is not None:
-            self.servos[name + '_lower'].set_position(lower_value)
-
-        if upper_value is not None:
-            self.servos[name + '_upper'].set_position(upper_value)
+        self.move_legs(name, {'rotate': rotate_value, 'lower': lower_value, 'upper': upper_value})
             
+    @motion
     def move_all_legs(self, rotate_value=None, lower_value=None, upper_value=None):
-        self.move_leg('left_front', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('left_center', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('left_back', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('right_front', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('right_center', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('right_back', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-                
+        self.move_legs('all', {'rotate': rotate_value, 'lower': lower_value, 'upper': upper_value})
+
+    @motion
     def move_left_legs(self, rotate_value=None, lower_value=None, upper_value=None):
-        self.move_leg('left_front', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('left_center', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('left_back', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)        
-                
+        self.move_legs('left', {'rotate': rotate_value, 'lower': lower_value, 'upper': upper_value})
+
+    @motion
     def move_right_legs(self, rotate_value=None, lower_value=None, upper_value=None):
-        self.move_leg('right_front', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('right_center', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('right_back', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)        
-                
+        self.move_legs('right', {'rotate': rotate_value, 'lower': lower_value, 'upper': upper_value})
+
+    @motion
     def move_front_legs(self, rotate_value=None, lower_value=None, upper_value=None):
-        self.move_leg('left_front', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('right_front', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)        
-                
+        self.move_legs('front', {'rotate': rotate_value, 'lower': lower_value, 'upper': upper_value})
+
+    @motion
     def move_center_legs(self, rotate_value=None, lower_value=None, upper_value=None):
-        self.move_leg('left_center', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('right_center', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)        
-                
+        self.move_legs('center', {'rotate': rotate_value, 'lower': lower_value, 'upper': upper_value})
+
+    @motion
     def move_back_legs(self, rotate_value=None, lower_value=None, upper_value=None):
-        self.move_leg('left_back', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
-        self.move_leg('right_back', rotate_value=rotate_value, lower_value=lower_value, upper_value=upper_value)
+        self.move_legs('back', {'rotate': rotate_value, 'lower': lower_value, 'upper': upper_value})
 
+    @absolute
+    @motion
     def turn_right(self, backward=False, timestep=0.2):
         raise_height = 10
         resting_height = 20
@@ -1152,42 +1569,36 @@ class Hexapod_18DOF(Hexapod):
         self.center_all_legs()
         self.stand()
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['right_front_lower'].set_position(raise_height)
-        self.servos['left_center_lower'].set_position(raise_height)
-        self.servos['right_back_lower'].set_position(raise_height)
+        self.move_group('right_left_right', 'lower', raise_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # Rotate 3 legs forward
         if backward:
-            self.servos['right_front_rotate'].set_position(100)
-            self.servos['right_back_rotate'].set_position(80)
+            self.move_group('right_front', 'rotate', 100)
+            self.move_group('right_back', 'rotate', 80)
         else:
-            self.servos['right_front_rotate'].set_position(0)
-            self.servos['right_back_rotate'].set_position(0)
+            self.move_group('right_front_back', 'rotate', 0)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['right_front_lower'].set_position(support_height)
-        self.servos['left_center_lower'].set_position(support_height)
-        self.servos['right_back_lower'].set_position(support_height)
+        self.move_group('right_left_right', 'lower', support_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['left_front_lower'].set_position(raise_height)
-        self.servos['right_center_lower'].set_position(raise_height)
-        self.servos['left_back_lower'].set_position(raise_height)
-        time.sleep(timestep)
+        self.move_group('left_right_left', 'lower', raise_height)
+        self.sleep(timestep)
 
-        self.servos['right_front_rotate'].set_position(50)
-        self.servos['right_back_rotate'].set_position(50)
+        self.move_group('right_front_back', 'rotate', 50)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         self.stand()
         
+    @absolute
+    @motion
     def turn_left(self, backward=False, timestep=0.2):
         raise_height = 10
         resting_height = 20
@@ -1196,43 +1607,37 @@ class Hexapod_18DOF(Hexapod):
         self.center_all_legs()
         self.stand()
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['left_front_lower'].set_position(raise_height)
-        self.servos['right_center_lower'].set_position(raise_height)
-        self.servos['left_back_lower'].set_position(raise_height)
+        self.move_group('left_right_left', 'lower', raise_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # Rotate 3 legs forward
         if backward:
-            self.servos['left_front_rotate'].set_position(100)
-            self.servos['left_back_rotate'].set_position(80)
+            self.move_group('left_front', 'rotate', 100)
+            self.move_group('left_back', 'rotate', 80)
         else:
-            self.servos['left_front_rotate'].set_position(0)
-            self.servos['left_back_rotate'].set_position(0)
+            self.move_group('left_front_back', 'rotate', 0)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['left_front_lower'].set_position(support_height)
-        self.servos['right_center_lower'].set_position(support_height)
-        self.servos['left_back_lower'].set_position(support_height)
+        self.move_group('left_right_left', 'lower', support_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['right_front_lower'].set_position(raise_height)
-        self.servos['left_center_lower'].set_position(raise_height)
-        self.servos['right_back_lower'].set_position(raise_height)
+        self.move_group('right_left_right', 'lower', raise_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['left_front_rotate'].set_position(50)
-        self.servos['left_back_rotate'].set_position(50)
+        self.move_group('left_front_back', 'rotate', 50)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         self.stand()
         
+    @absolute
+    @motion
     def right_left_right_step(self, backward=False, timestep=0.2):
         raise_height = 10
         resting_height = 20
@@ -1241,66 +1646,62 @@ class Hexapod_18DOF(Hexapod):
         self.align_all_legs()
         self.stand()
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['right_front_lower'].set_position(raise_height)
-        self.servos['left_center_lower'].set_position(raise_height)
-        self.servos['right_back_lower'].set_position(raise_height)
+        self.move_group('right_left_right', 'lower', raise_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # Rotate 3 legs forward
         if backward:
-            self.servos['right_front_rotate'].set_position(100)
-            self.servos['left_center_rotate'].set_position(100)
-            self.servos['right_back_rotate'].set_position(50)
+            self.move_group(['right_front', 'left_center'], 'rotate', 100)
+            self.move_group('right_back', 'rotate', 50)
         else:
-            self.servos['right_front_rotate'].set_position(50)
-            self.servos['left_center_rotate'].set_position(0)
-            self.servos['right_back_rotate'].set_position(0)
+            self.move_group('right_front', 'rotate', 50)
+            self.move_group(['left_center', 'right_back'], 'rotate', 0)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['right_front_lower'].set_position(support_height)
-        self.servos['left_center_lower'].set_position(support_height)
-        self.servos['right_back_lower'].set_position(support_height)
+        self.move_group('right_left_right', 'lower', support_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # self.servos['left_front_lower'].set_position(raise_height)
         # self.servos['right_center_lower'].set_position(raise_height)
         # self.servos['left_back_lower'].set_position(raise_height)
 
-        # time.sleep(timestep)
+        # self.sleep(timestep)
 
         # Rotate 3 legs forward
         if backward:
-            self.servos['right_front_rotate'].set_position(50)
-            self.servos['left_center_rotate'].set_position(0)
-            self.servos['right_back_rotate'].set_position(0)
+            self.move_group('right_front', 'rotate', 50)
+            self.move_group(['left_center', 'right_back'], 'rotate', 0)
         else:
 
-            self.servos['right_front_rotate'].set_position(100)
-            self.servos['left_center_rotate'].set_position(100)
-            self.servos['right_back_rotate'].set_position(50)
+            self.move_group(['right_front', 'left_center'], 'rotate', 100)
+            self.move_group('right_back', 'rotate', 50)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['right_front_lower'].set_position(raise_height)
-        self.servos['left_center_lower'].set_position(raise_height)
-        self.servos['right_back_lower'].set_position(raise_height)
+        self.move_group('right_left_right', 'lower', raise_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         self.align_all_legs()
         self.stand()
         
+    @absolute
+    @motion
     def right_left_right_step_back(self, timestep=0.2):
         self.right_left_right_step(backward=True, timestep=timestep)        
         
+    @absolute
+    @motion
     def left_right_left_step_back(self, timestep=0.2):
         self.left_right_left_step(backward=True, timestep=timestep)
         
+    @absolute
+    @motion
     def left_right_left_step(self, backward=False, timestep=0.2):
         raise_height = 10
         resting_height = 20
@@ -1309,71 +1710,62 @@ class Hexapod_18DOF(Hexapod):
         self.align_all_legs()
         self.stand()
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['left_front_lower'].set_position(raise_height)
-        self.servos['right_center_lower'].set_position(raise_height)
-        self.servos['left_back_lower'].set_position(raise_height)
+        self.move_group('left_right_left', 'lower', raise_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # Rotate 3 legs forward
         if backward:
-            self.servos['left_front_rotate'].set_position(100)
-            self.servos['right_center_rotate'].set_position(100)
-            self.servos['left_back_rotate'].set_position(50)
+            self.move_group(['left_front', 'right_center'], 'rotate', 100)
+            self.move_group('left_back', 'rotate', 50)
         else:
-            self.servos['left_front_rotate'].set_position(50)
-            self.servos['right_center_rotate'].set_position(0)
-            self.servos['left_back_rotate'].set_position(0)
+            self.move_group('left_front', 'rotate', 50)
+            self.move_group(['right_center', 'left_back'], 'rotate', 0)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['left_front_lower'].set_position(support_height)
-        self.servos['right_center_lower'].set_position(support_height)
-        self.servos['left_back_lower'].set_position(support_height)
+        self.move_group('left_right_left', 'lower', support_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # self.servos['right_front_lower'].set_position(raise_height)
         # self.servos['left_center_lower'].set_position(raise_height)
         # self.servos['right_back_lower'].set_position(raise_height)
 
-        # time.sleep(timestep)
+        # self.sleep(timestep)
 
         # Rotate 3 legs forward
         if backward:
-            self.servos['left_front_rotate'].set_position(50)
-            self.servos['right_center_rotate'].set_position(0)
-            self.servos['left_back_rotate'].set_position(0)
+            self.move_group('left_front', 'rotate', 50)
+            self.move_group(['right_center', 'left_back'], 'rotate', 0)
         else:
 
-            self.servos['left_front_rotate'].set_position(100)
-            self.servos['right_center_rotate'].set_position(100)
-            self.servos['left_back_rotate'].set_position(50)
+            self.move_group(['left_front', 'right_center'], 'rotate', 100)
+            self.move_group('left_back', 'rotate', 50)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
-        self.servos['left_front_lower'].set_position(raise_height)
-        self.servos['right_center_lower'].set_position(raise_height)
-        self.servos['left_back_lower'].set_position(raise_height)
+        self.move_group('left_right_left', 'lower', raise_height)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         self.align_all_legs()
         self.stand()
 
+    @motion
     def front_leg_dancing(self, step=1, timestep=0.5, iteration=4):
         # Initial movement position
         self.center_all_legs()
         self.stand()
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # Move center legs for support
         self.move_center_legs(rotate_value=0, upper_value=60, lower_value=40)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         if step == 1:
             for i in range(iteration):
@@ -1381,48 +1773,49 @@ class Hexapod_18DOF(Hexapod):
                 self.move_leg('left_front', rotate_value=0)
                 self.move_leg('right_front', rotate_value=80)
 
-                time.sleep(timestep)
+                self.sleep(timestep)
 
                 # Move front legs to the left
                 self.move_leg('left_front', rotate_value=80)
                 self.move_leg('right_front', rotate_value=0)
 
-                time.sleep(timestep)
+                self.sleep(timestep)
         elif step == 2:
             for i in range(iteration):
                 # Move front legs to the front
                 self.move_leg('left_front', rotate_value=0)
                 self.move_leg('right_front', rotate_value=0)
 
-                time.sleep(timestep)
+                self.sleep(timestep)
 
                 # Move front legs to the back
                 self.move_leg('left_front', rotate_value=80)
                 self.move_leg('right_front', rotate_value=80)
 
-                time.sleep(timestep)
+                self.sleep(timestep)
         else:
             pass # unsupported movement
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         self.move_front_legs(rotate_value=50)
         self.move_center_legs(rotate_value=50)
         self.stand()
 
-        time.sleep(timestep)        
+        self.sleep(timestep)        
         
+    @motion
     def back_leg_dancing(self, step=1, timestep=0.5, iteration=4):
         # Initial movement position
         self.center_all_legs()
         self.stand()
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         # Move center legs for support
         self.move_center_legs(rotate_value=100, upper_value=60, lower_value=40)
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         if step == 1:
             for i in range(iteration):
@@ -1430,33 +1823,45 @@ class Hexapod_18DOF(Hexapod):
                 self.move_leg('left_back', rotate_value=0)
                 self.move_leg('right_back', rotate_value=80)
 
-                time.sleep(timestep)
+                self.sleep(timestep)
 
                 # Move front legs to the left
                 self.move_leg('left_back', rotate_value=80)
                 self.move_leg('right_back', rotate_value=0)
 
-                time.sleep(timestep)
+                self.sleep(timestep)
         elif step == 2:
             for i in range(iteration):
                 # Move back legs to the front
                 self.move_leg('left_back', rotate_value=0)
                 self.move_leg('right_back', rotate_value=0)
 
-                time.sleep(0.5)
+                self.sleep(0.5)
 
                 # Move back legs to the back
                 self.move_leg('left_back', rotate_value=80)
                 self.move_leg('right_back', rotate_value=80)
 
-                time.sleep(0.5)
+                self.sleep(0.5)
         else:
             pass # unsupported movement
 
-        time.sleep(timestep)
+        self.sleep(timestep)
 
         self.move_back_legs(rotate_value=50)
         self.move_center_legs(rotate_value=50)
         self.stand()
 
-        time.sleep(timestep)
+        self.sleep(timestep)
+
+
+# Hexapod class of each model name of config_compiler.MODELS
+HEXAPOD_CLASSES = {
+    '12DOF': Hexapod_12DOF,
+    '18DOF': Hexapod_18DOF,
+}
+
+
+def create_hexapod(config, backend=None):
+    # Hexapod of the model the config asks for
+    return HEXAPOD_CLASSES[config['model']](config, backend)
@@ -0,0 +1,93 @@
+from __future__ import division
+
+import numpy as np
+
+from servo_bank import LEGS
+
+# Servo joints of an 18DOF leg: coxa (rotate), femur (upper), tibia (lower)
+JOINTS = ('rotate', 'upper', 'lower')
+
+
+class LegIK:
+    # Inverse kinematics of the six 3DOF legs, vectorized over legs and time.
+    # Body frame: x forward, y left, z up, in mm. Joint angles (degrees):
+    #   rotate - swing of the coxa towards the front of the robot
+    #   upper  - femur elevation above horizontal
+    #   lower  - tibia angle relative to the femur line (negative bends down)
+    def __init__(self, geometry, bank):
+        self.coxa = float(geometry['coxa_length'])
+        self.femur = float(geometry['femur_length'])
+        self.tibia = float(geometry['tibia_length'])
+
+        # neutral foot position: horizontal distance from the mount along the
+        # leg heading, and height of the body above the ground
+        self.stance_reach = float(geometry.get('stance_reach', self.coxa + self.femur))
+        self.stance_height = float(geometry.get('stance_height', self.tibia * 0.75))
+
+        mounts = np.array([geometry['legs'][leg] for leg in LEGS], dtype=float)
+        self.mount = mounts[:, :2]
+        heading = np.radians(mounts[:, 2])
+        self.cos_heading = np.cos(heading)
+        self.sin_heading = np.sin(heading)
+
+        # a forward swing turns left legs clockwise and right legs counter-clockwise
+        self.side = np.where(self.mount[:, 1] > 0, -1.0, 1.0)
+
+        # joint angle at 0% and 100% of the servo, per (leg, joint)
+        angles = np.array([geometry['joints'][joint] for joint in JOINTS], dtype=float)
+        self.angle_0 = np.broadcast_to(angles[:, 0], (len(LEGS), len(JOINTS)))
+        self.angle_100 = np.broadcast_to(angles[:, 1], (len(LEGS), len(JOINTS)))
+
+        # bank index of every (leg, joint)
+        self.size = len(bank)
+        self.indices = np.array(
+                [[bank.index['{}_{}'.format(leg, joint)] for joint in JOINTS] for leg in LEGS],
+                dtype=np.intp)
+
+    def stance_feet(self):
+        # Neutral foot tips (6, 3) in body coordinates
+        feet = np.empty((len(LEGS), 3))
+        feet[:, 0] = self.mount[:, 0] + self.stance_reach * self.cos_heading
+        feet[:, 1] = self.mount[:, 1] + self.stance_reach * self.sin_heading
+        feet[:, 2] = -self.stance_height
+
+        return feet
+
+    def joint_angles(self, targets):
+        # targets: (..., 6, 3) foot tips in body coordinates
+        # returns angles (..., 6, 3) in degrees and a reachable mask (..., 6)
+        targets = np.asarray(targets, dtype=float)
+
+        # into each leg's frame, x along the leg heading
+        dx = targets[..., 0] - self.mount[:, 0]
+        dy = targets[..., 1] - self.mount[:, 1]
+        x = dx * self.cos_heading + dy * self.sin_heading
+        y = -dx * self.sin_heading + dy * self.cos_heading
+        z = targets[..., 2]
+
+        coxa = np.arctan2(y, x)
+
+        d = np.hypot(x, y) - self.coxa
+        reach_squared = d**2 + z**2
+
+        cos_knee = (reach_squared - self.femur**2 - self.tibia**2) / (2 * self.femur * self.tibia)
+        reachable = (cos_knee >= -1) & (cos_knee <= 1)
+
+        knee = -np.arccos(np.clip(cos_knee, -1, 1))
+        femur = np.arctan2(z, d) - np.arctan2(self.tibia * np.sin(knee), self.femur + self.tibia * np.cos(knee))
+
+        angles = np.stack((coxa * self.side, femur, knee), axis=-1)
+        return np.degrees(angles), reachable
+
+    def solve(self, targets):
+        # Servo percents (..., servos) in bank order for foot targets (..., 6, 3),
+        # NaN for servos that are not part of a leg, and the reachable mask
+        angles, reachable = self.joint_angles(targets)
+
+        percent = 100 * (angles - self.angle_0) / (self.angle_100 - self.angle_0)
+        percent = np.clip(percent, 0, 100)
+
+        result = np.full(percent.shape[:-2] + (self.size,), np.nan)
+        result[..., self.indices.ravel()] = percent.reshape(percent.shape[:-2] + (-1,))
+
+        return result, reachable
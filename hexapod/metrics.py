@@ -0,0 +1,207 @@
+import math
+import threading
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    # HDR-style latency histogram: values (seconds) are counted in buckets of
+    # 2**-sub_bits relative width over powers of two of the resolution, so
+    # recording is a couple of integer operations and percentiles are exact to
+    # within that width (12.5% for sub_bits=3) from microseconds to hours.
+    def __init__(self, resolution=1e-6, sub_bits=3):
+        self.resolution = resolution
+        self.sub_bits = sub_bits
+        self.sub_buckets = 1 << sub_bits
+        self.buckets = [0] * (64 * self.sub_buckets)
+
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def bucket(self, value):
+        units = int(value / self.resolution)
+        if units < self.sub_buckets:
+            return max(units, 0)
+
+        # top sub_bits+1 bits of units: the power of two and the linear step in it
+        shift = units.bit_length() - self.sub_bits - 1
+        return (shift + 1) * self.sub_buckets + (units >> shift) - self.sub_buckets
+
+    def bucket_value(self, index):
+        # Upper edge of a bucket, in seconds
+        if index < self.sub_buckets:
+            return (index + 1) * self.resolution
+
+        shift = index // self.sub_buckets - 1
+        mantissa = index % self.sub_buckets + self.sub_buckets
+        return ((mantissa + 1) << shift) * self.resolution
+
+    def record(self, value):
+        self.buckets[min(self.bucket(value), len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        if not self.count:
+            return math.nan
+
+        rank = max(1, int(math.ceil(q * self.count)))
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(self.bucket_value(index), self.max)
+
+        return self.max
+
+    def reset(self):
+        self.buckets = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Registry:
+    # Named counters, gauges and histograms, each optionally labelled, e.g.
+    # histogram('command_seconds', command='walk'). Collectors are functions
+    # called at export time returning [(name, kind, labels, value)] for values
+    # that already live somewhere else (board write counters).
+    KINDS = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}
+
+    def __init__(self):
+        self.metrics = {}
+        self.help = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def get(self, kind, name, help='', **labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(key, self.KINDS[kind]())
+                self.help.setdefault(name, (kind, help))
+
+        return metric
+
+    def counter(self, name, help='', **labels):
+        return self.get('counter', name, help, **labels)
+
+    def gauge(self, name, help='', **labels):
+        return self.get('gauge', name, help, **labels)
+
+    def histogram(self, name, help='', **labels):
+        return self.get('histogram', name, help, **labels)
+
+    def collector(self, function):
+        with self.lock:
+            self.collectors.append(function)
+
+    def remove_collector(self, function):
+        with self.lock:
+            if function in self.collectors:
+                self.collectors.remove(function)
+
+    def samples(self):
+        # [(name, kind, labels, metric or value)] sorted by name
+        samples = [(name, self.help[name][0], labels, metric)
+                   for (name, labels), metric in list(self.metrics.items())]
+
+        for function in list(self.collectors):
+            for name, kind, labels, value in function():
+                samples.append((name, kind, tuple(sorted(labels.items())), value))
+
+        return sorted(samples, key=lambda sample: (sample[0], sample[2]))
+
+    def report(self):
+        # One line per metric, for the 'stats' command
+        lines = []
+        for name, kind, labels, metric in self.samples():
+            label = ','.join('{}={}'.format(*item) for item in labels)
+            name = '{}{{{}}}'.format(name, label) if label else name
+
+            if isinstance(metric, Histogram):
+                lines.append('{} count={} p50={:.2f}ms p99={:.2f}ms max={:.2f}ms'.format(
+                        name, metric.count, 1000 * metric.percentile(0.5),
+                        1000 * metric.percentile(0.99), 1000 * metric.max))
+            else:
+                lines.append('{}={}'.format(name, getattr(metric, 'value', metric)))
+
+        return lines
+
+    def prometheus(self):
+        # Prometheus text exposition format, histograms as summaries
+        lines = []
+        described = set()
+        for name, kind, labels, metric in self.samples():
+            if name not in described:
+                described.add(name)
+                help = self.help.get(name, (kind, ''))[1]
+                if help:
+                    lines.append('# HELP {} {}'.format(name, help))
+
+                lines.append('# TYPE {} {}'.format(name, 'summary' if kind == 'histogram' else kind))
+
+            if isinstance(metric, Histogram):
+                for q in QUANTILES:
+                    lines.append('{}{} {}'.format(name, format_labels(labels + (('quantile', q),)),
+                                                  metric.percentile(q)))
+
+                lines.append('{}_sum{} {}'.format(name, format_labels(labels), metric.sum))
+                lines.append('{}_count{} {}'.format(name, format_labels(labels), metric.count))
+            else:
+                lines.append('{}{} {}'.format(name, format_labels(labels), getattr(metric, 'value', metric)))
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+
+    return '{' + ','.join('{}="{}"'.format(key, value) for key, value in labels) + '}'
+
+
+# The registry shared by the hexapod modules
+METRICS = Registry()
+
+
+def serve_metrics(port, host='127.0.0.1', registry=METRICS):
+    # Prometheus text endpoint (any path) from a daemon thread
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
@@ -0,0 +1,163 @@
+import heapq
+import itertools
+import threading
+
+from scheduler import MotionCancelled
+
+# Priority of commands sent with a '!' prefix: they preempt whatever is running
+PREEMPT = 1
+NORMAL = 0
+
+
+class MotionJob:
+    # One queued motion command, possibly standing for several coalesced ones,
+    # or a script of command lines run as one job
+    def __init__(self, job_id, command, args, priority, iteration=None, lines=None):
+        self.ids = [job_id]
+        self.command = command
+        self.args = list(args)
+        self.priority = priority
+        self.iteration = iteration
+        self.lines = lines
+
+        # iterations each id added, in ids order
+        self.iterations = [iteration]
+
+    def merge(self, job_id, iteration):
+        self.ids.append(job_id)
+        self.iterations.append(iteration)
+        self.iteration += iteration
+
+    def remove(self, job_id):
+        # Take out the iterations one of the merged ids added
+        index = self.ids.index(job_id)
+        del self.ids[index]
+        iteration = self.iterations.pop(index)
+        if iteration is not None:
+            self.iteration -= iteration
+
+    def merges_with(self, command, args, iteration, lines):
+        return (self.iteration is not None and iteration is not None and lines is None and
+                self.lines is None and self.command == command and self.args == list(args))
+
+    @property
+    def data(self):
+        if self.lines is not None:
+            return '\n'.join([self.command] + self.lines)
+
+        if self.iteration is None:
+            return ' '.join([self.command] + self.args)
+
+        return ' '.join([self.command, str(self.iteration)] + self.args)
+
+
+class MotionQueue:
+    # Motion commands waiting for the robot, highest priority first and in
+    # arrival order within a priority, run one at a time on a worker thread.
+    # run(data) performs a command, done(job_ids, response) is called after it.
+    def __init__(self, run, scheduler, done):
+        self.run = run
+        self.scheduler = scheduler
+        self.done = done
+
+        self.pending = []
+        self.order = itertools.count()
+        self.ids = itertools.count(1)
+        self.current = None
+        self.condition = threading.Condition()
+
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def put(self, command, args=(), priority=NORMAL, iteration=None, lines=None):
+        # Queue a command and return its id. A repeatable command (one with an
+        # iteration count, the first argument) that is the same as the last one
+        # queued at its priority is merged into it (walk, walk -> walk 2).
+        # lines: command lines of a script, never merged.
+        with self.condition:
+            job_id = next(self.ids)
+
+            if priority >= PREEMPT:
+                self.clear()
+                self.cancel_current()
+
+            last = self.last(priority)
+            if last is not None and last.merges_with(command, args, iteration, lines):
+                last.merge(job_id, iteration)
+            else:
+                job = MotionJob(job_id, command, args, priority, iteration, lines)
+                heapq.heappush(self.pending, (-priority, next(self.order), job))
+
+            self.condition.notify()
+
+        return job_id
+
+    def last(self, priority):
+        # Most recently queued job of a priority
+        jobs = [entry for entry in self.pending if entry[0] == -priority]
+        if not jobs:
+            return None
+
+        return max(jobs, key=lambda entry: entry[1])[2]
+
+    def cancel(self, job_id=None):
+        # Cancel a queued job, or the running one (job_id None or its id) at its
+        # next keyframe. A queued job merged with others only loses the
+        # iterations it added. Returns whether anything was cancelled.
+        with self.condition:
+            if job_id is None or (self.current is not None and job_id in self.current.ids):
+                return self.cancel_current()
+
+            for entry in self.pending:
+                job = entry[2]
+                if job_id in job.ids:
+                    job.remove(job_id)
+                    if not job.ids:
+                        self.pending.remove(entry)
+                        heapq.heapify(self.pending)
+
+                    self.done([job_id], 'Cancelled')
+                    return True
+
+        return False
+
+    def stop(self):
+        # Drop every queued job and cancel the running one
+        with self.condition:
+            self.clear()
+            self.cancel_current()
+
+    def clear(self):
+        for entry in self.pending:
+            self.done(entry[2].ids, 'Cancelled')
+
+        self.pending = []
+
+    def cancel_current(self):
+        if self.current is None:
+            return False
+
+        self.scheduler.cancel()
+        return True
+
+    def worker(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+
+                self.current = heapq.heappop(self.pending)[2]
+                self.scheduler.clear_cancel()
+
+            try:
+                response = self.run(self.current.data)
+            except MotionCancelled:
+                response = 'Cancelled'
+            except Exception as e:
+                response = 'ERROR: {}'.format(e)
+
+            with self.condition:
+                job, self.current = self.current, None
+                self.scheduler.clear_cancel()
+
+            self.done(job.ids, response)
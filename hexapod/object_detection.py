@@ -6,8 +6,26 @@
 ### Import the libraries ####
 import cv2
 import math
+import select
+import sys
+import threading
+import time
 import numpy as np
 
+from eventlog import ERROR, INFO, LOG
+from metrics import METRICS
+
+POSITION = LOG.event('position', INFO, 'dddddd',
+                     'Hexapod: ({:.0f}, {:.0f}) Spotlight: ({:.0f}, {:.0f}) Distance: ({:.0f}, {:.0f})')
+MOVE = LOG.event('move', INFO, '52s', '{}')
+FRAME_ERROR = LOG.event('frame_error', ERROR, '', 'Cannot read from the frame')
+
+VISION_FRAMES = METRICS.counter('vision_frames_total', 'camera frames processed')
+VISION_SECONDS = METRICS.histogram('vision_frame_seconds', 'threshold and centroid time of one frame')
+VISION_DROPPED = METRICS.counter('vision_frames_dropped_total', 'camera frames replaced by a newer one before processing')
+VISION_FULL_SEARCHES = METRICS.counter('vision_full_frame_searches_total', 'frames searched whole for a lost object')
+VISION_FRAME_AGE = METRICS.histogram('vision_frame_age_seconds', 'time from capture to the start of processing')
+
 ## HSV constants for robot and spotlight
 # For yellow 12DOF hexapod
 H_robot=29
@@ -34,6 +52,11 @@ H_spotlight_low=0
 S_spotlight_low=0
 V_spotlight_low=0
 
+# Smallest mask moment (255 per pixel) of a robot and a spotlight, below that
+# it is taken for noise
+ROBOT_MIN_AREA = 10000
+SPOTLIGHT_MIN_AREA = 8000
+
 def get_distance(threshold_robot, threshold_spotlight):
     ######################## Object Tracking #########################################################
     # We use the moments method to track the object
@@ -48,18 +71,18 @@ def get_distance(threshold_robot, threshold_spotlight):
     area_robot=moments_robot["m00"]
     area_spotlight=moments_spotlight["m00"]
 
-    X_r = np.NaN
-    Y_r = np.NaN
-    X_s = np.NaN
-    Y_s = np.NaN
+    X_r = np.nan
+    Y_r = np.nan
+    X_s = np.nan
+    Y_s = np.nan
 
     # To remove the effect of noise, consider tracking above only a threshold of area
-    if(area_robot > 10000):
+    if(area_robot > ROBOT_MIN_AREA):
         # Calculate the x and y coordinates of center
         X_r = int(moments_robot["m10"] / area_robot)
         Y_r = int(moments_robot["m01"] / area_robot)
 
-    if(area_spotlight>8000):
+    if(area_spotlight > SPOTLIGHT_MIN_AREA):
         # Calculate the centre for spotlight
         X_s=int(moments_spotlight["m10"] / area_spotlight)
         Y_s=int(moments_spotlight["m01"] / area_spotlight)
@@ -85,6 +108,78 @@ def initialize_camera():
 
     return cap
 
+class CameraThread(threading.Thread):
+    # Reads the camera as fast as it delivers into a preallocated ring of size
+    # frames, so frames never queue up in the driver. read() hands out the
+    # newest frame as a view of its ring slot, which the capture thread leaves
+    # alone until the next read(). Frames replaced before anyone read them are
+    # counted as dropped.
+    def __init__(self, cap, size=3):
+        super().__init__(daemon=True)
+        self.cap = cap
+
+        ret, frame = cap.read()
+        if not ret:
+            raise IOError('cannot read from the camera')
+
+        self.frames = np.empty((max(size, 3),) + frame.shape, dtype=frame.dtype)
+        self.frames[0] = frame
+        self.timestamps = [time.perf_counter()] * len(self.frames)
+
+        # slot of the newest frame, its sequence number, and the slot and
+        # sequence number of the frame handed out by read()
+        self.latest = 0
+        self.captured = 1
+        self.reading = None
+        self.taken = 0
+
+        self.dropped = 0
+        self.condition = threading.Condition()
+        self.stopping = False
+
+    def run(self):
+        while not self.stopping:
+            with self.condition:
+                slot = next(i for i in range(len(self.frames)) if i != self.latest and i != self.reading)
+
+            # decoded straight into the ring slot when the size matches
+            ret, frame = self.cap.read(self.frames[slot])
+            if not ret:
+                LOG.log(FRAME_ERROR)
+                time.sleep(0.01)
+                continue
+
+            if not np.shares_memory(frame, self.frames[slot]):
+                self.frames[slot] = frame
+
+            with self.condition:
+                if self.captured > self.taken:
+                    self.dropped += 1
+                    VISION_DROPPED.inc()
+
+                self.timestamps[slot] = time.perf_counter()
+                self.latest = slot
+                self.captured += 1
+                self.condition.notify_all()
+
+    def read(self, timeout=1.0):
+        # (True, newest frame) once a frame newer than the last one read is
+        # there, (False, None) after timeout seconds without one
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.captured > self.taken, timeout):
+                return False, None
+
+            self.reading = self.latest
+            self.taken = self.captured
+            VISION_FRAME_AGE.record(time.perf_counter() - self.timestamps[self.reading])
+
+            return True, self.frames[self.reading]
+
+    def stop(self):
+        self.stopping = True
+        if self.is_alive():
+            self.join()
+
 def get_threshold_image(frame, H_low, H_high, S_low, S_high, V_low, V_high):
     higher_boundary = np.array([H_high, S_high, V_high])
     lower_boundary = np.array([H_low, S_low, V_low])
@@ -95,6 +190,63 @@ def get_threshold_image(frame, H_low, H_high, S_low, S_high, V_low, V_high):
 
     return threshold
 
+class FusedThreshold:
+    # Robot mask and inverted spotlight mask of a frame from one HSV conversion.
+    # The HSV image and both masks are buffers reused by every call, so the
+    # masks returned are only good until the next call. The spotlight is black
+    # on a white background, its mask marks the pixels out of its range: when
+    # only V is limited (the usual V_spotlight_low=0 case) that is a single
+    # V > V_spotlight test on the V channel.
+    def __init__(self, robot_low, robot_high, spotlight_low, spotlight_high):
+        self.robot_low = np.array(robot_low, dtype=np.uint8)
+        self.robot_high = np.array(robot_high, dtype=np.uint8)
+        self.spotlight_low = np.array(spotlight_low, dtype=np.uint8)
+        self.spotlight_high = np.array(spotlight_high, dtype=np.uint8)
+
+        # 8-bit HSV: H is 0-179, S and V 0-255
+        self.v_only = (tuple(spotlight_low[:2]) == (0, 0) and tuple(spotlight_high[:2]) == (179, 255)
+                       and spotlight_low[2] == 0)
+
+        self.shape = None
+
+    def allocate(self, shape):
+        self.shape = shape
+        self.hsv = np.empty(shape, dtype=np.uint8)
+        self.value = np.empty(shape[:2], dtype=np.uint8)
+        self.robot = np.empty(shape[:2], dtype=np.uint8)
+        self.spotlight = np.empty(shape[:2], dtype=np.uint8)
+
+    def convert(self, frame):
+        if frame.shape != self.shape:
+            self.allocate(frame.shape)
+
+        cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=self.hsv)
+
+    def robot_mask(self):
+        return cv2.inRange(self.hsv, self.robot_low, self.robot_high, dst=self.robot)
+
+    def spotlight_mask(self):
+        if self.v_only:
+            cv2.extractChannel(self.hsv, 2, dst=self.value)
+            cv2.compare(self.value, int(self.spotlight_high[2]), cv2.CMP_GT, dst=self.spotlight)
+        else:
+            cv2.inRange(self.hsv, self.spotlight_low, self.spotlight_high, dst=self.spotlight)
+            cv2.bitwise_not(self.spotlight, dst=self.spotlight)
+
+        return self.spotlight
+
+    def __call__(self, frame):
+        self.convert(frame)
+        return (self.robot_mask(), self.spotlight_mask())
+
+    def mask(self, frame, target):
+        # Only the robot (target 0) or the spotlight (target 1) mask of a frame
+        self.convert(frame)
+        return self.spotlight_mask() if target else self.robot_mask()
+
+# FusedThreshold of each set of HSV ranges used so far
+THRESHOLDS = {}
+
 def get_threshold_images(frame,
             H_robot_low, H_robot,
             S_robot_low, S_robot,
@@ -103,20 +255,15 @@ def get_threshold_images(frame,
             S_spotlight_low, S_spotlight,
             V_spotlight_low, V_spotlight
         ):
-    threshold_robot = get_threshold_image(frame,
-            H_robot_low, H_robot,
-            S_robot_low, S_robot,
-            V_robot_low, V_robot)
+    # the spotlight mask is inverted (spotlight is in black with white
+    # background, not white with black background...), see FusedThreshold.
+    # Both masks are overwritten by the next call.
+    key = ((H_robot_low, S_robot_low, V_robot_low), (H_robot, S_robot, V_robot),
+           (H_spotlight_low, S_spotlight_low, V_spotlight_low), (H_spotlight, S_spotlight, V_spotlight))
+    if key not in THRESHOLDS:
+        THRESHOLDS[key] = FusedThreshold(*key)
 
-    threshold_spotlight = get_threshold_image(frame,
-            H_spotlight_low, H_spotlight,
-            S_spotlight_low, S_spotlight,
-            V_spotlight_low, V_spotlight)
-
-    # invert the target_spotlight mask (spotlight is in black with white background, not white with black background...
-    threshold_spotlight = cv2.bitwise_not(threshold_spotlight)
-
-    return (threshold_robot, threshold_spotlight)
+    return THRESHOLDS[key](frame)
 
 def clean_threshold_image(threshold):
     ## Perform morphological transformations #####
@@ -135,13 +282,103 @@ def clean_threshold_image(threshold):
 
     return threshold
 
-def print_position_data(X_r, Y_r, X_s, Y_s, X_dist, Y_dist):
-    print("Hexapod:\t({}, {})".format(X_r, Y_r))
-    print("Spotlight:\t({}, {})".format(X_s, Y_s))
-    print("Distance:\t({}, {})".format(X_dist, Y_dist))
-    print()
+def process_frame(frame):
+    # Robot and spotlight centroids and their distance in one BGR frame
+    (threshold_robot, threshold_spotlight) = get_threshold_images(
+            frame,
+            H_robot_low, H_robot,
+            S_robot_low, S_robot,
+            V_robot_low, V_robot,
+            H_spotlight_low, H_spotlight,
+            S_spotlight_low, S_spotlight,
+            V_spotlight_low, V_spotlight)
+
+    threshold_robot = clean_threshold_image(threshold_robot)
+    threshold_spotlight = clean_threshold_image(threshold_spotlight)
+
+    return get_distance(threshold_robot, threshold_spotlight)
+
+class RoiTracker:
+    # process_frame() for a video: each object is looked for only in a window
+    # around where it was in the last frame, padded by spread standard
+    # deviations of its mask plus padding pixels. The whole frame is searched
+    # for an object that is lost, whose area falls below its minimum or whose
+    # mask reaches the edge of its window. Window sizes are rounded up to 16
+    # pixels so the thresholding buffers are rarely reallocated.
+    def __init__(self, padding=32, spread=3.0):
+        ranges = ((H_robot_low, S_robot_low, V_robot_low), (H_robot, S_robot, V_robot),
+                  (H_spotlight_low, S_spotlight_low, V_spotlight_low), (H_spotlight, S_spotlight, V_spotlight))
+        self.padding = padding
+        self.spread = spread
+
+        # (x0, y0, x1, y1) of the robot and the spotlight, None when lost, each
+        # with its own thresholding buffers
+        self.windows = [None, None]
+        self.thresholds = [FusedThreshold(*ranges), FusedThreshold(*ranges)]
+        self.full = FusedThreshold(*ranges)
+        self.min_areas = (ROBOT_MIN_AREA, SPOTLIGHT_MIN_AREA)
+
+    def track(self, frame):
+        # process_frame(frame) as long as the object's color shows nowhere
+        # outside its window: stray pixels of that color elsewhere in the frame
+        # are ignored here, while process_frame() would count them in
+        centroids = [None, None]
+        for target, window in enumerate(self.windows):
+            if window is not None:
+                x0, y0, x1, y1 = window
+                mask = clean_threshold_image(self.thresholds[target].mask(frame[y0:y1, x0:x1], target))
+                if self.clipped(mask, window, frame.shape):
+                    # the object reaches out of its window, its centroid
+                    # there would be off
+                    self.windows[target] = None
+                else:
+                    centroids[target] = self.locate(target, mask, x0, y0, frame.shape)
+
+        lost = [target for target in (0, 1) if centroids[target] is None]
+        if lost:
+            VISION_FULL_SEARCHES.inc()
+            if len(lost) == 2:
+                masks = self.full(frame)
+            else:
+                masks = {lost[0]: self.full.mask(frame, lost[0])}
+
+            for target in lost:
+                centroids[target] = self.locate(target, clean_threshold_image(masks[target]), 0, 0, frame.shape)
+
+        (X_r, Y_r), (X_s, Y_s) = [centroid or (np.nan, np.nan) for centroid in centroids]
+
+        return ((X_r, Y_r), (X_s, Y_s), (X_r - X_s, Y_r - Y_s))
 
-def move_hexapod(mySocket, X_dist, Y_dist, found_x, found_y, count):
+    def clipped(self, mask, window, shape):
+        # Whether a window mask is set on an edge of the window inside the frame
+        x0, y0, x1, y1 = window
+        return ((x0 > 0 and mask[:, 0].any()) or (x1 < shape[1] and mask[:, -1].any())
+                or (y0 > 0 and mask[0].any()) or (y1 < shape[0] and mask[-1].any()))
+
+    def locate(self, target, mask, x0, y0, shape):
+        # Centroid of a mask at (x0, y0) of the frame, and the next window
+        moments = cv2.moments(mask, binaryImage=False)
+        area = moments["m00"]
+        if area <= self.min_areas[target]:
+            self.windows[target] = None
+            return None
+
+        X = int(x0 + moments["m10"] / area)
+        Y = int(y0 + moments["m01"] / area)
+
+        half_width = int(self.spread * math.sqrt(moments["mu20"] / area)) + self.padding
+        half_height = int(self.spread * math.sqrt(moments["mu02"] / area)) + self.padding
+        half_width, half_height = -(-half_width // 16) * 16, -(-half_height // 16) * 16
+
+        self.windows[target] = (max(X - half_width, 0), max(Y - half_height, 0),
+                                min(X + half_width, shape[1]), min(Y + half_height, shape[0]))
+
+        return (X, Y)
+
+def log_position_data(X_r, Y_r, X_s, Y_s, X_dist, Y_dist):
+    LOG.log(POSITION, X_r, Y_r, X_s, Y_s, X_dist, Y_dist)
+
+def move_hexapod(link, X_dist, Y_dist, found_x, found_y, count):
     # Find Y coordinates first
     if found_y == False:
         if Y_dist > 50:
@@ -190,14 +427,81 @@ def move_hexapod(mySocket, X_dist, Y_dist, found_x, found_y, count):
         count = 0
     count += 1
 
-    mySocket.send(command.encode())
-    data = mySocket.recv(1024).decode()
+    # a new target takes over a walk right away, anything else is not restarted
+    if link.running and link.running == command.split()[0]:
+        return (('Still running: {}'.format(command)), found_x, found_y, count)
+
+    data = link.send(command, preempt=link.running is not None)
 
     return(('Recieved from server: {}'.format(data)), found_x, found_y, count)
 
-def Main(mySocket=None):
+class CommandLink:
+    # Connection to the hexapod server that follows which of our commands is
+    # running from its 'Queued <id>: ...' and 'Done <id>: ...' messages
+    def __init__(self, mySocket):
+        self.socket = mySocket
+        self.buffer = ''
+        self.queued = {}
+        self.running = None
+
+        self.socket.send('subscribe\n'.encode())
+        self.read_line()
+
+    def read_line(self):
+        while '\n' not in self.buffer:
+            data = self.socket.recv(1024).decode()
+            if not data:
+                raise ConnectionError('hexapod server disconnected')
+
+            self.buffer += data
+
+        line, self.buffer = self.buffer.split('\n', 1)
+
+        words = line.replace(':', '').split()
+        if len(words) >= 3 and words[0] == 'Queued':
+            self.queued[words[1]] = words[2]
+        elif len(words) >= 2 and words[0] == 'Done':
+            self.queued.pop(words[1], None)
+
+        # commands run in order, the oldest one not done is the running one
+        self.running = self.queued[min(self.queued, key=int)] if self.queued else None
+
+        return line
+
+    def poll(self):
+        # Handle the messages that arrived, without blocking
+        while True:
+            readable, writable, errors = select.select([self.socket], [], [], 0)
+            if not readable and '\n' not in self.buffer:
+                return
+
+            self.read_line()
+
+    def send(self, command, preempt=False):
+        # Send a command, returns the server's acknowledgement
+        self.socket.send((('!' if preempt else '') + command + '\n').encode())
+
+        while True:
+            line = self.read_line()
+            if not line.startswith('Done '):
+                return line
+
+def Main(mySocket=None, roi=True):
+    # the vision loop never waits on the terminal
+    if LOG.flusher is None:
+        LOG.start(sys.stdout)
+
     cap = initialize_camera()
 
+    # the newest frame is always processed, however long the last one took
+    camera = CameraThread(cap)
+    camera.start()
+
+    link = CommandLink(mySocket) if mySocket else None
+
+    # search windows around the last positions instead of whole frames
+    tracker = RoiTracker() if roi else None
+
     # counter to limit display output
     count = 0
     dance_count = 0
@@ -207,33 +511,30 @@ def Main(mySocket=None):
     ## Start capturing frame by frame in an infinite loop
     while(True):
 
-        # Start capturing the frames
-        ret, frame = cap.read() # Get the returned value(T/F) and the frame.
-
-        if(ret != True): # Check if reading was successful or not
-            print("Cannot read from the frame\n")
-
+        # Get the newest frame, failed camera reads are logged by the capture thread
+        ret, frame = camera.read()
+        if(ret != True):
+            continue
 
-        (threshold_robot, threshold_spotlight) = get_threshold_images(
-                frame,
-                H_robot_low, H_robot,
-                S_robot_low, S_robot,
-                V_robot_low, V_robot,
-                H_spotlight_low, H_spotlight,
-                S_spotlight_low, S_spotlight,
-                V_spotlight_low, V_spotlight)
+        start = time.perf_counter()
+        VISION_FRAMES.inc()
 
-        threshold_robot = clean_threshold_image(threshold_robot)
-        threshold_spotlight = clean_threshold_image(threshold_spotlight)
-
-        (X_r, Y_r), (X_s, Y_s), (X_dist, Y_dist) = get_distance(threshold_robot, threshold_spotlight)
+        if tracker:
+            (X_r, Y_r), (X_s, Y_s), (X_dist, Y_dist) = tracker.track(frame)
+        else:
+            (X_r, Y_r), (X_s, Y_s), (X_dist, Y_dist) = process_frame(frame)
+        VISION_SECONDS.record(time.perf_counter() - start)
 
         if count == 30:
-            if mySocket:
-                (ret, found_x, found_y, dance_count) = move_hexapod(mySocket, X_dist, Y_dist, found_x, found_y, dance_count)
-                print(ret)
+            if link:
+                link.poll()
+
+                # turns and dances finish before the next move is chosen
+                if link.running in (None, 'walk', 'walk_back'):
+                    (ret, found_x, found_y, dance_count) = move_hexapod(link, X_dist, Y_dist, found_x, found_y, dance_count)
+                    LOG.log(MOVE, ret)
 
-            print_position_data(X_r, Y_r, X_s, Y_s, X_dist, Y_dist)
+            log_position_data(X_r, Y_r, X_s, Y_s, X_dist, Y_dist)
             count = 0
         count += 1
 
@@ -253,6 +554,7 @@ def Main(mySocket=None):
             break
 
     # Release the capture
+    camera.stop()
     cap.release()
     cv2.destroyAllWindows()
 
@@ -0,0 +1,322 @@
+from __future__ import division
+import math
+import queue
+import threading
+import time
+
+from metrics import METRICS
+
+# PCA9685 registers/bits (see Documentation/PCA9685.pdf)
+MODE1 = 0x00
+MODE2 = 0x01
+LED0_ON_L = 0x06
+ALL_LED_ON_L = 0xFA
+PRESCALE = 0xFE
+
+RESTART = 0x80
+AUTO_INCREMENT = 0x20
+SLEEP = 0x10
+ALLCALL = 0x01
+
+NUM_CHANNELS = 16
+
+# Board backends selectable with the 'backend' section of the config file
+BACKENDS = ('pca9685', 'simulated')
+
+DEFAULT_BUS_SPEED = 100000
+
+BLOCK_WRITE_SECONDS = METRICS.histogram('i2c_block_write_seconds', 'time of one LEDn block write')
+I2C_BYTES = METRICS.counter('i2c_block_write_bytes_total', 'bytes sent in LEDn block writes')
+
+
+def create_board(address, backend=None):
+    # backend: 'backend' section of the config file, hardware PCA9685 if empty
+    backend = backend or {}
+    backend_type = backend.get('type', 'pca9685')
+
+    if backend_type == 'pca9685':
+        # only the hardware backend needs the Adafruit driver (and its I2C stack)
+        import Adafruit_PCA9685
+
+        pwm = Adafruit_PCA9685.PCA9685(address=address)
+        return PCA9685Board(pwm, pwm._device)
+
+    elif backend_type == 'simulated':
+        pwm = SimulatedPCA9685(
+                address,
+                bus_speed=backend.get('bus_speed', DEFAULT_BUS_SPEED),
+                realtime=backend.get('realtime', False))
+        return PCA9685Board(pwm, pwm)
+
+    else:
+        raise ValueError('unknown board backend: {}'.format(backend_type))
+
+
+def frame_blocks(frame, shadow):
+    # Split a frame {channel: (on, off)} into [(first channel, values), ...]
+    # block writes: one from the lowest to the highest staged channel, the
+    # channels in between rewritten with their shadow values. Only a channel
+    # in between that was never written (unknown register contents) splits it.
+    blocks = []
+    values = []
+    for channel in range(min(frame), max(frame) + 1):
+        value = frame.get(channel, shadow[channel])
+        if value is None:
+            if values:
+                blocks.append((channel - len(values), values))
+                values = []
+        else:
+            values.append(value)
+
+    if values:
+        blocks.append((max(frame) + 1 - len(values), values))
+
+    return blocks
+
+
+class PCA9685Board:
+    def __init__(self, pwm, device):
+        # pwm: Adafruit_PCA9685.PCA9685 driver
+        # device: I2C device of the driver, used for raw block writes
+        self.pwm = pwm
+        self.device = device
+
+        # Staged pulses {channel: (on, off)} while a frame is open
+        self.frame = None
+
+        # Shadow copy of the LEDn registers, writes matching it are dropped
+        self.shadow = [None] * NUM_CHANNELS
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+        self.enable_auto_increment()
+
+    def enable_auto_increment(self):
+        # With AI set the register pointer advances after every byte, so all
+        # LEDn registers of consecutive channels can be written in one transaction
+        mode1 = self.device.readU8(MODE1)
+        self.device.write8(MODE1, mode1 | AUTO_INCREMENT)
+
+    def set_pwm_freq(self, freq_hz):
+        self.pwm.set_pwm_freq(freq_hz)
+
+    def set_pwm(self, channel, on, off):
+        value = (on, off)
+
+        if self.frame is not None:
+            if self.shadow[channel] == value:
+                # an earlier write in this frame may have changed it, drop that too
+                self.frame.pop(channel, None)
+                self.hits += 1
+            else:
+                self.frame[channel] = value
+                self.misses += 1
+
+        elif self.shadow[channel] == value:
+            self.hits += 1
+
+        else:
+            self.misses += 1
+            self.writes += 1
+            self.pwm.set_pwm(channel, on, off)
+            self.shadow[channel] = value
+
+    def invalidate(self, channel=None):
+        # Forget the shadow registers so the next write always goes to the bus
+        if channel is None:
+            self.shadow = [None] * NUM_CHANNELS
+        else:
+            self.shadow[channel] = None
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'writes': self.writes}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def begin_frame(self):
+        if self.frame is None:
+            self.frame = {}
+
+    def commit_frame(self):
+        # Write everything staged so far, the frame stays open
+        self.write_frame(self.take_frame())
+
+    def take_frame(self):
+        # Hand over the staged pulses, e.g. to a BoardWriter
+        frame = self.frame
+        if frame:
+            self.frame = {}
+
+        return frame
+
+    def write_frame(self, frame):
+        if frame:
+            for channel, values in frame_blocks(frame, self.shadow):
+                self.write_block(channel, values)
+
+    def end_frame(self):
+        self.commit_frame()
+        self.frame = None
+
+    def write_block(self, channel, values):
+        # One auto-increment write over LEDn_ON_L..LEDn_OFF_H of consecutive channels
+        data = []
+        for on, off in values:
+            data.extend((on & 0xFF, on >> 8, off & 0xFF, off >> 8))
+
+        start = time.perf_counter()
+        self.device.writeList(LED0_ON_L + 4*channel, data)
+        BLOCK_WRITE_SECONDS.record(time.perf_counter() - start)
+        I2C_BYTES.inc(len(data) + 1)
+        self.writes += 1
+
+        for offset, value in enumerate(values):
+            self.shadow[channel + offset] = value
+
+
+# Seconds the motion thread waits for the BoardWriters to get through a frame
+WRITER_TIMEOUT = 1.0
+
+
+class BoardWriter(threading.Thread):
+    # Writes the frames of one board from its own thread. Every frame comes with
+    # the barrier the writers of all boards and the motion thread meet at once it
+    # is written, so frames of all boards are committed together.
+    def __init__(self, board):
+        super().__init__(daemon=True)
+        self.board = board
+        self.frames = queue.SimpleQueue()
+        self.error = None
+
+    def run(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+
+            frame, barrier = item
+            try:
+                self.board.write_frame(frame)
+            except Exception as e:
+                self.error = e
+
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                # the motion thread stopped waiting for this frame and raised
+                pass
+
+    def stop(self):
+        self.frames.put(None)
+        self.join()
+
+
+class SimulatedPCA9685:
+    # In-memory PCA9685 register model. It implements both the driver interface
+    # of Adafruit_PCA9685.PCA9685 and the I2C device interface used for block
+    # writes, logs every register write with a timestamp and accounts the time
+    # each I2C transaction would take on a bus clocked at bus_speed (Hz).
+    def __init__(self, address, bus_speed=DEFAULT_BUS_SPEED, realtime=False):
+        self.address = address
+        self.bus_speed = bus_speed
+        # sleep for the simulated transaction time, like a real bus would block
+        self.realtime = realtime
+
+        self.registers = bytearray(256)
+        self.registers[MODE1] = SLEEP | ALLCALL
+
+        # (timestamp, register, data) of every write
+        self.writes = []
+        self.transactions = 0
+        self.bus_time = 0.0
+
+        # same power-up sequence as the Adafruit driver
+        self.set_all_pwm(0, 0)
+        self.write8(MODE2, 0x04)
+        self.write8(MODE1, ALLCALL)
+        mode1 = self.readU8(MODE1)
+        self.write8(MODE1, mode1 & ~SLEEP)
+
+    def transaction(self, num_bytes):
+        # start, address byte and num_bytes bytes of 9 clocks each (data + ack), stop
+        duration = (2 + 9 * (1 + num_bytes)) / self.bus_speed
+
+        self.transactions += 1
+        self.bus_time += duration
+
+        if self.realtime:
+            time.sleep(duration)
+
+        return duration
+
+    def clear(self):
+        self.writes = []
+        self.transactions = 0
+        self.bus_time = 0.0
+
+    # I2C device interface (Adafruit_GPIO.I2C.Device)
+    def write8(self, register, value):
+        self.writeList(register, [value])
+
+    def writeList(self, register, data):
+        self.transaction(1 + len(data))
+        self.writes.append((time.monotonic(), register, bytes(data)))
+
+        auto_increment = self.registers[MODE1] & AUTO_INCREMENT
+        for offset, value in enumerate(data):
+            self.registers[register + offset if auto_increment else register] = value & 0xFF
+
+        last = register + len(data) - 1 if auto_increment else register
+        if register <= ALL_LED_ON_L + 3 and last >= ALL_LED_ON_L:
+            self.write_all_leds()
+
+    def readU8(self, register):
+        # register pointer write followed by a one byte read
+        self.transaction(1)
+        self.transaction(1)
+
+        return self.registers[register]
+
+    def write_all_leds(self):
+        # ALL_LED registers load every LEDn register
+        values = self.registers[ALL_LED_ON_L:ALL_LED_ON_L + 4]
+        for channel in range(NUM_CHANNELS):
+            start = LED0_ON_L + 4*channel
+            self.registers[start:start + 4] = values
+
+    # driver interface (Adafruit_PCA9685.PCA9685)
+    def set_pwm_freq(self, freq_hz):
+        prescaleval = 25000000.0    # 25MHz
+        prescaleval /= 4096.0       # 12-bit
+        prescaleval /= float(freq_hz)
+        prescaleval -= 1.0
+        prescale = int(math.floor(prescaleval + 0.5))
+
+        oldmode = self.readU8(MODE1)
+        self.write8(MODE1, (oldmode & 0x7F) | SLEEP)
+        self.write8(PRESCALE, prescale)
+        self.write8(MODE1, oldmode)
+        self.write8(MODE1, oldmode | RESTART)
+
+    def set_pwm(self, channel, on, off):
+        self.write8(LED0_ON_L+4*channel, on & 0xFF)
+        self.write8(LED0_ON_L+4*channel + 1, on >> 8)
+        self.write8(LED0_ON_L+4*channel + 2, off & 0xFF)
+        self.write8(LED0_ON_L+4*channel + 3, off >> 8)
+
+    def set_all_pwm(self, on, off):
+        self.write8(ALL_LED_ON_L, on & 0xFF)
+        self.write8(ALL_LED_ON_L + 1, on >> 8)
+        self.write8(ALL_LED_ON_L + 2, off & 0xFF)
+        self.write8(ALL_LED_ON_L + 3, off >> 8)
+
+    def get_pwm(self, channel):
+        # (on, off) currently held by the LEDn registers of a channel
+        start = LED0_ON_L + 4*channel
+        on_l, on_h, off_l, off_h = self.registers[start:start + 4]
+
+        return ((on_h << 8) | on_l, (off_h << 8) | off_l)
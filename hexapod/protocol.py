@@ -0,0 +1,109 @@
+import itertools
+import socket
+import struct
+
+# A client that starts its connection with MAGIC talks in frames, anything else
+# is the newline separated text protocol
+MAGIC = b'HXP1'
+
+# Frame header: body length, request id, kind. The body is UTF-8 text.
+HEADER = struct.Struct('>IIB')
+
+# Frame kinds
+REQUEST = 1     # client -> server: a command line
+REPLY = 2       # server -> client: acknowledgement or result of a request
+DONE = 3        # server -> client: a queued motion request has finished
+EVENT = 4       # server -> client: Done message of someone else's request, once subscribed
+
+MAX_BODY = 1 << 20
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def pack_frame(request_id, kind, body):
+    body = body.encode()
+    return HEADER.pack(len(body), request_id, kind) + body
+
+
+def unpack_header(header):
+    length, request_id, kind = HEADER.unpack(header)
+    if length > MAX_BODY:
+        raise ProtocolError('frame of {} bytes'.format(length))
+
+    return length, request_id, kind
+
+
+class FrameBuffer:
+    # Splits received bytes into frames
+    def __init__(self):
+        self.buffer = b''
+
+    def feed(self, data):
+        self.buffer += data
+
+        frames = []
+        while len(self.buffer) >= HEADER.size:
+            length, request_id, kind = unpack_header(self.buffer[:HEADER.size])
+            if len(self.buffer) < HEADER.size + length:
+                break
+
+            body = self.buffer[HEADER.size:HEADER.size + length]
+            self.buffer = self.buffer[HEADER.size + length:]
+            try:
+                frames.append((request_id, kind, body.decode()))
+            except UnicodeDecodeError:
+                raise ProtocolError('frame {} is not UTF-8'.format(request_id))
+
+        return frames
+
+
+class Client:
+    # Framed connection to the hexapod server. send() returns at once with the
+    # request id, receive() hands back frames in the order they arrive, which
+    # for DONE frames need not be the order the requests were sent in.
+    def __init__(self, host, port):
+        self.socket = socket.create_connection((host, port))
+        self.socket.sendall(MAGIC)
+
+        self.frames = FrameBuffer()
+        self.received = []
+        self.ids = itertools.count(1)
+
+    def send(self, command):
+        request_id = next(self.ids)
+        self.socket.sendall(pack_frame(request_id, REQUEST, command))
+
+        return request_id
+
+    def receive(self):
+        while not self.received:
+            data = self.socket.recv(4096)
+            if not data:
+                raise ConnectionError('hexapod server disconnected')
+
+            self.received.extend(self.frames.feed(data))
+
+        return self.received.pop(0)
+
+    def request(self, command):
+        # Send a command and wait for its REPLY
+        return self.request_reply(self.send(command))
+
+    def request_reply(self, request_id):
+        # Wait for the REPLY to a request, frames about other requests are kept
+        # for later receive() calls
+        skipped = []
+        try:
+            while True:
+                frame = self.receive()
+                if frame[0] == request_id and frame[1] == REPLY:
+                    return frame[2]
+
+                skipped.append(frame)
+        finally:
+            self.received[:0] = skipped
+
+    def close(self):
+        self.socket.close()
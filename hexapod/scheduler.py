@@ -0,0 +1,98 @@
+from __future__ import division
+import collections
+import threading
+import time
+
+
+class MotionCancelled(Exception):
+    # Raised by MotionScheduler.wait() once cancel() was called
+    pass
+
+
+class MotionScheduler:
+    # Runs keyframes at absolute time.monotonic() deadlines. Every wait moves the
+    # deadline forward by the keyframe duration, so the time spent writing a
+    # frame is taken out of the following sleep instead of being added to it.
+    def __init__(self, clock=time.monotonic, sleep=time.sleep, max_lateness=0.1, history=1000):
+        self.clock = clock
+        self.sleep = sleep
+
+        # past this many seconds behind, restart the timeline from now rather
+        # than rushing the next keyframes to catch up
+        self.max_lateness = max_lateness
+
+        self.deadline = None
+
+        # seconds each keyframe started after its deadline (most recent last)
+        self.lateness = collections.deque(maxlen=history)
+        self.keyframes = 0
+        self.resyncs = 0
+
+        # set from any thread to abort the running movement at the next keyframe
+        self.cancelled = threading.Event()
+
+        # metrics.Histogram the lateness is also recorded into, if any
+        self.histogram = None
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def clear_cancel(self):
+        self.cancelled.clear()
+
+    def check_cancel(self):
+        if self.cancelled.is_set():
+            self.cancelled.clear()
+            raise MotionCancelled()
+
+    def start(self):
+        self.deadline = self.clock()
+
+    def stop(self):
+        self.deadline = None
+
+    def wait(self, duration):
+        # the keyframe just committed is the last one of a cancelled movement
+        self.check_cancel()
+
+        if self.deadline is None:
+            self.start()
+
+        self.deadline += duration
+
+        remaining = self.deadline - self.clock()
+        if remaining > 0:
+            self.sleep(remaining)
+
+        self.check_cancel()
+
+        lateness = self.clock() - self.deadline
+        self.lateness.append(lateness)
+        if self.histogram is not None:
+            self.histogram.record(lateness)
+        self.keyframes += 1
+
+        if lateness > self.max_lateness:
+            self.deadline = self.clock()
+            self.resyncs += 1
+
+        return lateness
+
+    def report(self):
+        # Lateness of the recent keyframes, in milliseconds
+        if not self.lateness:
+            return {'keyframes': self.keyframes, 'resyncs': self.resyncs}
+
+        lateness = sorted(self.lateness)
+        return {
+            'keyframes': self.keyframes,
+            'resyncs': self.resyncs,
+            'mean_ms': 1000 * sum(lateness) / len(lateness),
+            'p99_ms': 1000 * lateness[int(0.99 * (len(lateness) - 1))],
+            'max_ms': 1000 * lateness[-1],
+        }
+
+    def reset(self):
+        self.lateness.clear()
+        self.keyframes = 0
+        self.resyncs = 0
@@ -1,9 +1,17 @@
 import argparse
-import socket
+import asyncio
+import functools
+import itertools
+import sys
 import time
-import yaml
 
-from hexapod import Hexapod_12DOF, Hexapod_18DOF
+from config_compiler import load_config
+from eventlog import DEBUG, INFO, LEVEL_NAMES, LOG, WARNING
+from hexapod import create_hexapod
+from metrics import METRICS, serve_metrics
+from motion_queue import NORMAL, PREEMPT, MotionQueue
+from pca9685 import BACKENDS
+from protocol import DONE, EVENT, MAGIC, REPLY, REQUEST, FrameBuffer, ProtocolError, pack_frame
  
 def get_args():
     parser = argparse.ArgumentParser(description='hexapod server.')
@@ -24,206 +32,386 @@ def get_args():
             '--config_file',
             default='config_12DOF.yaml',
             help='hexapod configuration file')
+
+    parser.add_argument(
+            '-b',
+            '--backend',
+            default=None,
+            choices=BACKENDS,
+            help='servo board backend, overrides the config file')
+
+    parser.add_argument(
+            '--fast_start',
+            action="store_true",
+            help='skip the initial leg tests at startup')
+
+    parser.add_argument(
+            '--metrics_port',
+            default=9105,
+            type=int,
+            help='port of the Prometheus metrics endpoint on localhost, 0 to disable')
+
+    parser.add_argument(
+            '--log_level',
+            default='INFO',
+            choices=sorted(LEVEL_NAMES.values()),
+            help='lowest level of the events logged')
+
+    parser.add_argument(
+            '--log_file',
+            default=None,
+            help='append the event log to this file instead of stdout')
     
     return parser.parse_args()
 
-def initialize_hexapod(config_file):
-    my_hexapod = None
-    
-    # open config file
-    with open(config_file) as f:
-        my_config = yaml.load(f)
+def initialize_hexapod(config_file, backend=None, fast_start=False):
+    # compiled once per version of the config file, see config_compiler.py
+    my_config = load_config(config_file)
 
-    if config_file == 'config_12DOF.yaml':
-        my_hexapod = Hexapod_12DOF(my_config)
-        my_hexapod.initial_tests()
-        
-    elif config_file == 'config_18DOF.yaml':
-        my_hexapod = Hexapod_18DOF(my_config)
+    backend_config = dict(my_config.get('backend') or {})
+    if backend is not None:
+        backend_config['type'] = backend
+
+    my_hexapod = create_hexapod(my_config, backend_config)
+    if not fast_start:
         my_hexapod.initial_tests()
-        
-    else:
-        print('ERROR: Cannot recognize the config file!!!')
 
     return my_hexapod
 
 
+CONNECTED = LOG.event('connected', INFO, 'I48s', 'connection {} from {}')
+DISCONNECTED = LOG.event('disconnected', INFO, 'I', 'connection {} closed')
+RECEIVED = LOG.event('received', INFO, 'I48s', 'connection {}: {}')
+COMMAND = LOG.event('command', DEBUG, '52s', 'running {}')
+UNKNOWN_COMMAND = LOG.event('unknown_command', WARNING, '52s', 'command not recognized: {}')
+DONE_EVENT = LOG.event('done', INFO, 'I48s', 'done {}: {}')
+
+# seconds a text client's command without a newline waits for more input
+LINE_TIMEOUT = 0.05
+
+# handled by the server for the connection rather than by the hexapod, and
+# not allowed in scripts
+SESSION_COMMANDS = {
+    'subscribe': 'get a Done message for every command',
+    'unsubscribe': 'stop getting Done messages',
+    'stop': 'drop the queued commands and stop the running one',
+    'cancel': 'cancel [id]: cancel the running or a queued command',
+    'script': 'script followed by command lines: run them as one job (framed protocol)',
+    'commands': 'list the commands',
+    'describe': 'describe <command> [arguments]: duration and servos moved from the current pose',
+}
+
+
 def command_processor(data, my_hexapod):
-    print('Data: {}'.format(data))
+    LOG.log(COMMAND, data)
 
     items = data.split()
-    if len(items) == 1:
-        command = items[0]
-        iteration = 1
+    if not items:
+        return 'ERROR: invalid command format'
 
-    elif len(items) == 2:
-        command = items[0]
-        iteration = int(items[1])
+    command = items[0]
+    tokens = items[1:]
 
-    else:
-        return 'ERROR: invalid command format'
+    if command == 'commands':
+        temp = 'Implemented Commands: '
+        for name in sorted({registered.name for registered in my_hexapod.commands.values()}):
+            temp += my_hexapod.commands[name].usage() + ', '
 
-    print('Command: {}'.format(command))
-    print('Iteration: {}'.format(iteration))
-
-    commands = [
-        'turn_left',
-        'turn_right',
-        'walk_forward|walk',
-        'walk_backward|walk_back',
-        'front_dancing_1',
-        'front_dancing_2',
-        'back_dancing_1',
-        'back_dancing_2',
-        'sit',
-        'stand',
-        'center',
-        'spread',
-        'align',
-        'rotate_left',
-        'rotate_right',
-    ]
-
-    if command == 'turn_left':
-        for i in range(iteration):
-            print('turning left...')
-            my_hexapod.turn_left()
-
-        return ('Turning Left {} times'.format(iteration))
-
-    elif command == 'turn_right':
-        for i in range(iteration):
-            print('turning right...')
-            my_hexapod.turn_right()
-
-        return ('Turning Right {} times'.format(iteration))
-
-    elif command == 'rotate_left':
-        for i in range(iteration):
-            print('rotating left...')
-            if i%2:
-                my_hexapod.rotate(left=True, back=False)
-            else:
-                my_hexapod.rotate(left=True, back=True)
+        for name in SESSION_COMMANDS:
+            temp += name + ', '
+
+        return temp
 
-        return ('Rotating Left {} times'.format(iteration))
+    elif command == 'describe':
+        if not tokens or tokens[0] not in my_hexapod.commands:
+            return 'ERROR: {}'.format(SESSION_COMMANDS['describe'])
 
-    elif command == 'rotate_right':
-        for i in range(iteration):
-            print('rotating_right...')
-            if i%2:
-                my_hexapod.rotate(left=False, back=False)
-            else:
-                my_hexapod.rotate(left=False, back=True)
+        registered = my_hexapod.commands[tokens[0]]
+        try:
+            info = my_hexapod.describe_command(tokens[0], tokens[1:])
+        except ValueError as e:
+            return 'ERROR: invalid arguments for {}: {}'.format(tokens[0], e)
 
-        return ('Rotating Right {} times'.format(iteration))
+        return '{} - {}: duration={:.2f}s servos={}'.format(
+                registered.usage(), registered.help, info['duration'], ','.join(info['servos']))
 
-    elif command == 'walk_forward' or command == 'walk':
-        for i in range(iteration):
-            print('walking forward...')
-            if i%2:
-                my_hexapod.left_right_left_step()
-            else:
-                my_hexapod.right_left_right_step()
+    registered = my_hexapod.commands.get(command)
+    if registered is None:
+        LOG.log(UNKNOWN_COMMAND, command)
+        METRICS.counter('unknown_commands_total', 'commands not recognized').inc()
+        return 'Command not found!'
 
-        return ('Walking Forward {} times'.format(iteration))
+    try:
+        kwargs = registered.parse(tokens)
+    except ValueError as e:
+        return 'ERROR: invalid arguments for {}: {}'.format(command, e)
+
+    # how long the command ran and how many servo writes it asked the boards for
+    set_pwm = set_pwm_calls(my_hexapod)
+    start = time.perf_counter()
+
+    response = getattr(my_hexapod, registered.method_name)(**kwargs)
+
+    METRICS.histogram('command_seconds', 'command run time', command=registered.name).record(
+            time.perf_counter() - start)
+    METRICS.gauge('command_set_pwm', 'set_pwm calls of the last run', command=registered.name).set(
+            set_pwm_calls(my_hexapod) - set_pwm)
+
+    return response
+
+def set_pwm_calls(my_hexapod):
+    return sum(stats['hits'] + stats['misses'] for stats in my_hexapod.board_stats().values())
+
+class HexapodServer:
+    # Serves any number of clients at once. Motion commands are acknowledged
+    # right away and go through a MotionQueue that runs them one at a time,
+    # clients that sent 'subscribe' are told when each of them is done.
+    # Prefixing a command with '!' preempts: the queue is dropped and the running
+    # command stops at its next keyframe. 'stop' does the same without a new
+    # command, 'cancel [id]' cancels the running (or the given) command only.
+    # Connections opening with protocol.MAGIC talk in frames (see protocol.py)
+    # and get a DONE frame for each of their queued commands.
+    def __init__(self, my_hexapod):
+        self.hexapod = my_hexapod
+        self.subscribers = set()
+        self.loop = None
+        self.connections = itertools.count(1)
+
+        # framed connections, and the (connection, request id) of queued commands
+        self.binary = set()
+        self.requests = {}
+        self.queue = MotionQueue(
+                functools.partial(run_job, my_hexapod=my_hexapod),
+                my_hexapod.scheduler,
+                self.finished)
+
+    async def serve(self, host, port):
+        self.loop = asyncio.get_running_loop()
+
+        server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        connection = next(self.connections)
+        LOG.log(CONNECTED, connection, str(writer.get_extra_info('peername')))
 
-    elif command == 'walk_backward' or command == 'walk_back':
-        for i in range(iteration):
-            print('walking backward...')
-            if i%2:
-                my_hexapod.left_right_left_step_back()
+        try:
+            # framed clients open with the protocol magic
+            data = b''
+            while len(data) < len(MAGIC) and MAGIC.startswith(data):
+                chunk = await reader.read(1024)
+                if not chunk:
+                    return
+
+                data += chunk
+
+            if data.startswith(MAGIC):
+                await self.binary_client(reader, writer, connection, data[len(MAGIC):])
             else:
-                my_hexapod.right_left_right_step_back()
-
-        return ('Walking Backward {} times'.format(iteration))
-
-    elif command == 'front_dancing_1':
-        print('front dancing...')
-        my_hexapod.front_leg_dancing(step=1, iteration=iteration)
-        return ('Dancing Front Legs {} times'.format(iteration))
-
-    elif command == 'front_dancing_2':
-        print('front dancing...')
-        my_hexapod.front_leg_dancing(step=2, iteration=iteration)
-        return ('Dancing Front Legs {} times'.format(iteration))
-
-    elif command == 'back_dancing_1':
-        print('back dancing...')
-        my_hexapod.back_leg_dancing(step=1, iteration=iteration)
-        return ('Dancing Back Legs {} times'.format(iteration))
-
-    elif command == 'back_dancing_2':
-        print('back dancing...')
-        my_hexapod.back_leg_dancing(step=2, iteration=iteration)
-        return ('Dancing Back Legs {} times'.format(iteration))
-
-    elif command == 'sit':
-        print('sitting...')
-        my_hexapod.sit()
-        return ('Sitting')
-
-    elif command == 'stand':
-        print('standing...')
-        my_hexapod.stand()
-        return ('Standing')
-
-    elif command == 'center':
-        print('centering legs...')
-        my_hexapod.center_all_legs()
-        return ('Centering All Legs')
-
-    elif command == 'align':
-        print('aligning legs...')
-        my_hexapod.align_all_legs()
-        return ('Aligning All Legs')
-
-    elif command == 'spread':
-        print('spreading legs...')
-        my_hexapod.spread_all_legs()
-        return ('Spreading All Legs')
-
-    elif command == 'commands':
-        temp = 'Implemented Commands: '
-        for command in commands:
-            temp += command + ', '
+                await self.text_client(reader, writer, connection, data)
 
-        return temp
+        except (ConnectionError, asyncio.IncompleteReadError, ProtocolError):
+            pass
 
-    else:
-        print('ERROR: command not recognized: {}'.format(command))
-        return 'Command not found!'
+        finally:
+            self.subscribers.discard(writer)
+            self.binary.discard(writer)
+            for job_id, request in list(self.requests.items()):
+                if request[0] is writer:
+                    del self.requests[job_id]
+
+            LOG.log(DISCONNECTED, connection)
+            writer.close()
+
+    async def text_client(self, reader, writer, connection, data):
+        # One command per line. Interactive clients that send a command without
+        # a newline get it run once they stop sending for LINE_TIMEOUT seconds.
+        buffer = data
+        while True:
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                await self.text_command(line, writer, connection)
+
+            await writer.drain()
+
+            try:
+                data = await asyncio.wait_for(reader.read(1024), LINE_TIMEOUT if buffer.strip() else None)
+            except asyncio.TimeoutError:
+                data = b'\n'
 
-def listenToClient(client, address, my_hexapod):
-    size=1024
-    while True:
+            if not data:
+                await self.text_command(buffer, writer, connection)
+                await writer.drain()
+                return
+
+            buffer += data
+
+    async def text_command(self, line, writer, connection):
         try:
-            data = client.recv(size).decode()
-            if data:
-                # Read command from client
-                print("from connected user: " + str(data))
-                response = command_processor(data, my_hexapod)
-
-                # data = str(data).upper()
-                client.send(response.encode())
-            else:
-                raise error('Client disconnected')
-        except:
-            client.close()
+            line = line.decode().strip()
+        except UnicodeDecodeError:
+            writer.write(b'ERROR: command is not valid UTF-8\n')
+            return
+
+        if line:
+            LOG.log(RECEIVED, connection, line)
+            response, job_id = await self.submit(line, writer)
+            writer.write((response + '\n').encode())
+
+    async def binary_client(self, reader, writer, connection, data):
+        self.binary.add(writer)
+
+        # bytes that came in with the magic belong to the first frames
+        frames = FrameBuffer()
+        pending = frames.feed(data)
+
+        while True:
+            for request_id, kind, body in pending:
+                if kind != REQUEST:
+                    raise ProtocolError('unexpected frame kind {}'.format(kind))
+
+                LOG.log(RECEIVED, connection, body)
+                response, job_id = await self.submit(body.strip(), writer)
+                if job_id is not None:
+                    self.requests[job_id] = (writer, request_id)
+
+                writer.write(pack_frame(request_id, REPLY, response))
+
+            await writer.drain()
+
+            data = await reader.read(4096)
+            if not data:
+                return
+
+            pending = frames.feed(data)
+
+    async def submit(self, data, writer):
+        # Response to send back for one command line, and the motion queue id
+        # when the command was queued
+        priority = NORMAL
+        if data.startswith('!'):
+            priority = PREEMPT
+            data = data[1:].strip()
+
+        items = data.split()
+        if not items:
+            return 'ERROR: invalid command format', None
+
+        command = items[0]
+
+        if command == 'subscribe':
+            self.subscribers.add(writer)
+            return 'Subscribed', None
+
+        elif command == 'unsubscribe':
+            self.subscribers.discard(writer)
+            return 'Unsubscribed', None
+
+        elif command == 'stop':
+            self.queue.stop()
+            return 'Stopping', None
+
+        elif command == 'cancel':
+            if len(items) > 2 or (len(items) == 2 and not items[1].isdigit()):
+                return 'ERROR: {}'.format(SESSION_COMMANDS['cancel']), None
+
+            job_id = int(items[1]) if len(items) == 2 else None
+            if self.queue.cancel(job_id):
+                return 'Cancelling {}'.format(items[1] if job_id else 'current command'), None
+
+            return 'Nothing to cancel', None
+
+        elif command == 'script':
+            # a whole script as one job: its lines follow the 'script' line in the
+            # same request, so this needs the framed protocol
+            lines = [line.strip() for line in data.splitlines()[1:] if line.strip()]
+            if not lines:
+                return 'ERROR: empty script', None
+
+            for line in lines:
+                if not self.is_script_line(line):
+                    return 'ERROR: invalid script line: {}'.format(line), None
+
+            job_id = self.queue.put(command, priority=priority, lines=lines)
+            return 'Queued {}: script of {} commands'.format(job_id, len(lines)), job_id
+
+        elif command == 'describe':
+            # compiling a long command takes a while: the other clients are
+            # served meanwhile, this one waits for its answer
+            return await self.loop.run_in_executor(None, command_processor, data, self.hexapod), None
+
+        registered = self.hexapod.commands.get(command)
+        if registered is None or not registered.motion:
+            return command_processor(data, self.hexapod), None
+
+        try:
+            kwargs = registered.parse(items[1:])
+        except ValueError as e:
+            return 'ERROR: invalid arguments for {}: {}'.format(command, e), None
+
+        # runs of a repeatable command queued back to back are merged
+        if registered.repeatable():
+            job_id = self.queue.put(command, items[2:], priority, iteration=kwargs['iteration'])
+        else:
+            job_id = self.queue.put(command, items[1:], priority)
+
+        return 'Queued {}: {}'.format(job_id, data), job_id
+
+    def is_script_line(self, line):
+        items = line.split()
+        registered = self.hexapod.commands.get(items[0])
+        if registered is None or not registered.motion:
+            return False
+
+        try:
+            registered.parse(items[1:])
+        except ValueError:
             return False
 
-def Main(host, port, config_file):
-    my_hexapod = initialize_hexapod(config_file)
+        return True
+
+    def finished(self, job_ids, response):
+        # Called by the motion queue, from its worker thread
+        for job_id in job_ids:
+            self.loop.call_soon_threadsafe(self.publish, job_id, response)
+
+    def publish(self, job_id, response):
+        # DONE frame to a framed client that sent the command, 'Done <id>: ...'
+        # to every subscriber
+        requester = None
+        if job_id in self.requests:
+            requester, request_id = self.requests.pop(job_id)
+            if not requester.is_closing():
+                requester.write(pack_frame(request_id, DONE, response))
+
+        LOG.log(DONE_EVENT, job_id, response)
+
+        message = 'Done {}: {}'.format(job_id, response)
+        for writer in list(self.subscribers):
+            if writer.is_closing():
+                self.subscribers.discard(writer)
+            elif writer in self.binary:
+                if writer is not requester:
+                    writer.write(pack_frame(job_id, EVENT, message))
+            else:
+                writer.write((message + '\n').encode())
 
-    mySocket = socket.socket()
-    mySocket.bind((host,port))
-     
-    mySocket.listen(5)
-    while True:
-        client, address = mySocket.accept()
-        client.settimeout(300)
-        print ("Connection from: " + str(address))
-        listenToClient(client, address, my_hexapod)
+def run_job(data, my_hexapod):
+    # Run a queued command line, or every line of an uploaded script
+    lines = data.splitlines()
+    if lines[0] != 'script':
+        return command_processor(data, my_hexapod)
+
+    for line in lines[1:]:
+        command_processor(line, my_hexapod)
+
+    return 'Ran script of {} commands'.format(len(lines) - 1)
+
+def Main(host, port, config_file, backend=None, fast_start=False):
+    my_hexapod = initialize_hexapod(config_file, backend, fast_start)
+
+    asyncio.run(HexapodServer(my_hexapod).serve(host, port))
      
 if __name__ == '__main__':
     args = get_args()
@@ -231,5 +419,14 @@ if __name__ == '__main__':
     print('Host: {}'.format(args.host))
     print('Port: {}'.format(args.port))
     print('Config File: {}'.format(args.config_file))
+    print('Backend: {}'.format(args.backend))
+    print('Fast Start: {}'.format(args.fast_start))
+
+    # diagnostics go through the event log so they never hold up the servos
+    LOG.level = {name: level for level, name in LEVEL_NAMES.items()}[args.log_level]
+    LOG.start(open(args.log_file, 'a') if args.log_file else sys.stdout)
+
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
 
-    Main(args.host, args.port, args.config_file)
+    Main(args.host, args.port, args.config_file, args.backend, args.fast_start)
@@ -0,0 +1,150 @@
+from __future__ import division
+
+import copy
+
+import numpy as np
+
+from eventlog import ERROR, LOG
+
+PERCENT_OUT_OF_RANGE = LOG.event(
+        'percent_out_of_range', ERROR, 'Id',
+        'percent must be between 0 and 100, got {} values, first Percent = {}, setting Percent = 0')
+
+POSITIONS = ('forward', 'back', 'up', 'down', 'center')
+
+LEGS = (
+    'left_front',
+    'left_center',
+    'left_back',
+    'right_front',
+    'right_center',
+    'right_back',
+)
+
+# Named sets of legs usable wherever a leg name is accepted
+LEG_GROUPS = {
+    'all': LEGS,
+    'left': ('left_front', 'left_center', 'left_back'),
+    'right': ('right_front', 'right_center', 'right_back'),
+    'front': ('left_front', 'right_front'),
+    'center': ('left_center', 'right_center'),
+    'back': ('left_back', 'right_back'),
+    # tripods used by the walking gaits
+    'right_left_right': ('right_front', 'left_center', 'right_back'),
+    'left_right_left': ('left_front', 'right_center', 'left_back'),
+    # outer legs of one side, used by the turns
+    'left_front_back': ('left_front', 'left_back'),
+    'right_front_back': ('right_front', 'right_back'),
+}
+
+
+def position_value(value):
+    # null (or the 'None' string used in config_18DOF.yaml) means not defined
+    if value is None or value == 'None':
+        return np.nan
+
+    return float(value)
+
+
+class ServoBank:
+    def __init__(self, servos):
+        # servos: list of dicts with the servo fields of the config file plus the
+        # index of the servo's board in Hexapod.board_list
+        self.names = [servo['name'] for servo in servos]
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+        self.board = np.array([servo['board'] for servo in servos], dtype=np.intp)
+        self.channel = np.array([servo['channel'] for servo in servos], dtype=np.intp)
+        self.servo_min = np.array([servo['servo_min'] for servo in servos], dtype=float)
+        self.servo_max = np.array([servo['servo_max'] for servo in servos], dtype=float)
+        self.invert = np.array([bool(servo['invert']) for servo in servos], dtype=bool)
+
+        # named positions in percent, NaN where not defined
+        self.positions = {}
+        for position in POSITIONS:
+            self.positions[position] = np.array(
+                    [position_value(servo.get(position)) for servo in servos], dtype=float)
+
+        # last pulse sent to each servo, -1 if never set
+        self.current = np.full(len(servos), -1, dtype=np.int64)
+
+        self.selections = {}
+
+        # bumped on every change of the servo tuning
+        self.version = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def copy(self):
+        # Bank with the same servos, tuning and pose that changes independently
+        bank = copy.copy(self)
+        for field in ('board', 'channel', 'servo_min', 'servo_max', 'invert', 'current'):
+            setattr(bank, field, getattr(self, field).copy())
+
+        bank.positions = {position: values.copy() for position, values in self.positions.items()}
+        bank.selections = dict(self.selections)
+
+        return bank
+
+    def select(self, legs='all', joint=None):
+        # Indices of the servos of the given legs (leg name, group name or list
+        # of either) and joint ('rotate', 'raise', 'lower', 'upper' or None for all)
+        if not isinstance(legs, str):
+            legs = tuple(legs)
+
+        key = (legs, joint)
+        if key not in self.selections:
+            names = []
+            for leg in ([legs] if isinstance(legs, str) else legs):
+                names.extend(LEG_GROUPS.get(leg, (leg,)))
+
+            indices = []
+            for i, name in enumerate(self.names):
+                leg, _, servo_joint = name.rpartition('_')
+                if leg in names and (joint is None or servo_joint == joint):
+                    indices.append(i)
+
+            self.selections[key] = np.array(indices, dtype=np.intp)
+
+        return self.selections[key]
+
+    def percent_to_pulse(self, percent, indices):
+        # percent may carry leading dimensions, e.g. (frames, servos)
+        percent = np.asarray(percent, dtype=float)
+        percent = np.broadcast_to(percent, np.broadcast_shapes(percent.shape, np.shape(indices)))
+
+        valid = (percent >= 0) & (percent <= 100)
+        if not valid.all():
+            LOG.log(PERCENT_OUT_OF_RANGE, np.count_nonzero(~valid), percent[~valid].flat[0])
+
+        percent = np.where(self.invert[indices], 100 - percent, percent)
+
+        my_range = self.servo_max[indices] - self.servo_min[indices]
+        offset = self.servo_min[indices]
+        pulse = (percent * my_range)/100 + offset
+
+        return np.where(valid, pulse, 0).astype(int)
+
+    def get(self, field, index):
+        if field in self.positions:
+            value = self.positions[field][index]
+            return None if np.isnan(value) else float(value)
+
+        if field == 'current':
+            value = int(self.current[index])
+            return None if value < 0 else value
+
+        return getattr(self, field)[index].item()
+
+    def set(self, field, index, value):
+        if field == 'current':
+            self.current[index] = -1 if value is None else value
+            return
+
+        if field in self.positions:
+            self.positions[field][index] = position_value(value)
+        else:
+            getattr(self, field)[index] = value
+
+        self.version += 1
@@ -0,0 +1,73 @@
+from __future__ import division
+
+import numpy as np
+
+# Easing of a segment, s goes from 0 to 1 over the segment
+PROFILES = {
+    'linear': lambda s: s,
+    'cosine': lambda s: (1 - np.cos(np.pi * s)) / 2,
+    'minimum_jerk': lambda s: s**3 * (10 - 15*s + 6*s**2),
+}
+
+DEFAULT_RATE = 50
+
+
+def interpolate(start, end, duration, rate=DEFAULT_RATE, profile='minimum_jerk'):
+    # Frames (T, servos) moving from pose start to pose end in duration seconds
+    # at rate Hz. The first frame is one period after start, the last one is end.
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+
+    count = max(1, int(round(duration * rate)))
+    s = np.arange(1, count + 1) / count
+
+    return start + (end - start) * PROFILES[profile](s)[:, None]
+
+
+def keyframe_frames(times, poses, rate=DEFAULT_RATE, profile='minimum_jerk'):
+    # Frames (T, servos) through poses (K, servos) reached at times (K,), sampled
+    # every 1/rate seconds from times[0] to times[-1]. Returns (frame times, frames).
+    times = np.asarray(times, dtype=float)
+    poses = np.asarray(poses, dtype=float)
+
+    frame_times = np.arange(times[0], times[-1], 1 / rate)
+    frame_times = np.append(frame_times[1:], times[-1])
+
+    segment = np.clip(np.searchsorted(times, frame_times, side='right') - 1, 0, len(times) - 2)
+    span = times[segment + 1] - times[segment]
+    s = np.clip((frame_times - times[segment]) / np.where(span > 0, span, 1), 0, 1)
+
+    blend = PROFILES[profile](s)[:, None]
+    frames = poses[segment] + (poses[segment + 1] - poses[segment]) * blend
+
+    return frame_times, frames
+
+
+def table_keyframes(table, start, settle=0.2):
+    # Poses (pulses) of a GaitTable for keyframe_frames(). Keyframe k becomes the
+    # target reached when keyframe k+1 starts, the last one settle seconds after
+    # it is sent (or at the end of the table). start: pulses before the table,
+    # -1 where unknown.
+    pose = np.asarray(start, dtype=float).copy()
+
+    unknown = pose < 0
+    for offset, writes in table.frames:
+        for servo, board, channel, pulse in writes:
+            if unknown[servo]:
+                pose[servo] = pulse
+                unknown[servo] = False
+
+    times = [table.frames[0][0] if table.frames else 0.0]
+    poses = [pose.copy()]
+    for k, (offset, writes) in enumerate(table.frames):
+        for servo, board, channel, pulse in writes:
+            pose[servo] = pulse
+
+        if k + 1 < len(table.frames):
+            times.append(table.frames[k + 1][0])
+        else:
+            times.append(max(table.duration, offset + settle))
+
+        poses.append(pose.copy())
+
+    return np.array(times), np.array(poses)
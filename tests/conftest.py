@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+
+HEXAPOD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'hexapod')
+
+# the hexapod modules import each other as top level modules
+if HEXAPOD_DIR not in sys.path:
+    sys.path.insert(0, HEXAPOD_DIR)
+
+from gait_compiler import VirtualClock
+from scheduler import MotionScheduler
+
+SIMULATED = {'type': 'simulated'}
+
+# Leg geometry of an 18DOF hexapod for the inverse kinematics: the shipped
+# config has none until it is measured on the robot
+GEOMETRY = {
+    'coxa_length': 30,
+    'femur_length': 80,
+    'tibia_length': 120,
+    'stance_reach': 120,
+    'stance_height': 90,
+    'joints': {'rotate': [45, -45], 'upper': [-45, 90], 'lower': [-150, -30]},
+    'legs': {
+        'left_front': [80, 50, 45],
+        'left_center': [0, 70, 90],
+        'left_back': [-80, 50, 135],
+        'right_front': [80, -50, -45],
+        'right_center': [0, -70, -90],
+        'right_back': [-80, -50, -135],
+    },
+}
+
+
+def config_path(model):
+    return os.path.join(HEXAPOD_DIR, 'config_{}.yaml'.format(model))
+
+
+def make_hexapod(model, cache_dir, backend=SIMULATED, geometry=None):
+    # Hexapod on simulated boards whose movements run on a virtual clock.
+    # geometry: leg geometry added to the config
+    from config_compiler import load_config
+    from hexapod import create_hexapod
+
+    config = load_config(config_path(model), cache_dir)
+    if geometry is not None:
+        config = dict(config, geometry=geometry)
+
+    my_hexapod = create_hexapod(config, backend)
+    clock = VirtualClock()
+    my_hexapod.scheduler = MotionScheduler(clock=clock.clock, sleep=clock.sleep)
+    my_hexapod.clock = clock
+
+    return my_hexapod
+
+
+@pytest.fixture(params=['12DOF', '18DOF'])
+def hexapod(request, tmp_path):
+    my_hexapod = make_hexapod(request.param, str(tmp_path), geometry=GEOMETRY if request.param == '18DOF' else None)
+    yield my_hexapod
+    my_hexapod.close()
+
+
+@pytest.fixture
+def hexapod_12dof(tmp_path):
+    my_hexapod = make_hexapod('12DOF', str(tmp_path))
+    yield my_hexapod
+    my_hexapod.close()
+
+
+@pytest.fixture
+def hexapod_18dof(tmp_path):
+    my_hexapod = make_hexapod('18DOF', str(tmp_path), geometry=GEOMETRY)
+    yield my_hexapod
+    my_hexapod.close()
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+from conftest import HEXAPOD_DIR
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(HEXAPOD_DIR), 'benchmarks')
+if BENCHMARKS_DIR not in sys.path:
+    sys.path.insert(0, BENCHMARKS_DIR)
+
+from common import metric
+from run import best_of, compare
+
+
+def test_best_of_keeps_best_timings_and_exact_results():
+    runs = [
+        {'fps': metric(100, 'frames/s', 'higher'), 'ms': metric(5.0, 'ms'), 'count': metric(7, '', exact=True)},
+        {'fps': metric(120, 'frames/s', 'higher'), 'ms': metric(6.0, 'ms'), 'count': metric(7, '', exact=True)},
+        {'fps': metric(90, 'frames/s', 'higher'), 'ms': metric(4.0, 'ms'), 'count': metric(7, '', exact=True)},
+    ]
+
+    results = best_of(runs)
+    assert results['fps']['value'] == 120
+    assert results['ms']['value'] == 4.0
+    assert results['count']['value'] == 7
+
+
+def test_compare():
+    baseline = {'fps': metric(100, 'frames/s', 'higher'), 'ms': metric(4.0, 'ms'),
+                'count': metric(7, '', exact=True), 'centroid': metric(float('nan'), 'px', exact=True)}
+    results = {'fps': metric(80, 'frames/s', 'higher'), 'ms': metric(5.2, 'ms'),
+               'count': metric(8, '', exact=True), 'centroid': metric(float('nan'), 'px', exact=True),
+               'new': metric(1.0, 'ms')}
+
+    # fps is 20% slower, within the tolerance, ms 30% slower
+    regressions = compare(results, baseline, 0.25)
+    assert [(name, change) for name, old, new, change in regressions] == [('count', None), ('ms', pytest.approx(0.3))]
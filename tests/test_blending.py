@@ -0,0 +1,106 @@
+import numpy as np
+
+from hexapod import BLEND_OVERLAP
+from pca9685 import LED0_ON_L
+
+# seconds play_smooth() gives the last keyframe, see trajectory.table_keyframes()
+SETTLE = 0.2
+
+
+def run(my_hexapod, method_name, *args, **kwargs):
+    # (final pose, seconds taken) of a movement started from the centered pose
+    my_hexapod.center_all_legs()
+    my_hexapod.stand()
+    start = my_hexapod.clock.now
+    getattr(my_hexapod, method_name)(*args, **kwargs)
+
+    return my_hexapod.bank.current.copy(), my_hexapod.clock.now - start
+
+
+def run_steps(my_hexapod, names):
+    my_hexapod.center_all_legs()
+    my_hexapod.stand()
+    start = my_hexapod.clock.now
+    for name in names:
+        getattr(my_hexapod, name)()
+
+    return my_hexapod.bank.current.copy(), my_hexapod.clock.now - start
+
+
+def test_walk_ends_in_pose_of_steps_and_sooner(hexapod_12dof):
+    names = ['right_left_right_step', 'left_right_left_step'] * 2
+    pose, seconds = run_steps(hexapod_12dof, names)
+
+    blended_pose, blended_seconds = run(hexapod_12dof, 'command_walk', iteration=4)
+
+    assert (blended_pose == pose).all()
+    # the re-centering that starts every step after the first is dropped
+    assert blended_seconds < seconds - 0.5
+
+
+def test_row_overlaps_iterations(hexapod_12dof):
+    # each row ends with a wait the next one overlaps
+    pose, seconds = run_steps(hexapod_12dof, ['row'] * 3)
+    blended_pose, blended_seconds = run(hexapod_12dof, 'command_row', iteration=3)
+
+    assert (blended_pose == pose).all()
+    assert blended_seconds < seconds - 2 * BLEND_OVERLAP + SETTLE
+
+
+def test_rotate_ends_in_pose_of_iterations(hexapod):
+    run_steps(hexapod, [])
+    hexapod.rotate(left=True, back=True)
+    hexapod.rotate(left=True, back=False)
+    pose = hexapod.bank.current.copy()
+
+    blended_pose, blended_seconds = run(hexapod, 'command_rotate', iteration=2, left=True)
+
+    assert (blended_pose == pose).all()
+
+
+def pulse_series(device):
+    # {channel: [pulse, ...]} in the order the device received them
+    series = {}
+    for timestamp, register, data in device.writes:
+        if register < LED0_ON_L or (register - LED0_ON_L) % 4:
+            continue
+
+        for i in range(0, len(data) - 3, 4):
+            channel = (register - LED0_ON_L) // 4 + i // 4
+            series.setdefault(channel, []).append(data[i + 2] | data[i + 3] << 8)
+
+    return series
+
+
+def walk_writes(my_hexapod):
+    # Block writes of a two step walk from standing
+    my_hexapod.center_all_legs()
+    my_hexapod.stand()
+    for board in my_hexapod.board_list:
+        board.device.clear()
+
+    my_hexapod.command_walk(iteration=2)
+
+    return sum(board.device.transactions for board in my_hexapod.board_list)
+
+
+def test_smooth_commands_glide(hexapod_12dof):
+    stepped = walk_writes(hexapod_12dof)
+
+    # the servos glide between keyframes instead of jumping
+    hexapod_12dof.smooth = True
+    assert walk_writes(hexapod_12dof) > 2 * stepped
+
+    for board in hexapod_12dof.board_list:
+        for channel, pulses in pulse_series(board.device).items():
+            jumps = np.abs(np.diff(pulses))
+            assert jumps.max(initial=0) < 0.25 * (max(pulses) - min(pulses) + 1)
+
+
+def test_blend_cache_keyed_by_pose(hexapod_12dof):
+    hexapod_12dof.stand()
+    standing = hexapod_12dof.blend_gaits([('turn_left', {})], BLEND_OVERLAP)
+    assert hexapod_12dof.blend_gaits([('turn_left', {})], BLEND_OVERLAP) is standing
+
+    hexapod_12dof.sit()
+    assert hexapod_12dof.blend_gaits([('turn_left', {})], BLEND_OVERLAP) is not standing
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from conftest import SIMULATED, make_hexapod
+import hexapod
+from pca9685 import BoardWriter
+
+
+def registers(my_hexapod):
+    return {address: bytes(board['object'].device.registers) for address, board in my_hexapod.boards.items()}
+
+
+def test_parallel_writers_send_the_same_frames(tmp_path):
+    sequential = make_hexapod('18DOF', str(tmp_path))
+    parallel = make_hexapod('18DOF', str(tmp_path), dict(SIMULATED, parallel=True))
+    try:
+        assert len(parallel.writers) == 2
+
+        for my_hexapod in (sequential, parallel):
+            my_hexapod.stand()
+            my_hexapod.command_walk()
+
+        assert registers(parallel) == registers(sequential)
+        assert parallel.board_stats() == sequential.board_stats()
+        assert parallel.clock.now == sequential.clock.now
+    finally:
+        sequential.close()
+        parallel.close()
+
+    assert parallel.writers == []
+
+
+def test_writer_error_reaches_the_movement(tmp_path, monkeypatch):
+    my_hexapod = make_hexapod('18DOF', str(tmp_path), dict(SIMULATED, parallel=True))
+    try:
+        def fail(frame):
+            raise OSError('bus error')
+
+        monkeypatch.setattr(my_hexapod.board_list[1], 'write_frame', fail)
+        with pytest.raises(OSError, match='bus error'):
+            my_hexapod.stand()
+
+        # the writers keep going after a failed frame
+        monkeypatch.undo()
+        my_hexapod.sit()
+    finally:
+        my_hexapod.close()
+
+
+def test_stuck_writer_does_not_hang_the_movement(tmp_path, monkeypatch):
+    monkeypatch.setattr(hexapod, 'WRITER_TIMEOUT', 0.1)
+    my_hexapod = make_hexapod('18DOF', str(tmp_path), dict(SIMULATED, parallel=True))
+    try:
+        board = my_hexapod.board_list[1]
+        write_frame = board.write_frame
+        release = threading.Event()
+
+        def stuck(frame):
+            if isinstance(threading.current_thread(), BoardWriter):
+                release.wait()
+            write_frame(frame)
+
+        monkeypatch.setattr(board, 'write_frame', stuck)
+        with pytest.raises(threading.BrokenBarrierError):
+            my_hexapod.stand()
+
+        # the late writer finishes, the next movements go through
+        monkeypatch.setattr(board, 'write_frame', write_frame)
+        release.set()
+        my_hexapod.sit()
+        my_hexapod.stand()
+    finally:
+        my_hexapod.close()
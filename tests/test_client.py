@@ -0,0 +1,14 @@
+import client_if
+
+
+def test_script_mode_opens_only_the_framed_connection(monkeypatch):
+    def no_socket(*args, **kwargs):
+        raise AssertionError('script mode opened a raw socket')
+
+    runs = []
+    monkeypatch.setattr(client_if.socket, 'socket', no_socket)
+    monkeypatch.setattr(client_if, 'run_script', lambda *args: runs.append(args))
+
+    client_if.Main('localhost', 5555, 'sample_script.txt', vision=False, window=4, upload=True)
+
+    assert runs == [('localhost', 5555, 'sample_script.txt', 4, True)]
@@ -0,0 +1,56 @@
+import pytest
+
+from commands import command_table
+
+
+def test_describe_lists_servos_moved_from_pose(hexapod_12dof):
+    hexapod_12dof.stand()
+    assert hexapod_12dof.describe_command('stand')['servos'] == []
+
+    hexapod_12dof.sit()
+    info = hexapod_12dof.describe_command('stand')
+    assert info['servos'] == [hexapod_12dof.bank.names[i] for i in sorted(hexapod_12dof.leg_indices('raise'))]
+
+
+def test_describe_does_not_move(hexapod_12dof):
+    hexapod_12dof.center_all_legs()
+    pose = hexapod_12dof.bank.current.copy()
+    for board in hexapod_12dof.board_list:
+        board.device.clear()
+
+    info = hexapod_12dof.describe_command('walk', ['2'])
+
+    assert info['duration'] > 0
+    assert (hexapod_12dof.bank.current == pose).all()
+    assert all(board.device.transactions == 0 for board in hexapod_12dof.board_list)
+
+
+def test_describe_duration_matches_run(hexapod):
+    hexapod.center_all_legs()
+    info = hexapod.describe_command('turn_left', ['2'])
+
+    start = hexapod.clock.now
+    hexapod.command_turn_left(iteration=2)
+
+    assert abs(hexapod.clock.now - start - info['duration']) < 1e-9
+
+
+def test_describe_other_commands(hexapod_12dof):
+    assert hexapod_12dof.describe_command('stats') == {'duration': 0.0, 'servos': []}
+
+    with pytest.raises(ValueError):
+        hexapod_12dof.describe_command('walk', ['fast'])
+
+
+@pytest.mark.parametrize('iteration', ['0', '-2'])
+def test_iterations_must_be_positive(hexapod, iteration):
+    with pytest.raises(ValueError, match='count of 1 or more'):
+        hexapod.commands['walk'].parse([iteration])
+
+
+def test_command_table_aliases(hexapod):
+    table = command_table(type(hexapod))
+
+    assert table['walk'] is table['walk_forward']
+    assert table['walk'].parse(['3']) == {'iteration': 3}
+    assert table['rotate_left'].parse([]) == {'iteration': 1, 'left': True}
@@ -0,0 +1,94 @@
+import copy
+import os
+
+import pytest
+import yaml
+
+from conftest import GEOMETRY, config_path
+from config_compiler import MAGIC, ConfigError, compile_config, load_config
+
+
+def config_text(model, change):
+    # YAML of a shipped config file after change(config)
+    with open(config_path(model)) as f:
+        config = yaml.safe_load(f)
+
+    change(config)
+    return yaml.safe_dump(config).encode()
+
+
+def first_servo(config):
+    return config['boards'][0]['servos'][0]
+
+
+@pytest.mark.parametrize('model', ['12DOF', '18DOF'])
+def test_shipped_configs(model):
+    with open(config_path(model), 'rb') as f:
+        config = compile_config(f.read())
+
+    assert config['model'] == model
+
+
+@pytest.mark.parametrize('change, message', [
+    (lambda config: config.update(model='6DOF'), 'model must be one of'),
+    (lambda config: config.update(smooth='yes'), 'smooth must be True or False'),
+    (lambda config: config['boards'][0].update(pwm_freq=0), 'pwm_freq'),
+    (lambda config: first_servo(config).update(channel=16), 'channel'),
+    (lambda config: first_servo(config).update(servo_max='470'), 'servo_min < servo_max'),
+    (lambda config: first_servo(config).update(forward='full'), 'forward must be a percent'),
+    (lambda config: first_servo(config).update(back=150), 'back must be a percent'),
+    (lambda config: first_servo(config).update(up=True), 'up must be a percent'),
+    (lambda config: first_servo(config).pop('invert'), 'has no invert'),
+])
+def test_invalid_servos(change, message):
+    with pytest.raises(ConfigError, match=message):
+        compile_config(config_text('12DOF', change))
+
+
+@pytest.mark.parametrize('change, message', [
+    (lambda geometry: geometry.update(femur_length='80'), 'femur_length must be a positive number'),
+    (lambda geometry: geometry.update(stance_height=-5), 'stance_height'),
+    (lambda geometry: geometry['joints'].update(upper=[10]), 'joint upper'),
+    (lambda geometry: geometry['joints'].pop('lower'), 'joint lower'),
+    (lambda geometry: geometry['legs'].update(left_back=[0, 'y', 90]), 'leg left_back'),
+    (lambda geometry: geometry.pop('legs'), 'legs is not a mapping'),
+])
+def test_invalid_geometry(change, message):
+    with pytest.raises(ConfigError, match=message):
+        compile_config(config_text('18DOF', lambda config: change(config.setdefault('geometry', copy.deepcopy(GEOMETRY)))))
+
+
+def test_geometry_needs_leg_servos():
+    def change(config):
+        config['model'] = '18DOF'
+        config['geometry'] = copy.deepcopy(GEOMETRY)
+
+    with pytest.raises(ConfigError, match='no servo'):
+        compile_config(config_text('12DOF', change))
+
+
+def test_geometry_is_optional():
+    config = compile_config(config_text('18DOF', lambda config: None))
+    assert 'geometry' not in config
+
+    config = compile_config(config_text('18DOF', lambda config: config.update(geometry=copy.deepcopy(GEOMETRY))))
+    assert config['geometry'] == GEOMETRY
+
+
+def test_load_config_caches_compiled_form(tmp_path):
+    path = tmp_path / 'config.yaml'
+    path.write_bytes(config_text('12DOF', lambda config: None))
+
+    config = load_config(str(path))
+    cached = os.listdir(str(tmp_path / '__pycache__'))
+    assert len(cached) == 1
+
+    with open(str(tmp_path / '__pycache__' / cached[0]), 'rb') as f:
+        assert f.read(len(MAGIC)) == MAGIC
+
+    assert load_config(str(path)) == config
+
+    # a changed file is compiled again and replaces the stale form
+    path.write_bytes(config_text('12DOF', lambda config: first_servo(config).update(servo_min=200)))
+    assert first_servo(load_config(str(path)))['servo_min'] == 200
+    assert len(os.listdir(str(tmp_path / '__pycache__'))) == 1
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+
+from eventlog import DEBUG, ERROR, EventLog
+
+
+def make_log(**kwargs):
+    log = EventLog(clock=lambda: 12.5, **kwargs)
+    move = log.event('move', ERROR, 'H8sf', 'servo {} of {}: {:.1f}')
+    return log, move
+
+
+def test_records_are_formatted_when_flushed():
+    log, move = make_log()
+    log.log(move, 3, 'left_front_rotate', 42.0)
+
+    sink = io.StringIO()
+    log.flush(sink)
+    # the name is cut to its 8 bytes
+    assert sink.getvalue() == '12.500000 ERROR servo 3 of left_fro: 42.0\n'
+
+    log.flush(sink)
+    assert sink.getvalue().count('\n') == 1
+
+
+def test_levels_below_the_log_level_are_skipped():
+    log, move = make_log()
+    debug = log.event('detail', DEBUG)
+    log.log(debug)
+
+    assert not log.enabled(DEBUG)
+    assert log.records() == []
+
+
+def test_oldest_records_are_dropped_when_the_ring_is_full():
+    log, move = make_log(capacity=4)
+    for i in range(10):
+        log.log(move, i, 'x', 0.0)
+
+    records = log.records()
+    assert [move.struct.unpack(payload)[0] for timestamp, event, payload in records] == [6, 7, 8, 9]
+    assert log.dropped == 6
+
+
+def test_event_arguments_must_fit_a_record():
+    log = EventLog()
+    with pytest.raises(ValueError):
+        log.event('huge', ERROR, '64s')
+
+
+def test_flusher_writes_out_on_stop():
+    log, move = make_log()
+    sink = io.StringIO()
+    log.start(sink, interval=60)
+    log.log(move, 1, 'x', 1.0)
+    log.stop()
+
+    assert 'servo 1 of x: 1.0' in sink.getvalue()
@@ -0,0 +1,107 @@
+from gait_compiler import GaitTable, blend_tables, compile_gait
+
+
+def devices(my_hexapod):
+    return [board.device for board in my_hexapod.board_list]
+
+
+def test_compile_leaves_hexapod_alone(hexapod_12dof):
+    hexapod_12dof.center_all_legs()
+    boards = list(hexapod_12dof.board_list)
+    scheduler = hexapod_12dof.scheduler
+    pose = hexapod_12dof.bank.current.copy()
+    for device in devices(hexapod_12dof):
+        device.clear()
+
+    table = compile_gait(hexapod_12dof, 'right_left_right_step')
+
+    assert table.writes() > 0
+    assert hexapod_12dof.board_list == boards
+    assert hexapod_12dof.scheduler is scheduler
+    assert hexapod_12dof.frame_depth == 0
+    assert (hexapod_12dof.bank.current == pose).all()
+    assert all(device.transactions == 0 for device in devices(hexapod_12dof))
+
+
+def test_compile_during_a_movement(hexapod_12dof):
+    # a movement running on the hexapod keeps its staged writes and boards
+    hexapod_12dof.center_all_legs()
+    with hexapod_12dof.frame():
+        hexapod_12dof.servos['left_front_rotate'].set_position(80)
+        compile_gait(hexapod_12dof, 'turn_left')
+        assert hexapod_12dof.frame_depth == 1
+
+    expected = hexapod_12dof.servos['left_front_rotate'].servo_percent_to_pulse(80)
+    assert hexapod_12dof.bank.current[hexapod_12dof.bank.index['left_front_rotate']] == expected
+    board = hexapod_12dof.servos['left_front_rotate'].board
+    assert board.device.get_pwm(hexapod_12dof.servos['left_front_rotate'].channel)[1] == expected
+
+
+def test_play_matches_direct_run(hexapod):
+    # replaying a compiled movement ends in the pose and at the time running it does
+    hexapod.center_all_legs()
+    table = hexapod.compile_gait('row')
+
+    start = hexapod.clock.now
+    hexapod.play(table)
+    played = (hexapod.bank.current.copy(), hexapod.clock.now - start)
+
+    hexapod.center_all_legs()
+    start = hexapod.clock.now
+    hexapod.row()
+
+    assert (hexapod.bank.current == played[0]).all()
+    assert abs(hexapod.clock.now - start - played[1]) < 1e-9
+    assert abs(table.duration - played[1]) < 1e-9
+
+
+def test_absolute_movements_compile_once_for_every_pose(hexapod):
+    hexapod.stand()
+    table = hexapod.compile_gait('turn_left')
+
+    hexapod.sit()
+    assert hexapod.compile_gait('turn_left') is table
+    assert hexapod.cache_stats()['gait_tables']['hits'] == 1
+
+    # a command plays its iterations from wherever the hexapod stands
+    walk = hexapod.compile_gait('command_walk', iteration=1)
+    hexapod.stand()
+    assert hexapod.compile_gait('command_walk', iteration=1) is not walk
+
+
+def test_compiled_movements_are_bounded(hexapod_12dof, monkeypatch):
+    monkeypatch.setattr(hexapod_12dof.gait_tables, 'size', 2)
+    first = hexapod_12dof.compile_gait('row', back=False)
+    hexapod_12dof.compile_gait('row', back=True)
+    hexapod_12dof.compile_gait('row', back=False)
+    hexapod_12dof.compile_gait('turn_left')
+
+    # the least recently used one goes
+    assert hexapod_12dof.compile_gait('row', back=False) is first
+    assert hexapod_12dof.cache_stats()['gait_tables'] == {'size': 2, 'hits': 2, 'misses': 3, 'evictions': 1}
+
+    hexapod_12dof.compile_gait('row', back=True)
+    assert hexapod_12dof.cache_stats()['gait_tables']['evictions'] == 2
+
+
+def test_blend_drops_redundant_frames_and_overlaps():
+    a = GaitTable([(0.0, [(0, 0, 0, 100)]), (0.5, [(1, 0, 1, 200)])], 1.0)
+    b = GaitTable([(0.0, [(1, 0, 1, 200)]), (0.25, [(0, 0, 0, 300)])], 1.0)
+
+    table = blend_tables([a, b], [-1, -1], overlap=0.25)
+
+    # b's first keyframe repeats the pose a ends in and its wait is skipped
+    assert table.frames == [(0.0, [(0, 0, 0, 100)]), (0.5, [(1, 0, 1, 200)]), (0.75, [(0, 0, 0, 300)])]
+    assert table.duration == 1.5
+
+
+def test_blend_never_starts_before_last_keyframe():
+    a = GaitTable([(0.0, [(0, 0, 0, 100)]), (0.9, [(0, 0, 0, 150)])], 1.0)
+    b = GaitTable([(0.0, [(0, 0, 0, 200)])], 0.5)
+
+    table = blend_tables([a, b], [-1], overlap=0.5)
+
+    assert [time for time, writes in table.frames] == [0.0, 0.9]
+    assert table.frames[-1][1] == [(0, 0, 0, 200)]
+    assert table.duration == 1.4
+
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from conftest import make_hexapod
+from config_compiler import ConfigError
+from gaits import DUTY_FACTORS, PATTERNS, gait_cycle
+from hexapod import Hexapod
+
+
+@pytest.mark.parametrize('pattern', sorted(PATTERNS))
+def test_gait_cycle_duty_factor(pattern):
+    states = gait_cycle(pattern, frames=60)
+
+    assert states.shape == (60, 6, 2)
+    assert (np.abs(states[..., 0]) <= 1).all()
+    assert ((states[..., 1] >= 0) & (states[..., 1] <= 1)).all()
+
+    on_ground = (states[..., 1] == 0).mean(axis=0)
+    assert np.allclose(on_ground, DUTY_FACTORS[pattern], atol=1/60)
+
+
+def test_gait_cycle_tripods_alternate():
+    states = gait_cycle('tripod', frames=40)
+    lifted = states[..., 1] > 0
+
+    # never a tripod and a leg of the other one in the air together
+    assert not (lifted[:, [0, 2, 4]].any(axis=1) & lifted[:, [1, 3, 5]].any(axis=1)).any()
+
+
+def test_gait_pulses_of_each_model(hexapod):
+    hexapod.center_all_legs()
+    states = gait_cycle('tripod', frames=20)
+
+    pulses = hexapod.gait_pulses(states)
+
+    assert pulses.shape == (20, len(hexapod.bank))
+    assert (pulses >= 0).all()
+
+
+def test_walk_gait_duration(hexapod):
+    hexapod.center_all_legs()
+    start = hexapod.clock.now
+
+    hexapod.walk_gait(cycles=2, speed=1.0, rate=50)
+
+    # 0.25 s glide into the gait, then two one second cycles
+    assert np.isclose(hexapod.clock.now - start, 2.25, atol=0.03)
+
+
+def test_gait_pulses_is_abstract():
+    assert 'gait_pulses' in Hexapod.__abstractmethods__
+
+
+def test_gaits_need_geometry(hexapod_18dof, tmp_path):
+    assert {'tripod', 'wave_back', 'gait'} <= set(hexapod_18dof.commands)
+
+    # the shipped config has no geometry
+    my_hexapod = make_hexapod('18DOF', str(tmp_path))
+    try:
+        assert my_hexapod.ik is None
+        assert not {'tripod', 'wave_back', 'gait'} & set(my_hexapod.commands)
+        assert 'walk' in my_hexapod.commands
+
+        with pytest.raises(ConfigError, match='geometry'):
+            my_hexapod.gait_pulses(gait_cycle('tripod', frames=10))
+    finally:
+        my_hexapod.close()
@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def foot_tips(ik, angles):
+    # Forward kinematics: foot tips (..., 6, 3) of joint angles (..., 6, 3)
+    coxa, femur, knee = np.radians(np.moveaxis(angles, -1, 0))
+    coxa = coxa * ik.side
+
+    reach = ik.coxa + ik.femur * np.cos(femur) + ik.tibia * np.cos(femur + knee)
+    z = ik.femur * np.sin(femur) + ik.tibia * np.sin(femur + knee)
+    x, y = reach * np.cos(coxa), reach * np.sin(coxa)
+
+    return np.stack((ik.mount[:, 0] + x * ik.cos_heading - y * ik.sin_heading,
+                     ik.mount[:, 1] + x * ik.sin_heading + y * ik.cos_heading,
+                     z), axis=-1)
+
+
+def test_joint_angles_round_trip(hexapod_18dof):
+    ik = hexapod_18dof.leg_ik()
+
+    # stance feet moved around over a few frames, all within reach
+    offsets = np.array([[0, 0, 0], [20, -10, 15], [-15, 20, -10]], dtype=float)
+    targets = ik.stance_feet() + offsets[:, None, :]
+    angles, reachable = ik.joint_angles(targets)
+
+    assert angles.shape == (3, 6, 3)
+    assert reachable.all()
+    assert np.allclose(foot_tips(ik, angles), targets)
+
+
+def test_unreachable_targets_are_flagged(hexapod_18dof):
+    ik = hexapod_18dof.leg_ik()
+    targets = ik.stance_feet()
+    targets[2, 2] = -1000
+
+    angles, reachable = ik.joint_angles(targets)
+    assert reachable.tolist() == [True, True, False, True, True, True]
+
+
+def test_solve_gives_percents_in_bank_order(hexapod_18dof):
+    ik = hexapod_18dof.leg_ik()
+    percent, reachable = ik.solve(ik.stance_feet())
+
+    assert percent.shape == (len(hexapod_18dof.bank),)
+    leg_servos = ik.indices.ravel()
+    assert ((percent[leg_servos] >= 0) & (percent[leg_servos] <= 100)).all()
+    assert np.isnan(np.delete(percent, leg_servos)).all()
+
+    # a neutral stance points every coxa along its leg heading
+    rotate = percent[ik.indices[:, 0]]
+    assert np.allclose(rotate, 100 * (0 - ik.angle_0[:, 0]) / (ik.angle_100[:, 0] - ik.angle_0[:, 0]))
+
+
+def test_solved_targets_are_bounded(hexapod_18dof, monkeypatch):
+    monkeypatch.setattr(hexapod_18dof.ik_cache, 'size', 2)
+    stance = hexapod_18dof.leg_ik().stance_feet()
+
+    for height in (0, 5, 10, 0):
+        hexapod_18dof.solve_feet(stance + [0, 0, height])
+
+    assert hexapod_18dof.cache_stats()['ik_solutions'] == {'size': 2, 'hits': 0, 'misses': 4, 'evictions': 2}
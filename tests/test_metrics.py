@@ -0,0 +1,41 @@
+from metrics import METRICS, Histogram, Registry
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for i in range(1, 1001):
+        histogram.record(i / 1000)
+
+    assert histogram.count == 1000
+    assert abs(histogram.percentile(0.5) - 0.5) < 0.5 * 0.1
+    assert abs(histogram.percentile(0.99) - 0.99) < 0.99 * 0.1
+    assert histogram.max == 1.0
+
+
+def test_labelled_metrics_and_collectors():
+    registry = Registry()
+    registry.counter('commands_total', 'commands run', command='walk').inc(2)
+    registry.counter('commands_total', command='sit').inc()
+
+    def collect():
+        return [('writes_total', 'counter', {'board': '0x40'}, 7)]
+
+    registry.collector(collect)
+    text = registry.prometheus()
+
+    assert '# TYPE commands_total counter' in text
+    assert 'commands_total{command="walk"} 2' in text
+    assert 'commands_total{command="sit"} 1' in text
+    assert 'writes_total{board="0x40"} 7' in text
+
+    registry.remove_collector(collect)
+    assert 'writes_total' not in registry.prometheus()
+
+
+def test_closed_hexapod_leaves_no_collector(hexapod_12dof):
+    assert hexapod_12dof.board_metrics in METRICS.collectors
+
+    hexapod_12dof.close()
+    hexapod_12dof.close()
+
+    assert hexapod_12dof.board_metrics not in METRICS.collectors
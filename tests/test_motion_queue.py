@@ -0,0 +1,111 @@
+import queue
+import threading
+
+from motion_queue import PREEMPT, MotionQueue
+from scheduler import MotionScheduler
+
+
+class Robot:
+    # run() of a MotionQueue: every command moves in keyframes until released,
+    # so tests can queue more while one is running
+    def __init__(self):
+        self.scheduler = MotionScheduler()
+        self.started = queue.Queue()
+        self.release = threading.Event()
+        self.finished = queue.Queue()
+        self.queue = MotionQueue(self.run, self.scheduler, self.done)
+
+    def run(self, data):
+        self.started.put(data)
+        while not self.release.is_set():
+            self.scheduler.wait(0.001)
+
+        if data == 'fail':
+            raise ValueError('bad command')
+
+        return 'OK'
+
+    def done(self, job_ids, response):
+        self.finished.put((job_ids, response))
+
+    def results(self, count):
+        return [self.finished.get(timeout=5) for i in range(count)]
+
+
+def test_repeated_commands_merge_in_order():
+    robot = Robot()
+    robot.queue.put('sit')
+    assert robot.started.get(timeout=5) == 'sit'
+
+    robot.queue.put('walk', iteration=1)
+    robot.queue.put('walk', iteration=2)
+    robot.queue.put('turn_left', iteration=1)
+    robot.queue.put('walk', iteration=1)
+    robot.queue.put('stand')
+
+    robot.release.set()
+    assert robot.results(5) == [([1], 'OK'), ([2, 3], 'OK'), ([4], 'OK'), ([5], 'OK'), ([6], 'OK')]
+
+
+def test_preempt_cancels_running_and_queued():
+    robot = Robot()
+    robot.queue.put('walk', iteration=1)
+    assert robot.started.get(timeout=5) == 'walk 1'
+    robot.queue.put('turn_left', iteration=1)
+
+    robot.queue.put('sit', priority=PREEMPT)
+    assert robot.results(2) == [([2], 'Cancelled'), ([1], 'Cancelled')]
+    assert robot.started.get(timeout=5) == 'sit'
+
+    robot.release.set()
+    assert robot.results(1) == [([3], 'OK')]
+
+
+def test_cancel_and_stop():
+    robot = Robot()
+    robot.queue.put('walk', iteration=1)
+    robot.started.get(timeout=5)
+    robot.queue.put('sit')
+    robot.queue.put('stand')
+
+    assert robot.queue.cancel(3)
+    assert robot.results(1) == [([3], 'Cancelled')]
+    assert not robot.queue.cancel(42)
+
+    robot.queue.stop()
+    assert robot.results(2) == [([2], 'Cancelled'), ([1], 'Cancelled')]
+
+
+def test_cancel_one_of_merged_commands():
+    robot = Robot()
+    robot.queue.put('sit')
+    robot.started.get(timeout=5)
+
+    robot.queue.put('walk', iteration=1)
+    robot.queue.put('walk', iteration=3)
+    robot.queue.put('walk', iteration=2)
+
+    assert robot.queue.cancel(3)
+    assert robot.results(1) == [([3], 'Cancelled')]
+
+    robot.release.set()
+    assert robot.results(2) == [([1], 'OK'), ([2, 4], 'OK')]
+    assert robot.started.get(timeout=5) == 'walk 3'
+
+    # the last id of a merged job takes the job with it
+    robot.release.clear()
+    robot.queue.put('sit')
+    robot.started.get(timeout=5)
+    robot.queue.put('walk', iteration=1)
+    robot.queue.put('walk', iteration=1)
+    assert robot.queue.cancel(6) and robot.queue.cancel(7)
+    assert robot.results(2) == [([6], 'Cancelled'), ([7], 'Cancelled')]
+    assert not robot.queue.pending
+
+
+def test_failed_command_reports_its_error():
+    robot = Robot()
+    robot.release.set()
+    robot.queue.put('fail')
+
+    assert robot.results(1) == [([1], 'ERROR: bad command')]
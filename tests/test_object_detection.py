@@ -0,0 +1,154 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import HEXAPOD_DIR
+import object_detection as od
+
+SAMPLE_IMAGES = os.path.join(os.path.dirname(HEXAPOD_DIR), 'sample_images')
+
+# BGR colors in the robot range only (H 24, V 200) and out of the spotlight
+# range only (V > V_spotlight), on a gray background that is neither
+ROBOT = (0, 160, 200)
+SPOTLIGHT = (255, 255, 255)
+BACKGROUND = (128, 128, 128)
+
+
+class FakeCapture:
+    # cv2.VideoCapture whose frames (filled with their number) come only when
+    # the test lets them through
+    def __init__(self):
+        self.count = 0
+        self.allowed = threading.Semaphore(0)
+
+    def read(self, image=None):
+        if self.count and not self.allowed.acquire(timeout=0.05):
+            return False, None
+
+        self.count += 1
+        frame = image if image is not None else np.empty((4, 4, 3), dtype=np.uint8)
+        frame[...] = self.count
+
+        return True, frame
+
+
+def capture(camera, count):
+    # Let count more frames into the camera's ring
+    with camera.condition:
+        target = camera.captured + count
+
+    for i in range(count):
+        camera.cap.allowed.release()
+
+    with camera.condition:
+        assert camera.condition.wait_for(lambda: camera.captured == target, 5)
+
+
+def make_frame(robot=(900, 500, 1000, 600), spotlight=(300, 240), radius=60):
+    frame = np.full((720, 1280, 3), BACKGROUND, dtype=np.uint8)
+    x0, y0, x1, y1 = robot
+    frame[y0:y1, x0:x1] = ROBOT
+    cv2.circle(frame, spotlight, radius, SPOTLIGHT, -1)
+    return frame
+
+
+@pytest.mark.parametrize('spotlight_low, spotlight_high, v_only', [
+        ((0, 0, 0), (179, 255, 243), True),
+        ((0, 0, 0), (179, 80, 243), False),
+        ((10, 0, 30), (179, 255, 200), False),
+])
+@pytest.mark.parametrize('image', ['2017-12-05-171951.jpg', '2017-12-05-172011.jpg'])
+def test_fused_masks_match_separate_thresholds(image, spotlight_low, spotlight_high, v_only):
+    frame = cv2.imread(os.path.join(SAMPLE_IMAGES, image))
+    robot_low, robot_high = (od.H_robot_low, od.S_robot_low, od.V_robot_low), (od.H_robot, od.S_robot, od.V_robot)
+    fused = od.FusedThreshold(robot_low, robot_high, spotlight_low, spotlight_high)
+
+    robot, spotlight = fused(frame)
+
+    assert fused.v_only == v_only
+    assert np.array_equal(robot, od.get_threshold_image(frame, robot_low[0], robot_high[0], robot_low[1],
+                                                        robot_high[1], robot_low[2], robot_high[2]))
+    assert np.array_equal(spotlight, cv2.bitwise_not(od.get_threshold_image(
+            frame, spotlight_low[0], spotlight_high[0], spotlight_low[1], spotlight_high[1],
+            spotlight_low[2], spotlight_high[2])))
+
+
+def test_window_masks_match_both_masks():
+    fused = od.FusedThreshold((od.H_robot_low, od.S_robot_low, od.V_robot_low), (od.H_robot, od.S_robot, od.V_robot),
+                              (od.H_spotlight_low, od.S_spotlight_low, od.V_spotlight_low),
+                              (od.H_spotlight, od.S_spotlight, od.V_spotlight))
+    frame = make_frame()
+
+    robot, spotlight = [mask.copy() for mask in fused(frame)]
+    assert robot.any() and spotlight.any()
+    assert np.array_equal(fused.mask(frame, 0), robot)
+    assert np.array_equal(fused.mask(frame, 1), spotlight)
+
+
+def test_tracking_searches_windows_after_the_first_frame():
+    tracker = od.RoiTracker()
+    frame = make_frame()
+    expected = od.process_frame(frame)
+
+    assert tracker.track(frame) == expected
+    assert None not in tracker.windows
+
+    searches = od.VISION_FULL_SEARCHES.value
+    moved = make_frame(robot=(910, 505, 1010, 605), spotlight=(305, 245))
+    assert tracker.track(moved) == od.process_frame(moved)
+    assert od.VISION_FULL_SEARCHES.value == searches
+
+
+def test_object_reaching_out_of_its_window_is_searched_again():
+    tracker = od.RoiTracker()
+    tracker.track(make_frame())
+    x0, y0, x1, y1 = tracker.windows[0]
+
+    # the robot grows far past the right edge of its window: the part inside
+    # alone would leave its centroid near the old one
+    searches = od.VISION_FULL_SEARCHES.value
+    grown = make_frame(robot=(900, 500, x1 + 200, 600))
+    assert tracker.track(grown) == od.process_frame(grown)
+    assert od.VISION_FULL_SEARCHES.value == searches + 1
+    assert tracker.windows[0][2] > x1
+
+
+def test_lost_object_is_found_again():
+    tracker = od.RoiTracker()
+    tracker.track(make_frame())
+
+    # the spotlight jumps out of its window
+    jumped = make_frame(spotlight=(900, 200))
+    robot, spotlight, distance = tracker.track(jumped)
+    assert spotlight == od.process_frame(jumped)[1]
+
+    # no spotlight at all
+    robot, spotlight, distance = tracker.track(make_frame(radius=0))
+    assert np.isnan(spotlight[0]) and tracker.windows[1] is None
+
+
+def test_camera_hands_out_the_newest_frame():
+    camera = od.CameraThread(FakeCapture())
+    camera.start()
+    try:
+        # the frame read when the camera was opened
+        ret, frame = camera.read()
+        assert ret and frame[0, 0, 0] == 1
+
+        # frames 2 and 3 arrive before the next read, 2 is dropped
+        capture(camera, 2)
+        ret, frame = camera.read()
+        assert frame[0, 0, 0] == 3
+        assert camera.dropped == 1
+
+        # the frame handed out stays as it is while the next ones come in
+        capture(camera, 5)
+        assert frame[0, 0, 0] == 3
+
+        assert camera.read()[1][0, 0, 0] == 8
+        assert camera.read(timeout=0.01) == (False, None)
+    finally:
+        camera.stop()
@@ -0,0 +1,104 @@
+import pytest
+
+from pca9685 import LED0_ON_L, PCA9685Board, SimulatedPCA9685, create_board, frame_blocks
+
+
+def make_board():
+    device = SimulatedPCA9685(0x40)
+    board = PCA9685Board(device, device)
+    device.clear()
+    return board, device
+
+
+def test_frame_blocks_fills_gaps_from_shadow():
+    shadow = [(0, 100 + channel) for channel in range(16)]
+    frame = {0: (0, 1), 2: (0, 3), 5: (0, 6)}
+
+    assert frame_blocks(frame, shadow) == [
+            (0, [(0, 1), (0, 101), (0, 3), (0, 103), (0, 104), (0, 6)])]
+
+
+def test_frame_blocks_splits_at_unknown_channels():
+    shadow = [None] * 16
+    shadow[1] = (0, 50)
+    frame = {0: (0, 1), 2: (0, 3), 4: (0, 5)}
+
+    assert frame_blocks(frame, shadow) == [(0, [(0, 1), (0, 50), (0, 3)]), (4, [(0, 5)])]
+
+
+def test_alternating_channels_are_one_block_write():
+    board, device = make_board()
+
+    # every channel known, as after the first pose
+    board.begin_frame()
+    for channel in range(12):
+        board.set_pwm(channel, 0, 300)
+    board.end_frame()
+    assert board.writes == 1
+
+    # a step touches every other channel (rotate and raise alternate in config_12DOF)
+    device.clear()
+    board.begin_frame()
+    for channel in range(0, 12, 2):
+        board.set_pwm(channel, 0, 400)
+    board.end_frame()
+
+    assert device.transactions == 1
+    assert device.writes[0][1] == LED0_ON_L
+    assert [device.get_pwm(channel)[1] for channel in range(12)] == [400, 300] * 6
+
+
+def test_unchanged_pulses_are_not_written():
+    board, device = make_board()
+
+    board.begin_frame()
+    board.set_pwm(3, 0, 300)
+    board.end_frame()
+
+    device.clear()
+    board.begin_frame()
+    board.set_pwm(3, 0, 300)
+    board.end_frame()
+
+    assert device.transactions == 0
+    assert board.stats() == {'hits': 1, 'misses': 1, 'writes': 1}
+
+
+def test_write_dropped_when_frame_returns_to_shadow():
+    board, device = make_board()
+    board.set_pwm(2, 0, 200)
+    device.clear()
+
+    board.begin_frame()
+    board.set_pwm(2, 0, 250)
+    board.set_pwm(2, 0, 200)
+    board.end_frame()
+
+    assert device.transactions == 0
+    assert device.get_pwm(2) == (0, 200)
+
+
+def test_simulated_bus_time():
+    board, device = make_board()
+    bus_speed = device.bus_speed
+
+    # register byte and one data byte per write: start, address, 2 bytes, stop
+    device.set_pwm(1, 0, 300)
+    assert device.transactions == 4
+    assert device.bus_time == pytest.approx(4 * (2 + 9 * 3) / bus_speed)
+    assert device.get_pwm(1) == (0, 300)
+
+    # a block write with auto-increment (set by PCA9685Board)
+    device.clear()
+    device.writeList(LED0_ON_L, [0, 0, 44, 1] * 3)
+    assert device.transactions == 1
+    assert device.bus_time == pytest.approx((2 + 9 * 14) / bus_speed)
+    assert [device.get_pwm(channel) for channel in range(3)] == [(0, 300)] * 3
+
+
+def test_create_board_backends():
+    board = create_board(0x41, {'type': 'simulated', 'bus_speed': 400000})
+    assert board.device.bus_speed == 400000
+
+    with pytest.raises(ValueError, match='unknown board backend'):
+        create_board(0x41, {'type': 'serial'})
@@ -0,0 +1,31 @@
+import pytest
+
+from protocol import DONE, HEADER, MAX_BODY, REPLY, REQUEST, FrameBuffer, ProtocolError, pack_frame
+
+
+def test_frames_round_trip():
+    data = pack_frame(1, REQUEST, 'walk 2') + pack_frame(2, REPLY, 'Queued 1: walk 2') + pack_frame(3, DONE, '')
+
+    assert FrameBuffer().feed(data) == [(1, REQUEST, 'walk 2'), (2, REPLY, 'Queued 1: walk 2'), (3, DONE, '')]
+
+
+def test_frames_fed_byte_by_byte():
+    data = pack_frame(7, REQUEST, 'script\nwalk\nsit') + pack_frame(8, REQUEST, 'grüß')
+    frames = FrameBuffer()
+
+    received = []
+    for i in range(len(data)):
+        received.extend(frames.feed(data[i:i + 1]))
+
+    assert received == [(7, REQUEST, 'script\nwalk\nsit'), (8, REQUEST, 'grüß')]
+    assert frames.buffer == b''
+
+
+def test_oversized_frame():
+    with pytest.raises(ProtocolError):
+        FrameBuffer().feed(HEADER.pack(MAX_BODY + 1, 1, REQUEST))
+
+
+def test_frame_not_utf8():
+    with pytest.raises(ProtocolError):
+        FrameBuffer().feed(HEADER.pack(2, 1, REQUEST) + b'\xff\xfe')
@@ -0,0 +1,62 @@
+import pytest
+
+from gait_compiler import VirtualClock
+from scheduler import MotionCancelled, MotionScheduler
+
+
+class SlowClock(VirtualClock):
+    # VirtualClock where every keyframe also costs work seconds of writing
+    def __init__(self, work):
+        super().__init__()
+        self.work = work
+
+    def write(self):
+        self.now += self.work
+
+
+def test_work_is_taken_out_of_the_sleep():
+    clock = SlowClock(0.01)
+    scheduler = MotionScheduler(clock=clock.clock, sleep=clock.sleep)
+
+    scheduler.start()
+    for i in range(10):
+        clock.write()
+        assert scheduler.wait(0.1) == 0
+
+    assert clock.now == pytest.approx(1.0)
+    assert scheduler.report()['keyframes'] == 10
+
+
+def test_late_keyframes_resync():
+    clock = SlowClock(0.3)
+    scheduler = MotionScheduler(clock=clock.clock, sleep=clock.sleep, max_lateness=0.1)
+
+    scheduler.start()
+    clock.write()
+    assert scheduler.wait(0.1) == pytest.approx(0.2)
+
+    # the next deadline counts from now instead of the missed one
+    assert scheduler.wait(0.1) == 0
+    assert clock.now == pytest.approx(0.4)
+
+    report = scheduler.report()
+    assert report['resyncs'] == 1
+    assert report['max_ms'] == pytest.approx(200)
+
+
+def test_cancel_stops_at_the_next_keyframe():
+    clock = VirtualClock()
+    scheduler = MotionScheduler(clock=clock.clock, sleep=clock.sleep)
+
+    scheduler.start()
+    scheduler.wait(0.1)
+    scheduler.cancel()
+    with pytest.raises(MotionCancelled):
+        scheduler.wait(0.1)
+
+    # the cancel is used up by the movement it stopped
+    scheduler.wait(0.1)
+
+    scheduler.cancel()
+    scheduler.clear_cancel()
+    scheduler.wait(0.1)
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+
+import pytest
+
+import server_if
+from protocol import DONE, MAGIC, REPLY, REQUEST, FrameBuffer, pack_frame
+from server_if import HexapodServer
+
+
+async def serve(my_hexapod):
+    # HexapodServer on a free localhost port: (server, asyncio server, port)
+    hexapod_server = HexapodServer(my_hexapod)
+    hexapod_server.loop = asyncio.get_running_loop()
+    server = await asyncio.start_server(hexapod_server.handle_client, '127.0.0.1', 0)
+
+    return hexapod_server, server, server.sockets[0].getsockname()[1]
+
+
+def text_session(my_hexapod, chunks, replies, pause=0.0):
+    # Send chunks of bytes over a text connection, return the first replies lines
+    async def session():
+        hexapod_server, server, port = await serve(my_hexapod)
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            for chunk in chunks:
+                writer.write(chunk)
+                await writer.drain()
+                await asyncio.sleep(pause)
+
+            lines = [(await asyncio.wait_for(reader.readline(), 5)).decode().strip() for i in range(replies)]
+            writer.close()
+
+        return lines
+
+    return asyncio.run(session())
+
+
+def test_text_commands_split_across_reads(hexapod_12dof):
+    lines = text_session(hexapod_12dof, [b'descr', b'ibe sit\nstats', b'\n'], 2, pause=0.01)
+
+    assert lines[0].startswith('sit - sit down: duration=')
+    assert lines[1].startswith('Stats: ')
+
+
+def test_text_commands_in_one_read(hexapod_12dof):
+    lines = text_session(hexapod_12dof, [b'describe sit\r\ndescribe stand\n'], 2)
+
+    assert lines[0].startswith('sit - ')
+    assert lines[1].startswith('stand - ')
+
+
+def test_text_command_without_newline(hexapod_12dof):
+    # interactive clients of old send bare commands
+    assert text_session(hexapod_12dof, [b'describe sit'], 1)[0].startswith('sit - ')
+
+
+def test_text_command_not_utf8(hexapod_12dof):
+    lines = text_session(hexapod_12dof, [b'describe \xff\xfe\n', b'describe sit\n'], 2)
+
+    assert lines == ['ERROR: command is not valid UTF-8', lines[1]]
+    assert lines[1].startswith('sit - ')
+
+
+def test_describe_does_not_hold_up_other_clients(hexapod_12dof, monkeypatch):
+    compiling = threading.Event()
+    release = threading.Event()
+    describe_command = hexapod_12dof.describe_command
+
+    def slow_describe(name, tokens=()):
+        compiling.set()
+        release.wait(5)
+        return describe_command(name, tokens)
+
+    monkeypatch.setattr(hexapod_12dof, 'describe_command', slow_describe)
+
+    async def session():
+        hexapod_server, server, port = await serve(hexapod_12dof)
+        async with server:
+            slow_reader, slow_writer = await asyncio.open_connection('127.0.0.1', port)
+            slow_writer.write(b'describe walk 3\n')
+            await slow_writer.drain()
+            await asyncio.get_running_loop().run_in_executor(None, compiling.wait, 5)
+
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'stats\n')
+            stats = (await asyncio.wait_for(reader.readline(), 5)).decode()
+
+            release.set()
+            described = (await asyncio.wait_for(slow_reader.readline(), 5)).decode()
+            writer.close()
+            slow_writer.close()
+
+        return stats, described
+
+    stats, described = asyncio.run(session())
+
+    assert stats.startswith('Stats: ')
+    assert described.startswith('walk_forward|walk ')
+
+
+@pytest.fixture(autouse=True)
+def short_line_timeout(monkeypatch):
+    monkeypatch.setattr(server_if, 'LINE_TIMEOUT', 0.2)
+
+
+def test_cancel_needs_a_job_id(hexapod_12dof):
+    lines = text_session(hexapod_12dof, [b'cancel foo\ncancel 1 2\ncancel 99\ncancel\n'], 4)
+
+    assert lines[:2] == ['ERROR: cancel [id]: cancel the running or a queued command'] * 2
+    assert lines[2:] == ['Nothing to cancel'] * 2
+
+
+def test_framed_session(hexapod_12dof):
+    async def session():
+        hexapod_server, server, port = await serve(hexapod_12dof)
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(MAGIC + pack_frame(1, REQUEST, 'sit') + pack_frame(2, REQUEST, 'cancel x'))
+            await writer.drain()
+
+            frames = FrameBuffer()
+            received = []
+            while len(received) < 3:
+                received.extend(frames.feed(await asyncio.wait_for(reader.read(4096), 5)))
+
+            writer.close()
+
+        return received
+
+    received = asyncio.run(session())
+
+    assert (1, REPLY, 'Queued 1: sit') in received
+    assert (1, DONE, 'Sitting') in received
+    assert (2, REPLY, 'ERROR: cancel [id]: cancel the running or a queued command') in received
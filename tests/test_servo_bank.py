@@ -0,0 +1,62 @@
+import numpy as np
+
+from servo_bank import ServoBank
+
+
+def make_bank():
+    servos = []
+    for i, name in enumerate(('left_front_rotate', 'left_front_raise', 'right_back_rotate', 'right_back_raise')):
+        servos.append({'name': name, 'board': 0, 'channel': i, 'servo_min': 200, 'servo_max': 600,
+                       'invert': name.startswith('right'), 'forward': 0, 'up': None, 'center': 'None'})
+    return ServoBank(servos)
+
+
+def test_select_legs_groups_and_joints():
+    bank = make_bank()
+
+    assert list(bank.select('left_front')) == [0, 1]
+    assert list(bank.select('all', 'raise')) == [1, 3]
+    assert list(bank.select(['back', 'left_front'], 'rotate')) == [0, 2]
+    assert list(bank.select('right_center')) == []
+
+
+def test_percent_to_pulse():
+    bank = make_bank()
+    indices = bank.select()
+
+    assert list(bank.percent_to_pulse(25, indices)) == [300, 300, 500, 500]
+
+    # frames of servos, out of range percents give pulse 0
+    pulses = bank.percent_to_pulse([[0, 100, 0, 100], [50, 150, 50, -1]], indices)
+    assert pulses.tolist() == [[200, 600, 600, 200], [400, 0, 400, 0]]
+
+
+def test_positions_and_current():
+    bank = make_bank()
+
+    assert bank.get('forward', 0) == 0.0
+    assert bank.get('up', 0) is None
+    assert bank.get('center', 0) is None
+    assert bank.get('current', 0) is None
+
+    version = bank.version
+    bank.set('up', 0, 40)
+    bank.set('current', 0, 420)
+    assert bank.get('up', 0) == 40.0
+    assert bank.get('current', 0) == 420
+    assert bank.version == version + 1
+
+
+def test_copy_is_independent():
+    bank = make_bank()
+    bank.set('current', 1, 300)
+    other = bank.copy()
+
+    other.set('current', 1, 500)
+    other.set('servo_max', 1, 700)
+    other.set('forward', 1, 10)
+
+    assert bank.get('current', 1) == 300
+    assert bank.get('servo_max', 1) == 600
+    assert bank.get('forward', 1) == 0.0
+    assert np.array_equal(other.select('left_front'), bank.select('left_front'))
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import HEXAPOD_DIR, config_path
+
+# modules an entry point must not load before it needs them
+HEAVY = ('cv2', 'numpy', 'yaml', 'Adafruit_PCA9685', 'http.server')
+
+
+def loaded(module):
+    # Heavy modules loaded by importing an entry point in a fresh interpreter
+    code = 'import sys, {}; print(" ".join(sorted(set(sys.modules) & set({!r}))))'.format(module, HEAVY)
+    result = subprocess.run([sys.executable, '-c', code], cwd=HEXAPOD_DIR, check=True,
+                            capture_output=True, text=True)
+    return result.stdout.split()
+
+
+def test_client_loads_no_heavy_modules():
+    assert loaded('client_if') == []
+
+
+def test_server_loads_only_numpy():
+    assert loaded('server_if') == ['numpy']
+
+
+@pytest.mark.parametrize('model', ['12DOF', '18DOF'])
+def test_fast_start_moves_no_servo(model):
+    import server_if
+
+    my_hexapod = server_if.initialize_hexapod(config_path(model), 'simulated', fast_start=True)
+    try:
+        assert (my_hexapod.bank.current < 0).all()
+    finally:
+        my_hexapod.close()
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from gait_compiler import GaitTable
+from trajectory import PROFILES, interpolate, keyframe_frames, table_keyframes
+
+
+@pytest.mark.parametrize('profile', sorted(PROFILES))
+def test_interpolate(profile):
+    frames = interpolate([100, 400], [300, 200], 0.5, rate=50, profile=profile)
+
+    assert frames.shape == (25, 2)
+    assert frames[-1].tolist() == [300, 200]
+    assert (np.diff(frames[:, 0]) >= 0).all() and (np.diff(frames[:, 1]) <= 0).all()
+
+
+def test_interpolate_short_move_is_one_frame():
+    assert interpolate([0], [10], 0.001).tolist() == [[10]]
+
+
+def test_keyframe_frames_pass_through_poses():
+    times = [0.0, 0.2, 0.5]
+    poses = [[0, 100], [50, 100], [50, 0]]
+    frame_times, frames = keyframe_frames(times, poses, rate=50)
+
+    assert frame_times == pytest.approx(np.arange(1, 26) / 50)
+    assert frames[9].tolist() == pytest.approx([50, 100])
+    assert frames[-1].tolist() == [50, 0]
+
+
+def test_table_keyframes():
+    # servo 1 is unknown before the table and takes its first pulse
+    table = GaitTable([(0.0, [(0, 0, 0, 200)]), (0.3, [(1, 0, 1, 400), (0, 0, 0, 250)])], 0.3)
+    times, poses = table_keyframes(table, [100, -1], settle=0.2)
+
+    assert times.tolist() == pytest.approx([0.0, 0.3, 0.5])
+    assert poses.tolist() == [[100, 400], [200, 400], [250, 400]]